@@ -7,110 +7,845 @@
 # 2) Provide a plain urls.txt (one direct SVG URL per line) and run:
 #       python3 download_svgs.py --urls urls.txt
 #
+# Rows are processed concurrently (--workers, default 8) with at most --per-host
+# requests (default 4) in flight against any single host; progress is still
+# reported in manifest order.
+#
+# Transient failures (connection errors, timeouts, HTTP 429/5xx) are retried up to
+# --retries times with jittered exponential backoff, honoring Retry-After. The HTTP
+# connection pool keeps --workers connections per host, and every response is timed
+# (DNS, connect, time to first byte, total); a summary is printed at the end of the run.
+#
+# Every download is validated and minified while it streams: it must be well-formed XML
+# with an <svg> root (HTML error/search pages are rejected), and comments, <metadata>,
+# <title>, <desc>, editor (Inkscape/Sodipodi) data and redundant whitespace are dropped.
+# Files are staged per URL in <out>/.incoming/ and then published into <out>/ in manifest
+# order: identical SVGs are saved once (first row wins) and different SVGs that want the
+# same file name get -2, -3, ... suffixes, so the result does not depend on which
+# download finished first.
+#
+# Reruns are incremental: <out>/.download_cache.json remembers ETag/Last-Modified and the
+# sha256 of every downloaded file (unchanged files are revalidated with a conditional GET
+# and not re-downloaded) and the URL each search resolved to per manifest name (no
+# re-scraping). <out>/.download_state.json lists rows finished by the current run; if
+# the run is interrupted, the next one skips them (use --restart to ignore it). The
+# state file is removed when a run completes.
+#
 # The script will download SVG files into svg_sources/ and optionally normalize filenames.
 #
 # NOTE: This script attempts a basic search on svgrepo.com and freesvg.org if the 'url' column is empty.
 #       Web scraping may break if site layout changes. Use direct SVG URLs for reliability.
+#       Both sites are queried at once; the first to find an icon wins and the other is
+#       cancelled. What each site returned per query (including "nothing found", kept for
+#       7 days) is cached in the download cache. Pages are parsed with lxml when it is
+#       installed (pip install lxml), with Python's html.parser otherwise.
 
-import os, csv, argparse, re, sys, time
+import os, csv, argparse, re, sys, time, threading, json, hashlib, random, socket, shutil
+import importlib.util
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 from urllib.parse import urlparse, quote_plus
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.connection import allowed_gai_family
+from bs4 import BeautifulSoup, SoupStrainer
+# lxml is optional, a much faster BeautifulSoup backend; BeautifulSoup imports it itself
+HTML_PARSER = "lxml" if importlib.util.find_spec("lxml") else "html.parser"
 
 OUTDIR = "svg_sources"
+DEFAULT_WORKERS = 8
+DEFAULT_PER_HOST = 4
+CACHE_FILE = ".download_cache.json"
+STATE_FILE = ".download_state.json"
+SAVE_INTERVAL = 2.0  # seconds between periodic cache/state saves during a run
+DEFAULT_RETRIES = 3
+RETRY_STATUS = {429, 500, 502, 503, 504}
+RETRY_ERRORS = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+BACKOFF_BASE = 0.5  # seconds; retry n sleeps uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2**(n-1)))
+BACKOFF_CAP = 10.0
+RETRY_AFTER_CAP = 30.0  # never sleep longer than this, whatever Retry-After says
+STAGING_DIR = ".incoming"
+SVGREPO_BASE = "https://www.svgrepo.com"
+FREESVG_BASE = "https://freesvg.org"
+SCRAPE_MISS_TTL = 7 * 24 * 3600  # seconds before a query that found nothing is scraped again
+SVG_NS = "http://www.w3.org/2000/svg"
+XML_NS = "http://www.w3.org/XML/1998/namespace"
+STRIP_TAGS = {"metadata", "title", "desc"}
+# editor bookkeeping, irrelevant for the outlines
+STRIP_NAMESPACES = {
+    "http://www.inkscape.org/namespaces/inkscape",
+    "http://sodipodi.sourceforge.net/DTD/sodipodi-0.dtd",
+}
+
+class HostLimiter:
+    # caps the number of concurrent requests per host (one semaphore per netloc)
+    def __init__(self, per_host):
+        self.per_host = per_host
+        self._lock = threading.Lock()
+        self._slots = {}
+
+    def slot(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            sem = self._slots.get(host)
+            if sem is None:
+                sem = self._slots[host] = threading.BoundedSemaphore(self.per_host)
+        return sem
+
+def _slot(limiter, url):
+    return limiter.slot(url) if limiter else nullcontext()
+
+# DNS/connect time of the connection opened by the current thread's request; reset
+# before each request, stays None when a pooled connection is reused
+_timing = threading.local()
+
+class _TimedConnection:
+    # resolves the host itself so name lookup and TCP connect are timed separately
+    def _new_conn(self):
+        host = self._dns_host
+        t0 = time.perf_counter()
+        try:
+            infos = socket.getaddrinfo(host, self.port, allowed_gai_family(), socket.SOCK_STREAM)
+        except OSError:
+            return super()._new_conn()  # let urllib3 raise its usual error
+        t1 = time.perf_counter()
+        addrs = list(dict.fromkeys(info[4][0] for info in infos))
+        # connect to the resolved addresses in order, as urllib3 would; the TLS layer
+        # reads self.host only after _new_conn returns
+        try:
+            for i, addr in enumerate(addrs):
+                self._dns_host = addr
+                try:
+                    sock = super()._new_conn()
+                    break
+                except Exception:
+                    if i == len(addrs) - 1:
+                        raise
+        finally:
+            self._dns_host = host
+        _timing.dns = t1 - t0
+        _timing.connect = time.perf_counter() - t1
+        return sock
+
+class _TimedHTTPConnection(_TimedConnection, HTTPConnection):
+    pass
+
+class _TimedHTTPSConnection(_TimedConnection, HTTPSConnection):
+    pass
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+class TimedHTTPAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+
+def make_session(pool_size):
+    # every worker may hold a connection to the same host, so keep that many per host
+    session = requests.Session()
+    adapter = TimedHTTPAdapter(pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def parse_retry_after(value):
+    # Retry-After is either delay-seconds or an HTTP date; None if missing/garbage
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+def backoff_delay(retry):
+    # "full jitter": spreads out retries of workers that failed at the same moment
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** (retry - 1)))
+
+class FetchStats:
+    # counters and per-response timings (seconds) for the end-of-run summary
+    PHASES = ("dns", "connect", "ttfb", "total")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {"requests": 0, "attempts": 0, "retries": 0, "failed": 0}
+        self.samples = {phase: [] for phase in self.PHASES}
+
+    def count(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+    def add(self, timings):
+        with self._lock:
+            for phase, value in timings.items():
+                if value is not None:
+                    self.samples[phase].append(value)
+
+    def summary(self):
+        with self._lock:
+            c = self.counts
+            lines = [f"Fetch summary: {c['requests']} requests, {c['attempts']} attempts, "
+                     f"{c['retries']} retries, {c['failed']} failed"]
+            for phase in self.PHASES:
+                values = sorted(self.samples[phase])
+                if not values:
+                    continue
+                pick = lambda q: values[min(len(values) - 1, int(q * len(values)))] * 1000
+                lines.append(f"  {phase:<8} n={len(values):<5} p50 {pick(0.5):8.1f} ms"
+                             f"  p95 {pick(0.95):8.1f} ms  max {values[-1] * 1000:8.1f} ms")
+        return lines
+
+class Cancelled(Exception):
+    pass
+
+class Fetcher:
+    # the fetch layer: session + per-host limiter + retries + timing
+    def __init__(self, session=None, limiter=None, retries=DEFAULT_RETRIES, stats=None):
+        self.session = session or make_session(DEFAULT_WORKERS)
+        self.limiter = limiter
+        self.retries = retries
+        self.stats = stats or FetchStats()
+
+    def get(self, url, handle, timeout, headers=None, log=print, cancel=None):
+        # GETs url and returns handle(response). handle runs while the host slot is
+        # held and must consume the body; errors it raises (e.g. raise_for_status)
+        # propagate. Transient errors, including ones while reading the body, and
+        # RETRY_STATUS responses are retried; the sleep happens outside the slot.
+        # Once the cancel event is set, Cancelled is raised instead of sending (or
+        # retrying) the request.
+        self.stats.count("requests")
+        retry = 0
+        try:
+            while True:
+                try:
+                    with _slot(self.limiter, url):
+                        if cancel is not None and cancel.is_set():
+                            raise Cancelled(url)
+                        self.stats.count("attempts")
+                        done, result = self._attempt(url, handle, timeout, headers, retry)
+                    if done:
+                        return result
+                    reason, delay = result
+                except RETRY_ERRORS as e:
+                    if retry >= self.retries:
+                        raise
+                    reason, delay = e, None
+                retry += 1
+                delay = backoff_delay(retry) if delay is None else min(delay, RETRY_AFTER_CAP)
+                log(f"Retrying {url} in {delay:.1f}s ({reason}), attempt {retry + 1}/{self.retries + 1}")
+                self.stats.count("retries")
+                if cancel is not None:
+                    cancel.wait(delay)
+                else:
+                    time.sleep(delay)
+        except Cancelled:
+            raise
+        except Exception:
+            self.stats.count("failed")
+            raise
+
+    def _attempt(self, url, handle, timeout, headers, retry):
+        # (True, handle result) or (False, (reason, Retry-After seconds or None))
+        _timing.dns = _timing.connect = None
+        t0 = time.perf_counter()
+        r = self.session.get(url, timeout=timeout, stream=True, headers=headers)
+        timings = {"dns": _timing.dns, "connect": _timing.connect, "ttfb": time.perf_counter() - t0}
+        try:
+            if r.status_code in RETRY_STATUS and retry < self.retries:
+                return False, (f"HTTP {r.status_code}", parse_retry_after(r.headers.get("Retry-After")))
+            return True, handle(r)
+        finally:
+            r.close()
+            timings["total"] = time.perf_counter() - t0
+            self.stats.add(timings)
+
+def _text(r):
+    r.raise_for_status()
+    return r.text
+
+def write_json_atomic(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+def read_json(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(65536), b""):
+                h.update(chunk)
+    except OSError:
+        return None
+    return h.hexdigest()
+
+class JsonStore:
+    # dict persisted as JSON; thread-safe updates, saves at most every SAVE_INTERVAL
+    # seconds while running (save(force=True) at the end of the run)
+    def __init__(self, path):
+        self.path = path
+        self.data = read_json(path) if path else {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._saved_at = time.monotonic()
+
+    def get(self, section, key):
+        with self._lock:
+            return self.data.get(section, {}).get(key)
+
+    def put(self, section, key, value):
+        with self._lock:
+            self.data.setdefault(section, {})[key] = value
+            self._dirty = True
+        self.save()
+
+    def save(self, force=False):
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty or (not force and time.monotonic() - self._saved_at < SAVE_INTERVAL):
+                return
+            try:
+                write_json_atomic(self.path, self.data)
+            except OSError as e:
+                print(f"Could not save {self.path}: {e}")
+                return
+            self._dirty = False
+            self._saved_at = time.monotonic()
+
+class DownloadCache(JsonStore):
+    # "urls": url -> {etag, last_modified, sha256, path}; "search": name -> resolved url;
+    # "scrape": "provider\tquery" -> {url (None: nothing found), time}
+    pass
+
+class RunState(JsonStore):
+    # "done": row key -> saved path, for rows finished by the current (possibly
+    # interrupted) run
+    def __init__(self, path, restart=False):
+        if restart and path and os.path.exists(path):
+            os.remove(path)
+        super().__init__(path)
+
+    def finish(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+class InvalidSvg(ValueError):
+    pass
+
+class CacheMiss(Exception):
+    # 304 Not Modified to a request that had nothing to revalidate
+    pass
+
+def _split_tag(tag):
+    # "{uri}local" -> (uri, local); "local" -> ("", local)
+    if tag[:1] == "{":
+        uri, _, local = tag[1:].partition("}")
+        return uri, local
+    return "", tag
+
+def _collapse(s):
+    return re.sub(r"\s+", " ", s)
+
+def _escape(s, attr=False):
+    s = s.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    return s.replace('"', "&quot;") if attr else s
+
+class SvgMinifier:
+    # incremental SVG validator + minifier: feed() the body chunk by chunk, it returns
+    # the minified bytes produced so far. Raises InvalidSvg as soon as the data is not
+    # well-formed XML or the root element is not <svg>, so a bad download is abandoned
+    # early. Drops the XML declaration, doctype, comments, processing instructions,
+    # STRIP_TAGS/STRIP_NAMESPACES elements and attributes and whitespace-only text;
+    # collapses whitespace in text and attribute values; writes empty elements as <x/>.
+    # Text under xml:space="preserve" is kept as it is.
+    def __init__(self):
+        self._parser = ET.XMLPullParser(events=("start-ns", "start", "end"))
+        self._out = []
+        self._stack = []      # (element, namespace scope uri -> prefix, stripped, preserve)
+        self._new_ns = []     # declarations for the next start tag
+        self._last = None     # (event, element, stripped) before the current one
+        self._open = False    # a start tag is written without its ">" yet
+        self._done = False
+
+    def feed(self, data):
+        try:
+            self._parser.feed(data)
+            self._drain()
+        except ET.ParseError as e:
+            raise InvalidSvg(f"not well-formed XML ({e})") from None
+        return self._take()
+
+    def close(self):
+        try:
+            self._parser.close()
+            self._drain()
+        except ET.ParseError as e:
+            raise InvalidSvg(f"not well-formed XML ({e})") from None
+        if not self._done:
+            raise InvalidSvg("empty document")
+        return self._take()
+
+    def _take(self):
+        data = "".join(self._out).encode("utf-8")
+        self._out.clear()
+        return data
+
+    def _drain(self):
+        for event, item in self._parser.read_events():
+            if event == "start-ns":
+                self._new_ns.append(item)
+            elif event == "start":
+                self._start(item)
+            else:
+                self._end(item)
+
+    def _text(self):
+        # text between the previous event and the current one
+        if self._last is None:
+            return
+        event, elem, stripped = self._last
+        text = elem.text if event == "start" else elem.tail
+        # the text belongs to the element on top of the stack (the tail to the parent)
+        preserve = self._stack[-1][3] if self._stack else False
+        if stripped or not text or not (preserve or text.strip()):
+            return
+        if self._open:
+            self._out.append(">")
+            self._open = False
+        self._out.append(_escape(text if preserve else _collapse(text)))
+
+    def _qname(self, tag, scope, attr=False):
+        uri, local = _split_tag(tag)
+        if not uri:
+            return local
+        prefix = scope.get(uri)
+        if prefix is None or (attr and not prefix):
+            # never declared (or only as the default namespace, which attributes
+            # cannot use): declare a prefix on the current tag
+            prefix = f"ns{len(scope)}"
+            scope[uri] = prefix
+            self._out.append(f' xmlns:{prefix}="{_escape(uri, True)}"')
+        return f"{prefix}:{local}" if prefix else local
+
+    def _start(self, elem):
+        uri, local = _split_tag(elem.tag)
+        if not self._stack and (local != "svg" or uri not in ("", SVG_NS)):
+            raise InvalidSvg(f"not an SVG document (root element <{local}>)")
+        parent_stripped = self._stack[-1][2] if self._stack else False
+        space = elem.get(f"{{{XML_NS}}}space")
+        preserve = space == "preserve" if space in ("preserve", "default") else (
+            self._stack[-1][3] if self._stack else False)
+        stripped = parent_stripped or uri in STRIP_NAMESPACES or (
+            uri in ("", SVG_NS) and local in STRIP_TAGS)
+        self._text()
+        self._last = ("start", elem, stripped)
+        declared, self._new_ns = self._new_ns, []
+        scope = dict(self._stack[-1][1]) if self._stack else {XML_NS: "xml"}
+        self._stack.append((elem, scope, stripped, preserve))
+        if stripped:
+            return
+        if self._open:
+            self._out.append(">")
+        self._out.append("<")
+        tag_at = len(self._out)
+        for prefix, ns_uri in declared:
+            if ns_uri in STRIP_NAMESPACES:
+                continue
+            scope[ns_uri] = prefix
+            self._out.append(f' xmlns:{prefix}="{_escape(ns_uri, True)}"' if prefix
+                             else f' xmlns="{_escape(ns_uri, True)}"')
+        self._out.insert(tag_at, self._qname(elem.tag, scope))
+        for name, value in elem.attrib.items():
+            if _split_tag(name)[0] in STRIP_NAMESPACES:
+                continue
+            name = self._qname(name, scope, attr=True)
+            self._out.append(f' {name}="{_escape(_collapse(value).strip(), True)}"')
+        self._open = True
+
+    def _end(self, elem):
+        self._text()
+        _, scope, stripped, _ = self._stack.pop()
+        parent_stripped = self._stack[-1][2] if self._stack else False
+        # the tail belongs to the parent
+        self._last = ("end", elem, parent_stripped)
+        if not stripped:
+            if self._open:
+                self._out.append("/>")
+                self._open = False
+            else:
+                self._out.append(f"</{self._qname(elem.tag, scope)}>")
+        # children are written and their tails consumed: let them go
+        del elem[:]
+        if not self._stack:
+            self._done = True
+
+class Publisher:
+    # moves validated downloads from the staging area into the output folder. Called
+    # in manifest order (see run_jobs), so the outcome does not depend on which
+    # download finished first: identical content is saved once (first row wins) and
+    # different files that want the same name get -2, -3, ... suffixes in row order.
+    def __init__(self, out):
+        self.out = out
+        self.by_hash = {}
+        self.names = set()  # lowercase: the font may be built on a case-insensitive fs
+        self.duplicates = 0
+
+    def publish(self, staged, log):
+        digest = file_sha256(staged)
+        if digest is None:
+            log(f"Downloaded file is gone: {staged}")
+            return None
+        if digest in self.by_hash:
+            self.duplicates += 1
+            log(f"Same SVG as {self.by_hash[digest]} - not saved again")
+            return None
+        stem, ext = os.path.splitext(os.path.basename(staged))
+        name, n = stem + ext, 1
+        while name.lower() in self.names:
+            n += 1
+            name = f"{stem}-{n}{ext}"
+        dest = os.path.join(self.out, name)
+        if file_sha256(dest) != digest:
+            tmp = dest + ".part"
+            try:
+                shutil.copyfile(staged, tmp)
+                os.replace(tmp, dest)
+            except OSError as e:
+                # a failed row, like a failed download: the rest of the run goes on
+                log(f"Failed to save {dest}: {e}")
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                return None
+        self.names.add(name.lower())
+        self.by_hash[digest] = dest
+        log(f"Saved: {dest}")
+        return dest
+
+def staging_folder(out, url):
+    # one folder per URL: different URLs never race for the same staged file
+    return os.path.join(out, STAGING_DIR, hashlib.sha1(url.encode("utf-8")).hexdigest()[:16])
 
 def sanitize_filename(s):
     # simple sanitize
     return re.sub(r'[^A-Za-z0-9._-]', '_', s)
 
-def download_url(url, dest_folder, name_hint=None, session=None):
-    if session is None:
-        session = requests.Session()
-    try:
-        r = session.get(url, timeout=30, stream=True)
-        r.raise_for_status()
-    except Exception as e:
-        print(f"Failed to download {url}: {e}")
-        return None
+def download_url(url, dest_folder, name_hint=None, session=None, fetcher=None, log=print, cache=None):
+    if fetcher is None:
+        fetcher = Fetcher(session)
     # try to determine filename
     parsed = urlparse(url)
     filename = os.path.basename(parsed.path)
     if not filename or '.' not in filename:
         # fallback
         filename = (name_hint or "icon") + ".svg"
-    filename = sanitize_filename(filename)
+    # the content is validated as SVG below, so name it that way
+    filename = sanitize_filename(os.path.splitext(filename)[0] + ".svg")
+    try:
+        os.makedirs(dest_folder, exist_ok=True)
+    except OSError as e:
+        log(f"Failed to download {url}: {e}")
+        return None
     dest_path = os.path.join(dest_folder, filename)
-    with open(dest_path, "wb") as f:
-        for chunk in r.iter_content(8192):
-            f.write(chunk)
-    return dest_path
+    # revalidate instead of re-downloading when the local copy is the one we cached
+    headers = {}
+    cached = cache.get("urls", url) if cache else None
+    if cached and cached.get("path") == dest_path and file_sha256(dest_path) == cached.get("sha256"):
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+    # write to a temp file first so concurrent rows never see a torn file
+    tmp_path = f"{dest_path}.{threading.get_ident()}.part"
 
-def search_svgrepo(query, session=None):
-    # Very basic search on svgrepo.com - attempts to return first SVG download link
-    if session is None:
-        session = requests.Session()
-    q = quote_plus(query)
-    search_url = f"https://www.svgrepo.com/search/{q}/"
-    try:
-        r = session.get(search_url, timeout=20)
+    def save(r):
+        # runs inside the host slot, once per attempt; None means not modified
+        if r.status_code == 304:
+            if headers:
+                return None
+            raise CacheMiss(f"{r.status_code} Not Modified without a conditional request")
         r.raise_for_status()
+        digest = hashlib.sha256()
+        svg = SvgMinifier()
+        try:
+            with open(tmp_path, "wb") as f:
+                for chunk in r.iter_content(8192):
+                    data = svg.feed(chunk)
+                    digest.update(data)
+                    f.write(data)
+                data = svg.close()
+                digest.update(data)
+                f.write(data)
+            os.replace(tmp_path, dest_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return r.headers, digest.hexdigest()
+
+    try:
+        try:
+            saved = fetcher.get(url, save, timeout=30, headers=headers, log=log)
+        except CacheMiss:
+            # a cache on the way answered for us, but we have no copy: ask for the body
+            saved = fetcher.get(url, save, timeout=30, headers={"Cache-Control": "no-cache"}, log=log)
     except Exception as e:
-        print("svgrepo search failed:", e)
+        log(f"Failed to download {url}: {e}")
         return None
-    soup = BeautifulSoup(r.text, "html.parser")
-    # look for first .svg download link or href to icon page then derive download
+    if saved is None:
+        log(f"Not modified: {url}")
+        return dest_path
+    resp_headers, sha256 = saved
+    if cache:
+        cache.put("urls", url, {
+            "etag": resp_headers.get("ETag"),
+            "last_modified": resp_headers.get("Last-Modified"),
+            "sha256": sha256,
+            "path": dest_path,
+        })
+    return dest_path
+
+def _soup(text, only):
+    # parses just the tags the scrapers look at, which is most of the speed-up
+    return BeautifulSoup(text, HTML_PARSER, parse_only=only)
+
+def _has_class(name):
+    # SoupStrainer matcher for one CSS class: while parsing, the strainer sees the raw
+    # class attribute ("icon-link other"), not the split list select_one works on
+    return lambda value: bool(value) and name in value.split()
+
+def scrape_svgrepo(query, fetcher, log=print, cancel=None):
+    # svgrepo.com: search page -> first icon page -> its download link. Returns the
+    # link or None if nothing was found; fetch errors (and Cancelled) are raised.
+    search_url = f"{SVGREPO_BASE}/search/{quote_plus(query)}/"
+    soup = _soup(fetcher.get(search_url, _text, timeout=20, log=log, cancel=cancel),
+                 SoupStrainer("a", class_=_has_class("icon-link")))
     # svgrepo's icon links often look like /svg/ID/name
     a = soup.select_one("a.icon-link")
-    if a and a.get("href"):
-        href = a["href"]
-        # construct download URL pattern: /download/ID/name.svg or /svg/ID/name
-        # Try to access href directly
-        full = "https://www.svgrepo.com" + href
-        # visit icon page
-        try:
-            r2 = session.get(full, timeout=15)
-            r2.raise_for_status()
-            s2 = BeautifulSoup(r2.text, "html.parser")
-            dl = s2.select_one("a#download-btn")
-            if dl and dl.get("href"):
-                dl_url = dl["href"]
-                if dl_url.startswith("/"):
-                    dl_url = "https://www.svgrepo.com" + dl_url
-                return dl_url
-        except Exception as e:
-            return None
-    return None
+    if not (a and a.get("href")):
+        return None
+    # visit icon page
+    page = SVGREPO_BASE + a["href"]
+    s2 = _soup(fetcher.get(page, _text, timeout=15, log=log, cancel=cancel),
+               SoupStrainer("a", id="download-btn"))
+    dl = s2.select_one("a#download-btn")
+    if not (dl and dl.get("href")):
+        return None
+    dl_url = dl["href"]
+    if dl_url.startswith("/"):
+        dl_url = SVGREPO_BASE + dl_url
+    return dl_url
+
+def scrape_freesvg(query, fetcher, log=print, cancel=None):
+    # freesvg.org: search page -> first result page -> its .svg image (same contract
+    # as scrape_svgrepo)
+    search_url = f"{FREESVG_BASE}/search?q={quote_plus(query)}"
+    soup = _soup(fetcher.get(search_url, _text, timeout=20, log=log, cancel=cancel),
+                 SoupStrainer("div", class_=_has_class("result")))
+    # find first result link
+    a = soup.select_one("div.result a")
+    if not (a and a.get("href")):
+        return None
+    page = FREESVG_BASE + a["href"]
+    s2 = _soup(fetcher.get(page, _text, timeout=15, log=log, cancel=cancel), SoupStrainer("img"))
+    img = s2.select_one("img[src$='.svg']")
+    if not img:
+        return None
+    src = img["src"]
+    if src.startswith("/"):
+        src = FREESVG_BASE + src
+    return src
 
-def search_freesvg(query, session=None):
+# tried in this order of preference, but all at once (see search_icon)
+SCRAPERS = (("svgrepo", scrape_svgrepo), ("freesvg", scrape_freesvg))
+
+def search_svgrepo(query, session=None, fetcher=None, log=print):
+    # Very basic search on svgrepo.com - attempts to return first SVG download link
+    try:
+        return scrape_svgrepo(query, fetcher or Fetcher(session), log=log)
+    except Exception as e:
+        log(f"svgrepo search failed: {e}")
+        return None
+
+def search_freesvg(query, session=None, fetcher=None, log=print):
     # Basic freesvg.org search (may return images in various formats)
-    if session is None:
-        session = requests.Session()
-    base = "https://freesvg.org"
-    search_url = f"{base}/search?q={quote_plus(query)}"
     try:
-        r = session.get(search_url, timeout=20)
-        r.raise_for_status()
+        return scrape_freesvg(query, fetcher or Fetcher(session), log=log)
     except Exception as e:
-        print("freesvg search failed:", e)
+        log(f"freesvg search failed: {e}")
         return None
-    soup = BeautifulSoup(r.text, "html.parser")
-    # find first result link
-    a = soup.select_one("div.result a")
-    if a and a.get("href"):
-        page = base + a["href"]
+
+def cached_scrape(provider, scrape, query, fetcher, cache=None, log=print, cancel=None):
+    # scrape() behind the "scrape" section of the cache. Found links are kept for
+    # good, misses for SCRAPE_MISS_TTL; failed or cancelled scrapes are not cached.
+    key = f"{provider}\t{query}"
+    hit = cache.get("scrape", key) if cache else None
+    if hit and (hit.get("url") or time.time() - hit.get("time", 0) < SCRAPE_MISS_TTL):
+        log(f"{provider}: cached result for '{query}'")
+        return hit.get("url")
+    try:
+        url = scrape(query, fetcher, log=log, cancel=cancel)
+    except Cancelled:
+        return None
+    except Exception as e:
+        log(f"{provider} search failed: {e}")
+        return None
+    if cache:
+        cache.put("scrape", key, {"url": url, "time": time.time()})
+    if not url:
+        log(f"{provider}: nothing found for '{query}'")
+    return url
+
+def search_icon(query, fetcher, cache=None, log=print):
+    # asks all SCRAPERS at once: the first one to find a link wins and the others are
+    # cancelled (they stop before their next request; nothing waits for them). Returns
+    # (provider, link) or (None, None).
+    cancel = threading.Event()
+    pool = ThreadPoolExecutor(max_workers=len(SCRAPERS))
+    logs = {}
+    pending = {}
+    for provider, scrape in SCRAPERS:
+        logs[provider] = []
+        fut = pool.submit(cached_scrape, provider, scrape, query, fetcher, cache,
+                          logs[provider].append, cancel)
+        pending[fut] = provider
+    try:
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            # when both finish together, keep the order of preference
+            for fut in sorted(finished, key=lambda f: [p for p, _ in SCRAPERS].index(pending[f])):
+                provider = pending.pop(fut)
+                for line in logs[provider]:
+                    log(line)
+                url = fut.result()
+                if url:
+                    if pending:
+                        log(f"{provider} answered first, cancelled {', '.join(pending.values())}")
+                    return provider, url
+        return None, None
+    finally:
+        cancel.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def process_url(url, out, fetcher, cache=None, state=None):
+    # one line of --urls; returns (log lines, staged path or None)
+    done = state.get("done", url) if state else None
+    if done:
+        return [f"Already done in the interrupted run: {done}"], done
+    lines = [f"Downloading: {url}"]
+    p = download_url(url, staging_folder(out, url), name_hint=os.path.basename(url),
+                     fetcher=fetcher, log=lines.append, cache=cache)
+    if p and state:
+        state.put("done", url, p)
+    return lines, p
+
+def process_row(row, out, try_search, fetcher, cache=None, state=None):
+    # one manifest row; returns (log lines, staged path or None)
+    lines = []
+    log = lines.append
+    name = row.get("name") or "icon"
+    url = row.get("url") or ""
+    key = f"{name}\t{url}"
+    done = state.get("done", key) if state else None
+    if done:
+        return [f"{name}: already done in the interrupted run: {done}"], done
+    p = None
+    if url:
+        log(f"Downloading {name} from manifest URL...")
+        p = download_url(url, staging_folder(out, url), name_hint=name, fetcher=fetcher,
+                         log=log, cache=cache)
+        if not p:
+            log(f"Failed to download from provided URL for {name}")
+    else:
+        if try_search:
+            dl = cache.get("search", name) if cache else None
+            if dl:
+                log(f"No URL for '{name}', using cached search result")
+            else:
+                log(f"No URL for '{name}', searching {', '.join(provider for provider, _ in SCRAPERS)}...")
+                _, dl = search_icon(name, fetcher, cache=cache, log=log)
+                if dl and cache:
+                    cache.put("search", name, dl)
+            if dl:
+                log(f"Found download link: {dl}")
+                p = download_url(dl, staging_folder(out, dl), name_hint=name, fetcher=fetcher,
+                                 log=log, cache=cache)
+                if not p:
+                    log(f"Failed to download from discovered link for {name}")
+            else:
+                log(f"No candidate found for {name}")
+        else:
+            log(f"No URL for {name} - skipping (use --try-search to attempt auto-search)")
+    if p and state:
+        state.put("done", key, p)
+    return lines, p
+
+def run_jobs(jobs, workers, publish=None):
+    # runs the (fn, args) jobs on a thread pool; prints each job's log in submission
+    # order as soon as it and all earlier jobs are done. publish(path, log) is called
+    # with each job's result in that same order and returns the final path (or None).
+    # Returns the number saved.
+    # On Ctrl+C jobs that have not started are cancelled; running ones finish.
+    downloaded = 0
+    total = len(jobs)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(fn, *fn_args) for fn, fn_args in jobs]
         try:
-            r2 = session.get(page, timeout=15)
-            r2.raise_for_status()
-            s2 = BeautifulSoup(r2.text, "html.parser")
-            img = s2.select_one("img[src$='.svg']")
-            if img:
-                src = img["src"]
-                if src.startswith("/"):
-                    src = base + src
-                return src
-        except Exception as e:
-            return None
-    return None
+            for i, fut in enumerate(futures, 1):
+                lines, p = fut.result()
+                if p and publish:
+                    p = publish(p, lines.append)
+                for line in lines:
+                    print(f"[{i}/{total}] {line}")
+                if p:
+                    downloaded += 1
+        except KeyboardInterrupt:
+            for fut in futures:
+                fut.cancel()
+            raise
+    return downloaded
+
+def run_resumable(jobs, workers, cache, state, stats=None, publish=None):
+    # run_jobs + persistence: the state file survives an interrupted run
+    try:
+        downloaded = run_jobs(jobs, workers, publish)
+    except KeyboardInterrupt:
+        print("Interrupted - finished rows are recorded, rerun to continue.")
+        sys.exit(130)
+    finally:
+        cache.save(force=True)
+        state.save(force=True)
+        if stats:
+            for line in stats.summary():
+                print(line)
+    state.finish()
+    return downloaded
 
 def main():
     parser = argparse.ArgumentParser()
@@ -118,22 +853,31 @@ def main():
     parser.add_argument("--urls", default=None, help="Plain text file with one SVG URL per line")
     parser.add_argument("--out", default=OUTDIR, help="Output folder for SVGs")
     parser.add_argument("--try-search", action="store_true", help="Try searching svgrepo/freesvg for empty URLs")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Rows processed concurrently")
+    parser.add_argument("--per-host", type=int, default=DEFAULT_PER_HOST, help="Max concurrent requests per host")
+    parser.add_argument("--no-cache", action="store_true", help="Ignore and do not update the download cache")
+    parser.add_argument("--restart", action="store_true", help="Ignore the state of an interrupted run")
+    parser.add_argument("--retries", type=int, default=DEFAULT_RETRIES, help="Retries per request on transient errors")
     args = parser.parse_args()
+    if args.workers < 1 or args.per_host < 1:
+        parser.error("--workers and --per-host must be at least 1")
+    if args.retries < 0:
+        parser.error("--retries must not be negative")
 
     os.makedirs(args.out, exist_ok=True)
-    session = requests.Session()
-    downloaded = 0
+    fetcher = Fetcher(make_session(args.workers), HostLimiter(args.per_host), args.retries)
+    cache = DownloadCache(None if args.no_cache else os.path.join(args.out, CACHE_FILE))
+    state = RunState(os.path.join(args.out, STATE_FILE), restart=args.restart)
+    publisher = Publisher(args.out)
 
     if args.urls:
         with open(args.urls, "r", encoding="utf-8") as f:
             lines = [l.strip() for l in f if l.strip() and not l.strip().startswith("#")]
-        for url in lines:
-            print("Downloading:", url)
-            p = download_url(url, args.out, name_hint=os.path.basename(url), session=session)
-            if p:
-                print("Saved to", p)
-                downloaded += 1
+        jobs = [(process_url, (url, args.out, fetcher, cache, state)) for url in lines]
+        downloaded = run_resumable(jobs, args.workers, cache, state, fetcher.stats, publisher.publish)
         print("Done. Downloaded", downloaded, "files.")
+        if publisher.duplicates:
+            print("Skipped", publisher.duplicates, "duplicate SVGs.")
         return
 
     # otherwise read manifest CSV
@@ -141,39 +885,11 @@ def main():
         reader = csv.DictReader(csvfile)
         rows = list(reader)
 
-    for row in rows:
-        name = row.get("name") or "icon"
-        url = row.get("url") or ""
-        license = row.get("license") or ""
-        if url:
-            print(f"Downloading {name} from manifest URL...")
-            p = download_url(url, args.out, name_hint=name, session=session)
-            if p:
-                print("Saved:", p)
-                downloaded += 1
-            else:
-                print("Failed to download from provided URL for", name)
-        else:
-            if args.try_search:
-                print(f"No URL for '{name}', trying svgrepo search...")
-                dl = search_svgrepo(name, session=session)
-                if not dl:
-                    print("svgrepo didn't find it, trying freesvg...")
-                    dl = search_freesvg(name, session=session)
-                if dl:
-                    print("Found download link:", dl)
-                    p = download_url(dl, args.out, name_hint=name, session=session)
-                    if p:
-                        print("Saved:", p)
-                        downloaded += 1
-                    else:
-                        print("Failed to download from discovered link for", name)
-                else:
-                    print("No candidate found for", name)
-            else:
-                print("No URL for", name, "- skipping (use --try-search to attempt auto-search)")
-
+    jobs = [(process_row, (row, args.out, args.try_search, fetcher, cache, state)) for row in rows]
+    downloaded = run_resumable(jobs, args.workers, cache, state, fetcher.stats, publisher.publish)
     print("Finished. Total downloaded:", downloaded)
+    if publisher.duplicates:
+        print("Skipped", publisher.duplicates, "duplicate SVGs.")
 
 if __name__ == '__main__':
     main()
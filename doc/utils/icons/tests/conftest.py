@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+from stand_in import StandIn  # noqa: E402
+
+
+@pytest.fixture
+def server():
+    with StandIn() as s:
+        yield s
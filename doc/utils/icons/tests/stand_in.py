@@ -0,0 +1,134 @@
+# stand_in.py - local stand-in for the icon hosts, used by the download_svgs tests.
+# Serves on an ephemeral 127.0.0.1 port from a background thread and records how many
+# requests each path got and how many were in flight at once, per host name (the
+# Host header, so 127.0.0.1 and localhost count as two hosts, as they do for
+# HostLimiter).
+#
+# Any path ending in .svg gets a small SVG that names the path in data-src. Query
+# parameters work on every path:
+#   delay=S   wait S seconds before answering
+#   same=1    serve one fixed SVG, whatever the path (duplicate content)
+#   fail=N    the first N requests for the path fail, by default with 503; also:
+#     status=CODE     fail with this status instead (304: a bare Not Modified)
+#     retry_after=V   send Retry-After: V with the failure
+#     drop=1          close the connection without answering
+#     stall=S         wait S seconds before answering (for client timeouts)
+# Every SVG has an ETag; a matching If-None-Match gets 304.
+#
+# HTML pages are registered with page(target, fixture): the request target (path and
+# query) is answered with that file from fixtures/. delay(prefix, S) slows down every
+# request under a path prefix, e.g. one fake search site.
+
+import os, threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+SVG = ('<?xml version="1.0"?>\n<!-- stand-in -->\n'
+       '<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 24 24" data-src="{src}">\n'
+       '  <title>{src}</title>\n  <path d="M0 0h24v24H0z"/>\n</svg>\n')
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+class StandIn:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hits = {}        # path -> requests
+        self.active = {}      # host -> requests in flight
+        self.peaks = {}       # host -> most requests in flight at once
+        self.peak_total = 0
+        self._total = 0
+        self.pages = {}       # request target -> HTML bytes
+        self.delays = {}      # path prefix -> seconds
+        handler = type("Handler", (_Handler,), {"stand_in": self})
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self._thread = threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def url(self, path, host="127.0.0.1"):
+        return f"http://{host}:{self.port}{path}"
+
+    def page(self, target, fixture):
+        with open(os.path.join(FIXTURES, fixture), "rb") as f:
+            self.pages[target] = f.read()
+
+    def delay(self, prefix, seconds):
+        self.delays[prefix] = seconds
+
+    def enter(self, host, path):
+        with self.lock:
+            self.hits[path] = self.hits.get(path, 0) + 1
+            self.active[host] = self.active.get(host, 0) + 1
+            self.peaks[host] = max(self.peaks.get(host, 0), self.active[host])
+            self._total += 1
+            self.peak_total = max(self.peak_total, self._total)
+            return self.hits[path]
+
+    def leave(self, host):
+        with self.lock:
+            self.active[host] -= 1
+            self._total -= 1
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so pooled connections are reused
+    stand_in = None
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        host = (self.headers.get("Host") or "").rsplit(":", 1)[0]
+        url = urlparse(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        hit = self.stand_in.enter(host, url.path)
+        try:
+            delay = float(query.get("delay", 0)) + sum(
+                s for prefix, s in self.stand_in.delays.items() if url.path.startswith(prefix))
+            if delay:
+                threading.Event().wait(delay)
+            if self.path in self.stand_in.pages:
+                self.send(200, self.stand_in.pages[self.path], "text/html; charset=utf-8")
+            elif hit <= int(query.get("fail", 0)):
+                self.fail(query)
+            else:
+                self.respond(url.path, query)
+        finally:
+            self.stand_in.leave(host)
+
+    def fail(self, query):
+        if query.get("drop"):
+            self.close_connection = True
+            return
+        if "stall" in query:
+            threading.Event().wait(float(query["stall"]))
+        headers = {"Retry-After": query["retry_after"]} if "retry_after" in query else None
+        status = int(query.get("status", 503))
+        if status == 304:  # no body, whatever was asked
+            return self.send(304, b"", None, headers)
+        self.send(status, b"try again", "text/plain", headers)
+
+    def respond(self, path, query):
+        if not path.endswith(".svg"):
+            return self.send(404, b"not found", "text/plain")
+        src = "same" if query.get("same") else path
+        etag = f'"{src}"'
+        if self.headers.get("If-None-Match") == etag:
+            return self.send(304, b"", None, {"ETag": etag})
+        self.send(200, SVG.format(src=src).encode("utf-8"), "image/svg+xml", {"ETag": etag})
+
+    def send(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        if content_type:
+            self.send_header("Content-Type", content_type)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
@@ -0,0 +1,166 @@
+import csv
+import os
+import re
+
+import download_svgs as d
+
+
+def fetcher(per_host, workers=8):
+    return d.Fetcher(d.make_session(workers), d.HostLimiter(per_host), retries=0)
+
+
+def printed_rows(out):
+    # [(row number, line)] as printed by run_jobs
+    return [(int(m.group(1)), m.group(2))
+            for m in re.finditer(r"^\[(\d+)/\d+\] (.*)$", out, re.M)]
+
+
+def test_host_limiter_caps_requests_per_host(server, tmp_path):
+    f = fetcher(per_host=2)
+    urls = [server.url(f"/icons/{i}.svg?delay=0.2", host) for i in range(6)
+            for host in ("127.0.0.1", "localhost")]
+    jobs = [(d.process_url, (url, str(tmp_path), f)) for url in urls]
+
+    assert d.run_jobs(jobs, workers=8) == len(urls)
+
+    assert server.peaks == {"127.0.0.1": 2, "localhost": 2}
+    # the two hosts did not wait for each other
+    assert server.peak_total == 4
+    assert f.stats.counts["requests"] == len(urls)
+
+
+def test_run_jobs_reports_in_submission_order(server, tmp_path, capsys):
+    # later rows answer first
+    urls = [server.url(f"/icons/{i}.svg?delay={(5 - i) * 0.1:.1f}") for i in range(5)]
+    jobs = [(d.process_url, (url, str(tmp_path), fetcher(per_host=8))) for url in urls]
+    published = []
+
+    def publish(path, log):
+        published.append(path)
+        return path
+
+    assert d.run_jobs(jobs, workers=5, publish=publish) == 5
+
+    rows = printed_rows(capsys.readouterr().out)
+    assert [n for n, _ in rows] == sorted(n for n, _ in rows)
+    assert [line for _, line in rows if line.startswith("Downloading")] == [
+        f"Downloading: {url}" for url in urls]
+    assert published == [os.path.join(d.staging_folder(str(tmp_path), url), f"{i}.svg")
+                         for i, url in enumerate(urls)]
+
+
+def test_publish_does_not_depend_on_finish_order(server, tmp_path, monkeypatch, capsys):
+    manifest = tmp_path / "manifest.csv"
+    out = tmp_path / "out"
+    rows = [
+        ("first", server.url("/a/icon.svg?delay=0.5")),  # slowest, still wins icon.svg
+        ("second", server.url("/b/icon.svg")),
+        ("third", server.url("/c/Icon.svg")),           # clashes on a case-insensitive fs
+        ("copy", server.url("/d/copy.svg?same=1")),
+        ("copy-again", server.url("/e/other.svg?same=1")),
+    ]
+    with open(manifest, "w", newline="", encoding="utf-8") as fh:
+        w = csv.writer(fh)
+        w.writerow(["index", "name", "url"])
+        w.writerows((i, name, url) for i, (name, url) in enumerate(rows, 1))
+    monkeypatch.setattr("sys.argv", ["download_svgs.py", "--manifest", str(manifest),
+                                     "--out", str(out), "--workers", "5", "--no-cache"])
+
+    d.main()
+
+    saved = {name: (out / name).read_text(encoding="utf-8")
+             for name in os.listdir(out) if name.endswith(".svg")}
+    assert sorted(saved) == ["Icon-3.svg", "copy.svg", "icon-2.svg", "icon.svg"]
+    assert 'data-src="/a/icon.svg"' in saved["icon.svg"]
+    assert 'data-src="/b/icon.svg"' in saved["icon-2.svg"]
+    assert 'data-src="/c/Icon.svg"' in saved["Icon-3.svg"]
+    # minified on the way in
+    assert "<title>" not in saved["icon.svg"] and "stand-in" not in saved["icon.svg"]
+    printed = capsys.readouterr().out
+    assert "Finished. Total downloaded: 4" in printed
+    assert "Skipped 1 duplicate SVGs." in printed
+    assert not (out / d.STATE_FILE).exists()
+
+
+def test_file_errors_fail_only_their_row(server, tmp_path, capsys):
+    blocked = tmp_path / "blocked"  # a file where the staging folder should go
+    blocked.write_text("", encoding="utf-8")
+    out = tmp_path / "out"
+    (out / "1.svg").mkdir(parents=True)  # a folder where the published file should go
+    urls = [server.url(f"/icons/{i}.svg") for i in range(3)]
+    jobs = [(d.process_url, (urls[0], str(blocked), fetcher(per_host=8)))]
+    jobs += [(d.process_url, (url, str(tmp_path), fetcher(per_host=8))) for url in urls[1:]]
+
+    assert d.run_jobs(jobs, workers=3, publish=d.Publisher(str(out)).publish) == 1
+
+    lines = [line for _, line in printed_rows(capsys.readouterr().out)]
+    assert any(line.startswith(f"Failed to download {urls[0]}: ") for line in lines)
+    assert any(line.startswith(f"Failed to save {out / '1.svg'}: ") for line in lines)
+    assert (out / "2.svg").is_file()
+    assert sorted(os.listdir(out)) == ["1.svg", "2.svg"]  # no .part left behind
+
+
+def test_unchanged_download_is_revalidated(server, tmp_path):
+    url = server.url("/icons/etag.svg")
+    cache = d.DownloadCache(None)
+    first = d.download_url(url, str(tmp_path), fetcher=fetcher(per_host=1), cache=cache)
+    saved = open(first, encoding="utf-8").read()
+    lines = []
+
+    again = d.download_url(url, str(tmp_path), fetcher=fetcher(per_host=1), log=lines.append,
+                           cache=cache)
+
+    assert again == first
+    assert lines == [f"Not modified: {url}"]
+    assert open(again, encoding="utf-8").read() == saved
+    assert server.hits["/icons/etag.svg"] == 2
+
+
+def test_bare_304_is_a_cache_miss(server, tmp_path):
+    # the first answer is a 304 although nothing was cached to revalidate
+    url = server.url("/icons/bare.svg?fail=1&status=304")
+
+    path = d.download_url(url, str(tmp_path), fetcher=fetcher(per_host=1),
+                          cache=d.DownloadCache(None))
+
+    assert 'data-src="/icons/bare.svg"' in open(path, encoding="utf-8").read()
+    assert server.hits["/icons/bare.svg"] == 2
+
+
+def test_interrupted_run_resumes_from_the_state_file(server, tmp_path, monkeypatch, capsys):
+    manifest = tmp_path / "manifest.csv"
+    out = tmp_path / "out"
+    done_url, todo_url = server.url("/done/first.svg"), server.url("/todo/second.svg")
+    manifest.write_text(f"index,name,url\n1,first,{done_url}\n2,second,{todo_url}\n",
+                        encoding="utf-8")
+    # what the interrupted run left: the first row staged and recorded as done
+    staged = os.path.join(d.staging_folder(str(out), done_url), "first.svg")
+    os.makedirs(os.path.dirname(staged))
+    with open(staged, "w", encoding="utf-8") as fh:
+        fh.write('<svg xmlns="http://www.w3.org/2000/svg" data-src="earlier run"/>')
+    d.write_json_atomic(str(out / d.STATE_FILE), {"done": {f"first\t{done_url}": staged}})
+    monkeypatch.setattr("sys.argv", ["download_svgs.py", "--manifest", str(manifest),
+                                     "--out", str(out), "--no-cache"])
+
+    d.main()
+
+    assert "/done/first.svg" not in server.hits
+    assert server.hits["/todo/second.svg"] == 1
+    assert "earlier run" in (out / "first.svg").read_text(encoding="utf-8")
+    assert (out / "second.svg").is_file()
+    assert "Finished. Total downloaded: 2" in capsys.readouterr().out
+    assert not (out / d.STATE_FILE).exists()
+
+
+def test_cached_search_result_is_reused(server, tmp_path):
+    found = server.url("/found/skull.svg")
+    cache = d.DownloadCache(None)
+    cache.put("search", "skull", found)
+
+    lines, staged = d.process_row({"name": "skull", "url": ""}, str(tmp_path), True,
+                                  fetcher(per_host=1), cache)
+
+    assert "No URL for 'skull', using cached search result" in lines
+    assert staged == os.path.join(d.staging_folder(str(tmp_path), found), "skull.svg")
+    # no search page was fetched
+    assert server.hits == {"/found/skull.svg": 1}
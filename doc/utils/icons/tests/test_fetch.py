@@ -0,0 +1,136 @@
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+
+import pytest
+import requests
+
+import download_svgs as d
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    # the retry sleeps Fetcher would have made (the stand-in waits on Events instead)
+    made = []
+    monkeypatch.setattr(d.time, "sleep", made.append)
+    return made
+
+
+def fetcher(retries=3, pool_size=4):
+    return d.Fetcher(d.make_session(pool_size), d.HostLimiter(4), retries=retries)
+
+
+def get(f, url, timeout=5):
+    return f.get(url, d._text, timeout=timeout, log=lambda line: None)
+
+
+def test_retry_after_is_honored(server, sleeps):
+    f = fetcher()
+    url = server.url("/flaky.svg?fail=2&retry_after=1")
+
+    assert "<svg" in get(f, url)
+
+    assert sleeps == [1.0, 1.0]
+    assert server.hits["/flaky.svg"] == 3
+    assert f.stats.counts == {"requests": 1, "attempts": 3, "retries": 2, "failed": 0}
+
+
+def test_retry_after_is_capped(server, sleeps):
+    get(fetcher(), server.url("/flaky.svg?fail=1&status=429&retry_after=3600"))
+
+    assert sleeps == [d.RETRY_AFTER_CAP]
+
+
+def test_backoff_is_jittered_when_there_is_no_retry_after(server, sleeps):
+    random.seed(1)
+    get(fetcher(), server.url("/flaky.svg?fail=3&status=502"))
+
+    assert len(sleeps) == 3
+    for n, delay in enumerate(sleeps, 1):
+        assert 0 <= delay <= d.BACKOFF_BASE * 2 ** (n - 1)
+    assert len(set(sleeps)) == 3
+
+
+def test_backoff_delay_bounds():
+    random.seed(2)
+    for retry in (1, 2, 3, 10):
+        limit = min(d.BACKOFF_CAP, d.BACKOFF_BASE * 2 ** (retry - 1))
+        delays = [d.backoff_delay(retry) for _ in range(500)]
+        assert 0 <= min(delays) < limit * 0.1
+        assert limit * 0.9 < max(delays) <= limit
+
+
+def test_parse_retry_after():
+    assert d.parse_retry_after("7") == 7.0
+    assert d.parse_retry_after("-3") == 0.0
+    assert 18 < d.parse_retry_after(formatdate(time.time() + 20, usegmt=True)) <= 20
+    assert d.parse_retry_after(formatdate(time.time() - 60, usegmt=True)) == 0.0
+    assert d.parse_retry_after("soon") is None
+    assert d.parse_retry_after(None) is None
+
+
+def test_gives_up_after_the_last_retry(server, sleeps, tmp_path):
+    f = fetcher(retries=2)
+    logged = []
+
+    assert d.download_url(server.url("/down.svg?fail=99&status=500"), str(tmp_path),
+                          fetcher=f, log=logged.append) is None
+
+    assert server.hits["/down.svg"] == 3
+    assert len(sleeps) == 2
+    assert f.stats.counts["failed"] == 1
+    assert logged[-1].startswith("Failed to download") and "500" in logged[-1]
+
+
+def test_other_errors_are_not_retried(server, sleeps):
+    f = fetcher()
+    with pytest.raises(requests.HTTPError):
+        get(f, server.url("/missing.png"))
+
+    assert server.hits["/missing.png"] == 1
+    assert sleeps == []
+
+
+def test_dropped_connection_is_retried(server, sleeps):
+    f = fetcher()
+
+    assert "<svg" in get(f, server.url("/dropped.svg?fail=1&drop=1"))
+
+    assert server.hits["/dropped.svg"] == 2
+    assert f.stats.counts["retries"] == 1
+
+
+def test_timeout_is_retried(server, sleeps):
+    f = fetcher()
+
+    assert "<svg" in get(f, server.url("/stalled.svg?fail=1&stall=1"), timeout=0.2)
+
+    assert server.hits["/stalled.svg"] == 2
+    assert f.stats.counts["retries"] == 1
+
+
+def test_connection_timings(server):
+    f = fetcher()
+    # localhost exercises the name lookup, then the keep-alive connection is reused
+    for _ in range(3):
+        get(f, server.url("/timed.svg?delay=0.1", host="localhost"))
+
+    samples = f.stats.samples
+    assert len(samples["dns"]) == len(samples["connect"]) == 1
+    assert len(samples["ttfb"]) == len(samples["total"]) == 3
+    assert min(samples["ttfb"]) >= 0.1
+    assert all(total >= ttfb for total, ttfb in zip(samples["total"], samples["ttfb"]))
+    assert f.stats.summary()[0] == "Fetch summary: 3 requests, 3 attempts, 0 retries, 0 failed"
+
+
+def test_pool_keeps_a_connection_per_worker(server):
+    # a pool smaller than the number of workers would drop connections after each wave
+    workers = 6
+    f = d.Fetcher(d.make_session(workers), d.HostLimiter(workers), retries=0)
+    with ThreadPoolExecutor(workers) as pool:
+        for wave in range(3):
+            list(pool.map(lambda i: get(f, server.url(f"/w{i}.svg?delay=0.2")), range(workers)))
+
+    assert server.peak_total == workers
+    assert len(f.stats.samples["connect"]) == workers
@@ -0,0 +1,157 @@
+import os
+import threading
+import time
+
+import pytest
+import requests
+from bs4 import BeautifulSoup
+
+import download_svgs as d
+
+SVGREPO_HIT = "/svgrepo/download/106187/skull.svg"
+FREESVG_HIT = "/freesvg/img/Skull-and-crossbones.svg"
+
+
+@pytest.fixture
+def sites(server, monkeypatch):
+    # both search sites on the stand-in, answering from the saved pages in fixtures/
+    server.page("/svgrepo/search/skull/", "svgrepo_search_skull.html")
+    server.page("/svgrepo/svg/106187/skull", "svgrepo_icon_skull.html")
+    server.page("/svgrepo/search/anchor/", "svgrepo_search_empty.html")
+    server.page("/freesvg/search?q=skull", "freesvg_search_skull.html")
+    server.page("/freesvg/skull-and-crossbones-vector", "freesvg_page_skull.html")
+    server.page("/freesvg/search?q=anchor", "freesvg_search_empty.html")
+    monkeypatch.setattr(d, "SVGREPO_BASE", server.url("/svgrepo"))
+    monkeypatch.setattr(d, "FREESVG_BASE", server.url("/freesvg"))
+    return server
+
+
+def fetcher():
+    return d.Fetcher(d.make_session(4), d.HostLimiter(4), retries=0)
+
+
+def wait_idle(server, timeout=5):
+    # the losing scraper is not waited for by search_icon
+    deadline = time.monotonic() + timeout
+    while any(server.active.values()) and time.monotonic() < deadline:
+        time.sleep(0.02)
+
+
+# the scrapers as they were before SoupStrainer and lxml: whole pages, html.parser
+
+def old_scrape_svgrepo(query, session):
+    r = session.get(f"{d.SVGREPO_BASE}/search/{query}/", timeout=20)
+    a = BeautifulSoup(r.text, "html.parser").select_one("a.icon-link")
+    if not (a and a.get("href")):
+        return None
+    r2 = session.get(d.SVGREPO_BASE + a["href"], timeout=15)
+    dl = BeautifulSoup(r2.text, "html.parser").select_one("a#download-btn")
+    if not (dl and dl.get("href")):
+        return None
+    return d.SVGREPO_BASE + dl["href"] if dl["href"].startswith("/") else dl["href"]
+
+
+def old_scrape_freesvg(query, session):
+    r = session.get(f"{d.FREESVG_BASE}/search?q={query}", timeout=20)
+    a = BeautifulSoup(r.text, "html.parser").select_one("div.result a")
+    if not (a and a.get("href")):
+        return None
+    r2 = session.get(d.FREESVG_BASE + a["href"], timeout=15)
+    img = BeautifulSoup(r2.text, "html.parser").select_one("img[src$='.svg']")
+    if not img:
+        return None
+    return d.FREESVG_BASE + img["src"] if img["src"].startswith("/") else img["src"]
+
+
+@pytest.mark.parametrize("parser", ["html.parser", "lxml"])
+@pytest.mark.parametrize("query", ["skull", "anchor"])
+@pytest.mark.parametrize("scrape, old_scrape", [
+    (d.scrape_svgrepo, old_scrape_svgrepo),
+    (d.scrape_freesvg, old_scrape_freesvg),
+], ids=["svgrepo", "freesvg"])
+def test_scrapers_find_what_the_full_page_parse_found(sites, monkeypatch, parser, query,
+                                                      scrape, old_scrape):
+    if parser == "lxml":
+        pytest.importorskip("lxml")
+    monkeypatch.setattr(d, "HTML_PARSER", parser)
+    expected = old_scrape(query, requests.Session())
+
+    assert scrape(query, fetcher(), log=lambda line: None) == expected
+    assert (expected is None) == (query == "anchor")
+
+
+def test_first_answer_wins_and_the_other_site_is_cancelled(sites):
+    sites.delay("/freesvg/", 0.5)
+    cache = d.DownloadCache(None)
+    logged = []
+
+    t0 = time.monotonic()
+    assert d.search_icon("skull", fetcher(), cache, logged.append) == (
+        "svgrepo", sites.url(SVGREPO_HIT))
+    assert time.monotonic() - t0 < 0.5
+
+    wait_idle(sites)
+    assert sites.hits["/freesvg/search"] == 1
+    assert "/freesvg/skull-and-crossbones-vector" not in sites.hits
+    assert "svgrepo answered first, cancelled freesvg" in logged
+    # a cancelled scrape says nothing about the site, so it is not cached
+    assert cache.get("scrape", "freesvg\tskull") is None
+    assert cache.get("scrape", "svgrepo\tskull")["url"] == sites.url(SVGREPO_HIT)
+
+
+def test_slower_site_answers_when_the_preferred_one_finds_nothing(sites):
+    sites.page("/svgrepo/search/skull/", "svgrepo_search_empty.html")
+    sites.delay("/freesvg/", 0.2)
+    cache = d.DownloadCache(None)
+
+    assert d.search_icon("skull", fetcher(), cache, log=lambda line: None) == (
+        "freesvg", sites.url(FREESVG_HIT))
+    assert cache.get("scrape", "svgrepo\tskull")["url"] is None
+
+
+def test_misses_are_cached_until_they_expire(sites, monkeypatch):
+    cache = d.DownloadCache(None)
+    quiet = lambda line: None
+
+    assert d.search_icon("anchor", fetcher(), cache, quiet) == (None, None)
+    assert d.search_icon("anchor", fetcher(), cache, quiet) == (None, None)
+    assert sites.hits == {"/svgrepo/search/anchor/": 1, "/freesvg/search": 1}
+
+    monkeypatch.setattr(d, "SCRAPE_MISS_TTL", 0)
+    d.search_icon("anchor", fetcher(), cache, quiet)
+    assert sites.hits == {"/svgrepo/search/anchor/": 2, "/freesvg/search": 2}
+
+
+def test_failed_scrape_is_not_cached(sites):
+    cache = d.DownloadCache(None)
+    logged = []
+
+    assert d.cached_scrape("svgrepo", d.scrape_svgrepo, "no such page", fetcher(),
+                           cache, logged.append) is None
+    assert logged[-1].startswith("svgrepo search failed: 404")
+    assert cache.get("scrape", "svgrepo\tno such page") is None
+
+
+def test_cancelled_fetch_sends_nothing(server):
+    f = fetcher()
+    cancel = threading.Event()
+    cancel.set()
+
+    with pytest.raises(d.Cancelled):
+        f.get(server.url("/icon.svg"), d._text, timeout=5, cancel=cancel)
+
+    assert server.hits == {}
+    assert f.stats.counts["failed"] == 0
+
+
+def test_manifest_row_without_url_is_found_and_downloaded(sites, tmp_path):
+    # both sites know the icon: hold freesvg back so svgrepo answers first
+    sites.delay("/freesvg/", 0.5)
+    out = str(tmp_path)
+    cache = d.DownloadCache(None)
+
+    lines, staged = d.process_row({"name": "skull", "url": ""}, out, True, fetcher(), cache)
+
+    assert f"Found download link: {sites.url(SVGREPO_HIT)}" in lines
+    assert staged == os.path.join(d.staging_folder(out, sites.url(SVGREPO_HIT)), "skull.svg")
+    assert cache.get("search", "skull") == sites.url(SVGREPO_HIT)
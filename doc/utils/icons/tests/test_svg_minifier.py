@@ -0,0 +1,90 @@
+import pytest
+
+import download_svgs as d
+
+SVG_OPEN = '<svg xmlns="http://www.w3.org/2000/svg">'
+
+
+def minify(data, chunk=None):
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    m = d.SvgMinifier()
+    step = chunk or len(data) or 1
+    out = b"".join(m.feed(data[i:i + step]) for i in range(0, len(data), step))
+    return (out + m.close()).decode("utf-8")
+
+
+def test_default_namespace_is_kept_and_svg_without_one_is_accepted():
+    assert minify(SVG_OPEN + '<path d="M0 0"/></svg>') == SVG_OPEN + '<path d="M0 0"/></svg>'
+    assert minify('<svg viewBox="0 0 1 1"><g/></svg>') == '<svg viewBox="0 0 1 1"><g/></svg>'
+
+
+def test_xlink_prefix_is_kept():
+    src = ('<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink">'
+           '<use xlink:href="#a"/></svg>')
+
+    assert minify(src) == src
+
+
+def test_cdata_and_entities_are_written_escaped():
+    src = (SVG_OPEN + '<style><![CDATA[ a > b { fill: red } ]]></style>'
+           '<text class="&quot;q&quot;">&#x41;&amp;&lt;</text></svg>')
+
+    assert minify(src) == (SVG_OPEN + '<style> a &gt; b { fill: red } </style>'
+                           '<text class="&quot;q&quot;">A&amp;&lt;</text></svg>')
+
+
+def test_declaration_doctype_comments_and_metadata_are_dropped():
+    src = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+           '<!DOCTYPE svg PUBLIC "-//W3C//DTD SVG 1.1//EN" '
+           '"http://www.w3.org/Graphics/SVG/1.1/DTD/svg11.dtd">\n'
+           '<!-- exported -->\n' + SVG_OPEN + '\n  <title>icon</title>\n  <metadata><x/></metadata>\n'
+           '  <path   d="M0  0\n h1"/>\n</svg>\n')
+
+    assert minify(src) == SVG_OPEN + '<path d="M0 0 h1"/></svg>'
+
+
+def test_editor_namespaces_are_removed():
+    src = ('<svg xmlns="http://www.w3.org/2000/svg" '
+           'xmlns:inkscape="http://www.inkscape.org/namespaces/inkscape" '
+           'xmlns:sodipodi="http://sodipodi.sourceforge.net/DTD/sodipodi-0.dtd" '
+           'sodipodi:docname="x.svg">'
+           '<sodipodi:namedview inkscape:zoom="2"><inkscape:grid/></sodipodi:namedview>'
+           '<g inkscape:label="Layer 1"><path d="M0 0"/></g></svg>')
+
+    assert minify(src) == SVG_OPEN + '<g><path d="M0 0"/></g></svg>'
+
+
+def test_xml_space_preserve_keeps_whitespace():
+    src = (SVG_OPEN + '<text xml:space="preserve">  a   b <tspan>  c  </tspan>\n</text>'
+           '<g xml:space="preserve"><text xml:space="default"> d   e </text></g></svg>')
+
+    assert minify(src) == (SVG_OPEN + '<text xml:space="preserve">  a   b <tspan>  c  </tspan>\n</text>'
+                           '<g xml:space="preserve"><text xml:space="default"> d e </text></g></svg>')
+
+
+@pytest.mark.parametrize("chunk", [1, 2, 7])
+def test_output_does_not_depend_on_chunk_boundaries(chunk):
+    src = ('<?xml version="1.0"?>\n<svg xmlns="http://www.w3.org/2000/svg" '
+           'xmlns:xlink="http://www.w3.org/1999/xlink">\n  <title>é</title>\n'
+           '  <text xml:space="preserve"> ü  &amp; </text>\n  <use xlink:href="#a"/>\n</svg>\n')
+
+    assert minify(src, chunk) == minify(src)
+
+
+@pytest.mark.parametrize("page", [
+    "<!DOCTYPE html>\n<html><head><title>404</title></head><body>Not found</body></html>",
+    "<html><body><p>Oops<br></p></body></html>",
+    "Service unavailable",
+    "",
+])
+def test_html_error_pages_are_rejected(page):
+    with pytest.raises(d.InvalidSvg):
+        minify(page)
+
+
+def test_non_svg_root_is_rejected_before_the_body_ends():
+    m = d.SvgMinifier()
+
+    with pytest.raises(d.InvalidSvg):
+        m.feed(b"<!DOCTYPE html>\n<html><head>")
@@ -1 +1 @@
-python project_packer.py --mode pack
+python project_packer.py --mode pack --incremental
@@ -1,102 +1,1514 @@
-import re
-from pathlib import Path
-
-OUTPUT_FILE = "all_project_files.md"
-PROJECT_ROOT = Path(".")
-
-# --- Разрешённые файлы и каталоги ---
-ALLOWED_ROOT_FILES = {
-    "vite.config.js",
-    "package.json",
-    "jsconfig.json",
-    "index.html",
-    ".env",
-}
-ALLOWED_DIRS = {"src", "supabase", ".github"}
-
-# ---------- 1. Сборка проекта в один MD ----------
-def pack_project_to_md(root_dir=PROJECT_ROOT, output_file=OUTPUT_FILE):
-    with open(output_file, "w", encoding="utf-8") as out:
-        out.write("## 📦 All project files\n\n")
-
-        for path in sorted(root_dir.rglob("*")):
-            rel_path = path.relative_to(root_dir)
-
-            if path.is_dir():
-                continue
-
-            # фильтрация по разрешённым путям
-            if (
-                rel_path.parts[0] not in ALLOWED_DIRS
-                and str(rel_path) not in ALLOWED_ROOT_FILES
-            ):
-                continue
-
-            if path.name == output_file:
-                continue
-
-            out.write(f"### {rel_path}\n\n")
-            out.write("```" + path.suffix.lstrip('.') + "\n")
-            try:
-                with open(path, "r", encoding="utf-8") as f:
-                    out.write(f.read())
-            except Exception as e:
-                out.write(f"[Не удалось прочитать файл: {e}]")
-            out.write("\n```\n\n")
-
-    print(f"✅ Собрано в: {output_file}")
-
-
-# ---------- 2. Восстановление проекта из MD ----------
-def unpack_md_to_project(md_file=OUTPUT_FILE, target_root=PROJECT_ROOT):
-    with open(md_file, "r", encoding="utf-8") as f:
-        content = f.read()
-
-    # шаблон: ### путь ... ```код```
-    pattern = re.compile(r"^### (.+?)\n\n```(?:.*?)\n(.*?)\n```", re.M | re.S)
-    matches = pattern.findall(content)
-
-    if not matches:
-        print("⚠️  Не найдено ни одного файла в .md")
-        return
-
-    for rel_path, file_content in matches:
-        rel = Path(rel_path)
-        # разрешаем только src/** и указанные файлы
-        if (
-            rel.parts[0] not in ALLOWED_DIRS
-            and str(rel) not in ALLOWED_ROOT_FILES
-        ):
-            print(f"⏩ Пропущен (не разрешён): {rel_path}")
-            continue
-
-        file_path = target_root / rel
-        file_path.parent.mkdir(parents=True, exist_ok=True)
-
-        with open(file_path, "w", encoding="utf-8") as out:
-            out.write(file_content)
-
-        print(f"📝 Перезаписан: {rel_path}")
-
-    print("✅ Восстановление завершено!")
-
-
-# ---------- CLI ----------
-if __name__ == "__main__":
-    import argparse
-
-    parser = argparse.ArgumentParser(
-        description="Пакует или распаковывает Vue-проект в один Markdown-файл (только src/ и разрешённые файлы в корне)."
-    )
-    parser.add_argument(
-        "--mode",
-        choices=["pack", "unpack"],
-        required=True,
-        help="pack — собрать файлы в all_project_files.md; unpack — восстановить файлы из него.",
-    )
-    args = parser.parse_args()
-
-    if args.mode == "pack":
-        pack_project_to_md()
-    elif args.mode == "unpack":
-        unpack_md_to_project()
+import base64
+import codecs
+import hashlib
+import fnmatch
+import glob
+import gzip
+import json
+import mmap
+import os
+import re
+import shutil
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import zstandard
+except ImportError:  # zstd — необязательная зависимость (pip install zstandard)
+    zstandard = None
+
+OUTPUT_FILE = "all_project_files.md"
+PROJECT_ROOT = Path(".")
+
+# Размер блока для потокового копирования тел файлов и чтения бандла.
+# Пиковая память pack/unpack ограничена этим значением, а не размером проекта.
+CHUNK_SIZE = 64 * 1024
+
+# Минимальное ограждение блока кода. Pack берёт ограждение длиннее любой
+# серии обратных кавычек внутри файла, поэтому ``` в содержимом (markdown,
+# README) не закрывает блок раньше времени.
+FENCE = b"```"
+_BACKTICK_RUN_RE = re.compile(rb"`+")
+
+# Стадия чтения: файлы до PREFETCH_LIMIT байт читаются и проверяются целиком
+# в пуле потоков заранее, более крупные копируются писателем блоками.
+# Одновременно в работе не больше workers * PREFETCH_WINDOW файлов.
+PREFETCH_LIMIT = 256 * 1024
+PREFETCH_WINDOW = 4
+DEFAULT_WORKERS = 8
+
+# По первому блоку файла решается, текстовый ли он (см. _looks_binary).
+SNIFF_SIZE = 8192
+BINARY_MAGIC = (
+    b"\x89PNG", b"\xff\xd8\xff", b"GIF8", b"%PDF", b"PK\x03\x04",
+    b"wOFF", b"wOF2", b"\x00\x01\x00\x00", b"OTTO", b"\x00\x00\x01\x00",
+    b"RIFF", b"\x1f\x8b",
+)
+# Бинарные файлы (картинки, шрифты) пропускаются или кладутся в бандл как
+# base64 с пометкой в строке ограждения: ```png base64
+BINARY_MODES = ("skip", "base64")
+BASE64_MARK = b"base64"
+
+# Деление бандла на части по границам файлов: лимит задаётся в байтах или
+# в приблизительных токенах (BYTES_PER_TOKEN байт на токен).
+BYTES_PER_TOKEN = 4
+COMPRESSION_SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+# Манифест рядом с бандлом: для каждого файла — размер, mtime, sha256 и
+# положение записи и её тела в бандле. По нему --incremental переносит
+# неизменённые записи из прошлого бандла, не открывая исходные файлы, а
+# unpack --only читает нужные тела напрямую (он же — индекс бандла).
+MANIFEST_SUFFIX = ".manifest.json"
+MANIFEST_VERSION = 2
+# Файл с mtime не раньше чем за RACY_WINDOW_NS до записи прошлого бандла мог
+# измениться в тот же тик mtime уже после чтения (размер тот же) — такую
+# запись --incremental переносит, только если совпал и sha256 файла.
+RACY_WINDOW_NS = 2 * 10**9
+
+# --- Разрешённые файлы и каталоги ---
+ALLOWED_ROOT_FILES = {
+    "vite.config.js",
+    "package.json",
+    "jsconfig.json",
+    "index.html",
+    ".env",
+}
+ALLOWED_DIRS = {"src", "supabase", ".github"}
+
+# Каталоги, в которые обход не спускается никогда, даже внутри разрешённых.
+EXCLUDED_DIRS = {".git", "node_modules"}
+
+
+def _is_allowed(rel_path):
+    return (
+        rel_path.parts[0] in ALLOWED_DIRS
+        or rel_path.as_posix() in ALLOWED_ROOT_FILES
+    )
+
+
+class _GitIgnore:
+    """Правила одного .gitignore (подмножество синтаксиса git: *, **, ?, [..],
+    отрицание "!", "/" в конце — только каталоги, "/" внутри — от корня)."""
+
+    def __init__(self, lines):
+        self.rules = []
+        for raw in lines:
+            line = raw.rstrip("\n").rstrip("\r")
+            if not line.strip() or line.startswith("#"):
+                continue
+            line = line.rstrip()
+            negate = line.startswith("!")
+            if negate:
+                line = line[1:]
+            elif line.startswith("\\"):
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.strip("/") if dir_only else line
+            anchored = "/" in line
+            line = line.lstrip("/")
+            if line:
+                self.rules.append((self._compile(line, anchored), negate, dir_only))
+
+    @staticmethod
+    def _compile(pattern, anchored):
+        out = []
+        i = 0
+        while i < len(pattern):
+            if pattern.startswith("**/", i):
+                out.append("(?:.*/)?")
+                i += 3
+            elif pattern.startswith("/**", i) and i + 3 == len(pattern):
+                out.append("/.*")
+                i += 3
+            elif pattern[i] == "*":
+                out.append("[^/]*")
+                i += 1
+            elif pattern[i] == "?":
+                out.append("[^/]")
+                i += 1
+            elif pattern[i] == "[" and "]" in pattern[i + 1:]:
+                end = pattern.index("]", i + 1)
+                out.append("[" + pattern[i + 1:end].replace("!", "^", 1) + "]")
+                i = end + 1
+            else:
+                out.append(re.escape(pattern[i]))
+                i += 1
+        prefix = "" if anchored else "(?:.*/)?"
+        return re.compile(prefix + "".join(out) + "$")
+
+    def match(self, rel, is_dir):
+        """True/False — решение последнего подходящего правила, None — правил нет."""
+        result = None
+        for regex, negate, dir_only in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.match(rel):
+                result = not negate
+        return result
+
+    @classmethod
+    def load(cls, directory):
+        try:
+            with open(os.path.join(directory, ".gitignore"), "r", encoding="utf-8") as f:
+                return cls(f)
+        except (OSError, UnicodeDecodeError):
+            return None
+
+
+def _is_ignored(ignores, rel, is_dir):
+    """ignores — стек (префикс каталога, _GitIgnore) от корня вглубь;
+    более глубокий .gitignore переопределяет внешние."""
+    for base, gitignore in reversed(ignores):
+        decision = gitignore.match(rel[len(base):], is_dir)
+        if decision is not None:
+            return decision
+    return False
+
+
+def iter_project_files(root_dir=PROJECT_ROOT, stats=None, use_gitignore=True):
+    """Обходит только разрешённые корни проекта через os.scandir.
+
+    В корне проверяются лишь имена из ALLOWED_ROOT_FILES и ALLOWED_DIRS;
+    внутрь каталогов EXCLUDED_DIRS и игнорируемых .gitignore обход не
+    спускается. Выдаёт (Path, rel_posix, os.stat_result) в том же порядке,
+    что и sorted(rglob) раньше. В stats["visited"] считаются все
+    просмотренные элементы каталогов.
+    """
+    if stats is None:
+        stats = {}
+    stats.setdefault("visited", 0)
+
+    def scan(directory, rel_dir, ignores):
+        if use_gitignore:
+            gitignore = _GitIgnore.load(directory)
+            if gitignore is not None:
+                ignores = ignores + [(rel_dir, gitignore)]
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda e: os.path.normcase(e.name))
+        except OSError:
+            return
+        for entry in entries:
+            stats["visited"] += 1
+            rel = rel_dir + entry.name
+            is_dir = entry.is_dir()
+            if not rel_dir:
+                allowed = ALLOWED_DIRS if is_dir else ALLOWED_ROOT_FILES
+                if entry.name not in allowed:
+                    continue
+            if is_dir and entry.name in EXCLUDED_DIRS:
+                continue
+            if _is_ignored(ignores, rel, is_dir):
+                continue
+            if is_dir:
+                yield from scan(entry.path, rel + "/", ignores)
+            else:
+                yield Path(entry.path), rel, entry.stat()
+
+    yield from scan(os.fspath(root_dir), "", [])
+
+
+def _copy_utf8_body(src, out, digest):
+    """Копирует файл в бандл блоками по CHUNK_SIZE, проверяя по пути, что это UTF-8.
+
+    Байты пишутся как есть (без перекодирования), поэтому распаковка
+    восстанавливает файл побайтно; попутно они добавляются в digest.
+    Бросает UnicodeDecodeError, если файл не в UTF-8 — вызывающий код
+    откатывает уже записанную часть тела.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    while True:
+        chunk = src.read(CHUNK_SIZE)
+        if not chunk:
+            decoder.decode(b"", final=True)
+            return
+        decoder.decode(chunk)
+        digest.update(chunk)
+        out.write(chunk)
+
+
+def _looks_binary(head):
+    """Бинарный ли файл по первому блоку: сигнатура формата, NUL-байт
+    или невалидный UTF-8 (незавершённый многобайтный символ в конце блока
+    не считается ошибкой, только если блок полный и файл идёт дальше)."""
+    if head.startswith(BINARY_MAGIC) or b"\x00" in head:
+        return True
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=len(head) < SNIFF_SIZE)
+    except UnicodeDecodeError:
+        return True
+    return False
+
+
+def _max_backtick_run(data):
+    return max(map(len, _BACKTICK_RUN_RE.findall(data)), default=0)
+
+
+def _max_backtick_run_stream(f):
+    """То же для файла, читаемого блоками (серия может пересекать границу)."""
+    best = carry = 0
+    while True:
+        chunk = f.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        for m in _BACKTICK_RUN_RE.finditer(chunk):
+            run = len(m.group()) + (carry if m.start() == 0 else 0)
+            best = max(best, run)
+        tail = len(chunk) - len(chunk.rstrip(b"`"))
+        carry = carry + tail if tail == len(chunk) else tail
+    f.seek(0)
+    return best
+
+
+def _fence_for(max_run):
+    return b"`" * max(len(FENCE), max_run + 1)
+
+
+def _read_file(path, size):
+    """Стадия чтения (выполняется в пуле потоков).
+
+    Возвращает (kind, data, sha256, max_run): kind — "text", "binary" или
+    "error" (тогда data — текст ошибки). Для текста до PREFETCH_LIMIT байт
+    data — всё содержимое, уже проверенное как UTF-8, max_run — длина
+    самой длинной серии обратных кавычек в нём; для крупных data = None,
+    и писатель копирует файл сам блоками. Файл, который прошёл проверку
+    первого блока, но целиком не декодируется как UTF-8, — бинарный.
+    """
+    try:
+        with open(path, "rb") as f:
+            head = f.read(SNIFF_SIZE)
+            if _looks_binary(head):
+                return "binary", None, None, 0
+            if size > PREFETCH_LIMIT:
+                return "text", None, None, None
+            data = head + f.read()
+        data.decode("utf-8")
+    except UnicodeDecodeError:
+        return "binary", None, None, 0
+    except Exception as e:
+        return "error", str(e), None, None
+    return "text", data, hashlib.sha256(data).hexdigest(), _max_backtick_run(data)
+
+
+def _copy_base64_body(src, out, digest):
+    # 57 байт -> ровно одна строка base64 в 76 символов
+    block = CHUNK_SIZE // 57 * 57
+    first = True
+    while True:
+        chunk = src.read(block)
+        if not chunk:
+            return
+        digest.update(chunk)
+        if not first:
+            out.write(b"\n")
+        out.write(base64.encodebytes(chunk).rstrip(b"\n"))
+        first = False
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+def _copy_range(src, out, offset, length):
+    src.seek(offset)
+    while length > 0:
+        chunk = src.read(min(CHUNK_SIZE, length))
+        if not chunk:
+            raise EOFError("бандл короче, чем указано в манифесте")
+        out.write(chunk)
+        length -= len(chunk)
+
+
+def _manifest_path(output_file):
+    return Path(str(output_file) + MANIFEST_SUFFIX)
+
+
+def _load_manifest(output_file, binary, check_binary=True):
+    """Манифест прошлой сборки или {} — если его нет, бандл с тех пор менялся
+    или (при check_binary) он собран с другим режимом бинарных файлов."""
+    try:
+        with open(_manifest_path(output_file), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        st = os.stat(output_file)
+    except (OSError, ValueError):
+        return {}
+    if (
+        manifest.get("version") != MANIFEST_VERSION
+        or manifest.get("bundle_size") != st.st_size
+        or manifest.get("bundle_mtime_ns") != st.st_mtime_ns
+        or (check_binary and manifest.get("binary") != binary)
+    ):
+        return {}
+    return manifest.get("files", {})
+
+
+def _save_manifest(output_file, files, binary):
+    st = os.stat(output_file)
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "bundle_size": st.st_size,
+        "bundle_mtime_ns": st.st_mtime_ns,
+        "binary": binary,
+        "files": files,
+    }
+    with open(_manifest_path(output_file), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+
+
+class _NotUtf8(Exception):
+    """Крупный файл оказался не UTF-8 уже при копировании; запись откачена."""
+
+
+def _write_entry(out, path, rel, prefetched):
+    """Пишет одну запись "### путь + ```тело```" и возвращает
+    (sha256, body_offset, body_length); sha256 = None, если файл не удалось
+    прочитать. prefetched — результат _read_file; бинарные файлы сюда
+    попадают только в режиме base64. Если крупный текстовый файл дальше
+    первого блока не UTF-8, запись откатывается и бросается _NotUtf8 —
+    такой файл бинарный."""
+    entry_start = out.tell()
+    kind, data, sha256, max_run = prefetched
+    src = None
+    if kind != "error" and data is None:
+        try:
+            src = open(path, "rb")
+            if max_run is None:
+                max_run = _max_backtick_run_stream(src)
+        except Exception as e:
+            if src is not None:
+                src.close()
+            kind, data = "error", str(e)
+    if kind == "error":
+        data = f"[Не удалось прочитать файл: {data}]".encode("utf-8")
+        max_run = _max_backtick_run(data)
+
+    fence = _fence_for(max_run)
+    info = path.suffix.lstrip(".").encode("utf-8")
+    if kind == "binary":
+        info += b" " + BASE64_MARK
+    out.write(f"### {rel}\n\n".encode("utf-8"))
+    out.write(fence + info + b"\n")
+    body_start = out.tell()
+    if src is None:
+        out.write(data)
+    else:
+        digest = hashlib.sha256()
+        try:
+            with src:
+                if kind == "binary":
+                    _copy_base64_body(src, out, digest)
+                else:
+                    _copy_utf8_body(src, out, digest)
+            sha256 = digest.hexdigest()
+        except UnicodeDecodeError:
+            out.seek(entry_start)
+            out.truncate()
+            raise _NotUtf8(rel) from None
+        except Exception as e:
+            # откатываем частично записанное тело и пишем причину
+            out.seek(body_start)
+            out.truncate()
+            out.write(f"[Не удалось прочитать файл: {e}]".encode("utf-8"))
+            sha256 = None
+    body_length = out.tell() - body_start
+    out.write(b"\n" + fence + b"\n\n")
+    return sha256, body_start, body_length
+
+
+def _splice_entry(prev_bundle, out, rel, entry):
+    """Переносит запись из прошлого бандла, если она действительно про rel."""
+    header = f"### {rel}\n\n".encode("utf-8")
+    prev_bundle.seek(entry["offset"])
+    if prev_bundle.read(len(header)) != header:
+        return False
+    _copy_range(prev_bundle, out, entry["offset"], entry["length"])
+    return True
+
+
+# ---------- 1. Сборка проекта в один MD ----------
+def _listed_file_excluded(root_dir, rel, use_gitignore, gitignores):
+    """Не пропустил бы iter_project_files этот путь: вне разрешённых корней,
+    внутри EXCLUDED_DIRS или игнорируется .gitignore по дороге к нему.
+    gitignores — кэш _GitIgnore по каталогам между вызовами."""
+    parts = rel.split("/")
+    if len(parts) > 1:
+        if parts[0] not in ALLOWED_DIRS:
+            return True
+    elif rel not in ALLOWED_ROOT_FILES:
+        return True
+    if any(part in EXCLUDED_DIRS for part in parts[:-1]):
+        return True
+    if not use_gitignore:
+        return False
+    ignores = []
+    for depth in range(len(parts)):
+        rel_dir = "/".join(parts[:depth]) + "/" if depth else ""
+        if rel_dir not in gitignores:
+            gitignores[rel_dir] = _GitIgnore.load(os.path.join(root_dir, rel_dir))
+        if gitignores[rel_dir] is not None:
+            ignores = ignores + [(rel_dir, gitignores[rel_dir])]
+        if _is_ignored(ignores, "/".join(parts[:depth + 1]), depth < len(parts) - 1):
+            return True
+    return False
+
+
+def _iter_listed_files(root_dir, rels, stats, use_gitignore=True):
+    """Как iter_project_files, но по готовому списку путей (в том же порядке)
+    и с теми же фильтрами: исключённые пути пропускаются с предупреждением."""
+    stats.setdefault("visited", 0)
+    gitignores = {}
+    for rel in sorted(rels, key=lambda r: [os.path.normcase(p) for p in r.split("/")]):
+        stats["visited"] += 1
+        if _listed_file_excluded(root_dir, rel, use_gitignore, gitignores):
+            print(f"⚠️  Исключён фильтрами сборки, пропущен: {rel}")
+            continue
+        path = Path(root_dir) / rel
+        try:
+            st = path.stat()
+        except OSError:
+            continue
+        yield path, rel, st
+
+
+def pack_project_to_md(root_dir=PROJECT_ROOT, output_file=OUTPUT_FILE, incremental=False,
+                       use_gitignore=True, workers=DEFAULT_WORKERS, binary="skip",
+                       only_files=None):
+    """Собирает разрешённые файлы в один Markdown и пишет манифест рядом.
+
+    При incremental=True файлы, у которых размер и mtime совпадают с
+    манифестом прошлой сборки, не перечитываются: их записи целиком
+    копируются из прежнего бандла (изменённые незадолго до прошлой сборки —
+    только если совпал и sha256, см. RACY_WINDOW_NS). Новый бандл пишется во временный файл
+    и заменяет старый только после успешной сборки.
+    Файлы берутся из iter_project_files (только разрешённые корни) и
+    читаются пулом из workers потоков с упреждением; записывает их один
+    писатель строго в порядке обхода. binary — "skip" или "base64".
+    only_files — готовый список относительных путей вместо обхода
+    (например, из select_by_imports).
+    """
+    if binary not in BINARY_MODES:
+        raise ValueError(f"binary должен быть одним из {BINARY_MODES}")
+    started = time.perf_counter()
+    stats = {}
+    root_dir = Path(root_dir)
+    output_name = Path(output_file).name
+    previous = _load_manifest(output_file, binary) if incremental else {}
+    racy_since = os.stat(output_file).st_mtime_ns - RACY_WINDOW_NS if previous else 0
+    tmp_file = Path(str(output_file) + ".tmp")
+    files = {}
+    spliced = 0
+    skipped = 0
+
+    prev_bundle = open(output_file, "rb") if previous else None
+    pool = ThreadPoolExecutor(max_workers=max(1, workers))
+    pending = deque()
+
+    def emit(out, path, rel, st, entry, future):
+        nonlocal spliced, skipped
+        offset = out.tell()
+        if entry is not None and _splice_entry(prev_bundle, out, rel, entry):
+            sha256 = entry["sha256"]
+            body_offset = offset + entry["body_offset"] - entry["offset"]
+            body_length = entry["body_length"]
+            is_base64 = entry["base64"]
+            spliced += 1
+        else:
+            prefetched = future.result() if future else _read_file(path, st.st_size)
+            if prefetched[0] == "text":
+                try:
+                    sha256, body_offset, body_length = _write_entry(out, path, rel, prefetched)
+                except _NotUtf8:
+                    prefetched = ("binary", None, None, 0)
+            if prefetched[0] == "binary" and binary == "skip":
+                skipped += 1
+                return
+            if prefetched[0] != "text":
+                sha256, body_offset, body_length = _write_entry(out, path, rel, prefetched)
+            is_base64 = prefetched[0] == "binary"
+
+        files[rel] = {
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "sha256": sha256,
+            "offset": offset,
+            "length": out.tell() - offset,
+            "body_offset": body_offset,
+            "body_length": body_length,
+            "base64": is_base64,
+        }
+
+    try:
+        with open(tmp_file, "wb") as out:
+            out.write("## 📦 All project files\n\n".encode("utf-8"))
+
+            if only_files is None:
+                source = iter_project_files(root_dir, stats, use_gitignore)
+            else:
+                source = _iter_listed_files(root_dir, only_files, stats, use_gitignore)
+            for path, rel, st in source:
+                if path.name == output_name:
+                    continue
+
+                entry = previous.get(rel)
+                if (
+                    entry is not None
+                    and entry["size"] == st.st_size
+                    and entry["mtime_ns"] == st.st_mtime_ns
+                    and (st.st_mtime_ns < racy_since or _file_sha256(path) == entry["sha256"])
+                ):
+                    future = None
+                else:
+                    entry = None
+                    future = pool.submit(_read_file, path, st.st_size)
+                pending.append((path, rel, st, entry, future))
+
+                if len(pending) >= max(1, workers) * PREFETCH_WINDOW:
+                    emit(out, *pending.popleft())
+            while pending:
+                emit(out, *pending.popleft())
+    finally:
+        pool.shutdown(cancel_futures=True)
+        if prev_bundle is not None:
+            prev_bundle.close()
+
+    os.replace(tmp_file, output_file)
+    _save_manifest(output_file, files, binary)
+
+    print(
+        f"🔎 Просмотрено: {stats['visited']}, в бандле: {len(files)}, "
+        f"время: {time.perf_counter() - started:.2f} с"
+    )
+    if skipped:
+        print(f"🖼️  Пропущено бинарных файлов: {skipped} (см. --binary base64)")
+    if incremental:
+        print(f"♻️  Без изменений: {spliced}, перечитано: {len(files) - spliced}")
+    print(f"✅ Собрано в: {output_file}")
+
+
+# ---------- 2. Восстановление проекта из MD ----------
+class BundleFormatError(ValueError):
+    """Бандл повреждён: запись не закрыта ограждением до конца файла."""
+
+
+def _fence_len(line):
+    """Длина ограждения в начале строки (0, если это не ограждение)."""
+    n = len(line) - len(line.lstrip(b"`"))
+    return n if n >= len(FENCE) else 0
+
+
+def _is_closing_rest(rest):
+    # закрывающее ограждение: не короче открывающего, без info-строки
+    return not rest.strip(b"` \t\r\n")
+
+
+def _strip_eol(line):
+    if line.endswith(b"\n"):
+        line = line[:-1]
+    if line.endswith(b"\r"):
+        line = line[:-1]
+    return line
+
+
+class _BundleReader:
+    """Буферизованное чтение бандла блоками по CHUNK_SIZE.
+
+    Строки разметки читаются через readline(), тела файлов — блоками через
+    iter_body(), которая ищет закрывающее ограждение прямо в буфере, не
+    разбивая тело на строки.
+    """
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.buf = b""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        data = self.raw.read(CHUNK_SIZE)
+        if not data:
+            self.eof = True
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+
+    def readline(self):
+        """Строка до "\n" включительно, но не длиннее CHUNK_SIZE байт."""
+        while True:
+            idx = self.buf.find(b"\n", self.pos, self.pos + CHUNK_SIZE)
+            if idx >= 0:
+                end = idx + 1
+                break
+            if self.eof or len(self.buf) - self.pos >= CHUNK_SIZE:
+                end = min(len(self.buf), self.pos + CHUNK_SIZE)
+                break
+            self._fill()
+        line = self.buf[self.pos:end]
+        self.pos = end
+        return line
+
+    def iter_body(self, fence_len, crlf):
+        """Блоки тела файла до закрывающего ограждения.
+
+        Закрывает строка из fence_len и более обратных кавычек (и только
+        пробелов после них) — как в CommonMark. Перевод строки перед ней —
+        часть разметки, в файл он не попадает; "\r" перед ним отрезается,
+        только если crlf (открывающее ограждение закончилось на "\r\n", то
+        есть бандл сохранён с CRLF). Хвост буфера придерживается,
+        чтобы не разрезать "\r\n" + ограждение. Если ограждение так и не
+        встретилось, бросает BundleFormatError.
+        """
+        terminator = b"\n" + b"`" * fence_len
+        # с "\n" открывающей строки: пустое тело может закрыться сразу
+        search = max(self.pos - 1, 0)
+        while True:
+            idx = self.buf.find(terminator, search)
+            if idx >= 0:
+                eol = self.buf.find(b"\n", idx + 1)
+                if eol < 0 and not self.eof and len(self.buf) - idx <= CHUNK_SIZE:
+                    # строка-кандидат ещё не дочитана целиком
+                    keep = max(self.pos, idx - 1)
+                    if keep > self.pos:
+                        yield self.buf[self.pos:keep]
+                        self.pos = keep
+                    search = idx - self.pos
+                    self._fill()
+                    continue
+                line_end = len(self.buf) if eol < 0 else eol + 1
+                if _is_closing_rest(self.buf[idx + len(terminator):line_end]):
+                    data = self.buf[self.pos:max(self.pos, idx)]
+                    if crlf and data.endswith(b"\r"):
+                        data = data[:-1]
+                    if data:
+                        yield data
+                    self.pos = line_end
+                    return
+                search = idx + 1
+                continue
+            if self.eof:
+                raise BundleFormatError("не найдено закрывающее ограждение " + "`" * fence_len)
+            safe = max(self.pos, len(self.buf) - len(terminator) - 1)
+            if safe > self.pos:
+                yield self.buf[self.pos:safe]
+                self.pos = safe
+            search = 0
+            self._fill()
+
+
+def _decode_base64_chunks(chunks):
+    """Потоковое декодирование base64-тела (блоки режутся где угодно)."""
+    rest = b""
+    for chunk in chunks:
+        data = rest + b"".join(chunk.split())
+        cut = len(data) // 4 * 4
+        rest = data[cut:]
+        if cut:
+            yield base64.b64decode(data[:cut])
+    if rest:
+        yield base64.b64decode(rest)
+
+
+def iter_bundle_entries(md, problems=None):
+    """Разбор бандла как конечного автомата за один линейный проход.
+
+    Читает бинарный поток блоками и для каждого файла выдаёт
+    (rel_path, body_chunks), где body_chunks — генератор байтовых блоков
+    тела. Тело нужно дочитать до запроса следующего файла.
+    Формат записи: "### путь", пустая строка, "```ext", тело, "```"
+    (ограждение может быть длиннее трёх кавычек); тело с пометкой
+    "```ext base64" декодируется обратно в байты. Замечания о структуре
+    (заголовок без блока кода, повтор пути) добавляются в problems.
+    """
+    if problems is None:
+        problems = []
+    reader = _BundleReader(md)
+    state = "outside"
+    rel_path = None
+    seen = set()
+
+    while True:
+        chunk = reader.readline()
+        if not chunk:
+            if state != "outside":
+                problems.append(f"{rel_path}: после заголовка нет блока кода")
+            return
+        if not chunk.endswith(b"\n"):
+            # заголовки и ограждения — короткие целые строки
+            state = "outside"
+            continue
+
+        line = _strip_eol(chunk)
+        if state != "outside" and line.startswith(b"### "):
+            problems.append(f"{rel_path}: после заголовка нет блока кода")
+            state = "outside"
+        if state == "outside":
+            if line.startswith(b"### "):
+                rel_path = line[4:].decode("utf-8").strip()
+                state = "header"
+        elif state == "header":
+            state = "fence" if not line else "outside"
+            if line:
+                problems.append(f"{rel_path}: после заголовка нет блока кода")
+        elif state == "fence":
+            state = "outside"
+            fence_len = _fence_len(line)
+            if not fence_len:
+                problems.append(f"{rel_path}: после заголовка нет блока кода")
+                continue
+            if rel_path in seen:
+                problems.append(f"{rel_path}: путь встречается в бандле повторно")
+            seen.add(rel_path)
+            info = line[fence_len:].split()
+            body = reader.iter_body(fence_len, chunk.endswith(b"\r\n"))
+            if info[1:2] == [BASE64_MARK]:
+                body = _decode_base64_chunks(body)
+            yield rel_path, body
+
+
+_HEADER_RE = re.compile(rb"^### ([^\r\n]+)\r?\n\r?\n(`{3,})([^\r\n]*)\r?\n", re.M)
+
+
+def _scan_bundle_index(mm):
+    """Строит индекс бандла одним линейным проходом по mmap — для бандлов
+    без актуального манифеста (например, вернувшихся от AI). Правила
+    те же, что у iter_bundle_entries; незакрытая запись в индекс не попадает."""
+    files = {}
+    pos = 0
+    while True:
+        m = _HEADER_RE.search(mm, pos)
+        if m is None:
+            return files
+        body_offset = m.end()
+        terminator = b"\n" + m.group(2)
+        search = body_offset - 1
+        while True:
+            idx = mm.find(terminator, search)
+            if idx < 0:
+                return files
+            eol = mm.find(b"\n", idx + 1)
+            line_end = len(mm) if eol < 0 else eol + 1
+            if _is_closing_rest(mm[idx + len(terminator):line_end]):
+                break
+            search = idx + 1
+        body_end = max(body_offset, idx)
+        # "\r" — часть перевода строки ограждения только в бандле с CRLF
+        crlf = mm[body_offset - 2:body_offset] == b"\r\n"
+        if crlf and body_end > body_offset and mm[body_end - 1:body_end] == b"\r":
+            body_end -= 1
+        pos = line_end
+        rel = m.group(1).decode("utf-8").strip()
+        files[rel] = {
+            "size": None,
+            "mtime_ns": None,
+            "sha256": None,
+            "offset": m.start(),
+            "length": pos - m.start(),
+            "body_offset": body_offset,
+            "body_length": body_end - body_offset,
+            "base64": m.group(3).split()[1:2] == [BASE64_MARK],
+        }
+
+
+def load_bundle_index(md_file, mm):
+    """Индекс бандла (путь -> смещения записи и тела).
+
+    Берётся из манифеста, если тот соответствует бандлу (размер, mtime и
+    заголовки записей на своих местах); иначе бандл сканируется заново.
+    Файлов не создаёт: манифест пишет только pack.
+    """
+    files = _load_manifest(md_file, None, check_binary=False)
+    for rel, entry in files.items():
+        header = f"### {rel}\n\n".encode("utf-8")
+        offset = entry.get("offset", -1)
+        if "body_offset" not in entry or mm[offset:offset + len(header)] != header:
+            break
+    else:
+        if files:
+            return files
+    return _scan_bundle_index(mm)
+
+
+def _iter_mmap_body(mm, entry):
+    start = entry["body_offset"]
+    end = start + entry["body_length"]
+    chunks = (mm[pos:min(pos + CHUNK_SIZE, end)] for pos in range(start, end, CHUNK_SIZE))
+    return _decode_base64_chunks(chunks) if entry["base64"] else chunks
+
+
+def _sync_file(file_path, body_chunks):
+    """Приводит файл на диске к телу из бандла и возвращает "added",
+    "modified" или "unchanged".
+
+    Тело сравнивается с файлом на диске по ходу чтения, блок за блоком;
+    пока они совпадают, ничего не пишется. С первого расхождения
+    содержимое пишется во временный файл рядом (совпавшее начало — из
+    старого файла), который получает права оригинала и затем атомарно
+    заменяет его через os.replace. Неизменённые файлы не трогаются вовсе (mtime остаётся
+    прежним, и Vite их не пересобирает).
+    """
+    try:
+        existing = open(file_path, "rb")
+    except FileNotFoundError:
+        existing = None
+    tmp_path = file_path.with_name(file_path.name + ".unpack-tmp")
+    tmp = None
+    matched = 0
+    try:
+        for chunk in body_chunks:
+            if tmp is None:
+                if existing is not None and existing.read(len(chunk)) == chunk:
+                    matched += len(chunk)
+                    continue
+                tmp = open(tmp_path, "wb")
+                if matched:
+                    _copy_range(existing, tmp, 0, matched)
+            tmp.write(chunk)
+        if tmp is None:
+            if existing is not None and not existing.read(1):
+                return "unchanged"
+            # файла не было или он длиннее тела из бандла
+            tmp = open(tmp_path, "wb")
+            if matched:
+                _copy_range(existing, tmp, 0, matched)
+        status = "modified" if existing is not None else "added"
+        tmp.close()
+        if existing is not None:
+            existing.close()
+            # права (в т.ч. бит исполнения) остаются как у прежнего файла
+            shutil.copymode(file_path, tmp_path)
+        os.replace(tmp_path, file_path)
+        return status
+    except BaseException:
+        if tmp is not None:
+            tmp.close()
+            os.remove(tmp_path)
+        raise
+    finally:
+        if existing is not None:
+            existing.close()
+
+
+def _restore_file(target_root, rel_path, body_chunks, summary):
+    """Восстанавливает одно тело из бандла и отмечает результат в summary."""
+    rel = Path(rel_path)
+    # разрешаем только src/** и указанные файлы
+    if not _is_allowed(rel):
+        for _ in body_chunks:
+            pass
+        print(f"⏩ Пропущен (не разрешён): {rel_path}")
+        summary["skipped"].append(rel_path)
+        return
+
+    file_path = target_root / rel
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+
+    status = _sync_file(file_path, body_chunks)
+    summary[status].append(rel_path)
+    if status == "added":
+        print(f"🆕 Добавлен: {rel_path}")
+    elif status == "modified":
+        print(f"📝 Изменён: {rel_path}")
+
+
+def _new_summary():
+    return {"added": [], "modified": [], "unchanged": [], "skipped": [], "errors": []}
+
+
+def _print_summary(summary):
+    print(
+        f"📊 Добавлено: {len(summary['added'])}, изменено: {len(summary['modified'])}, "
+        f"без изменений: {len(summary['unchanged'])}, пропущено: {len(summary['skipped'])}"
+    )
+    if summary["errors"]:
+        print("⚠️  Проблемы в бандле:")
+        for problem in summary["errors"]:
+            print(f"   - {problem}")
+
+
+def _matches(rel, patterns):
+    return any(rel == p or fnmatch.fnmatchcase(rel, p) for p in patterns)
+
+
+def _is_compressed(path):
+    with open(path, "rb") as f:
+        magic = f.read(4)
+    return magic.startswith(GZIP_MAGIC) or magic == ZSTD_MAGIC
+
+
+def _open_bundle(path):
+    """Открывает бандл на чтение: обычный .md, .gz или .zst (по сигнатуре)."""
+    with open(path, "rb") as f:
+        magic = f.read(4)
+    if magic.startswith(GZIP_MAGIC):
+        # gzip.open закрывает и сам файл (GzipFile(fileobj=...) — нет)
+        return gzip.open(path, "rb")
+    if magic == ZSTD_MAGIC:
+        if zstandard is None:
+            raise RuntimeError(f"{path}: для .zst нужен пакет zstandard (pip install zstandard)")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+    return open(path, "rb")
+
+
+def _unpack_mmap(md_file, patterns, target_root, summary, matched):
+    """Только файлы, подходящие под patterns: тела читаются напрямую из
+    mmap бандла по индексу, без разбора остальных записей. Файл под
+    несколькими шаблонами восстанавливается один раз."""
+    with open(md_file, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            index = load_bundle_index(md_file, mm)
+            selected = {}  # упорядоченное множество путей
+            for pattern in patterns:
+                for rel in index:
+                    if rel == pattern or fnmatch.fnmatchcase(rel, pattern):
+                        matched.add(pattern)
+                        selected[rel] = None
+            for rel in selected:
+                _restore_file(target_root, rel, _iter_mmap_body(mm, index[rel]), summary)
+
+
+def _unpack_stream(md_file, patterns, target_root, summary, matched):
+    with _open_bundle(md_file) as md:
+        for rel_path, body_chunks in iter_bundle_entries(md, summary["errors"]):
+            try:
+                if patterns:
+                    hits = [p for p in patterns if _matches(rel_path, [p])]
+                    if not hits:
+                        for _ in body_chunks:
+                            pass
+                        continue
+                    matched.update(hits)
+                _restore_file(target_root, rel_path, body_chunks, summary)
+            except BundleFormatError as e:
+                summary["errors"].append(f"{rel_path}: {e}")
+
+
+def _expand_inputs(md_files):
+    """Один путь или список; шаблоны (*.part*.md) раскрываются сами —
+    cmd.exe в Windows этого не делает."""
+    if isinstance(md_files, (str, os.PathLike)):
+        md_files = [md_files]
+    result = []
+    for item in md_files:
+        item = os.fspath(item)
+        if glob.has_magic(item):
+            result.extend(sorted(glob.glob(item)))
+        else:
+            result.append(item)
+    return result
+
+
+def unpack_only(md_file, patterns, target_root=PROJECT_ROOT):
+    """Восстанавливает только файлы, подходящие под patterns (путь или glob)."""
+    return unpack_md_to_project(md_file, target_root, only=patterns)
+
+
+def unpack_md_to_project(md_file=OUTPUT_FILE, target_root=PROJECT_ROOT, only=None):
+    """Восстанавливает файлы из бандла, перезаписывая только изменившиеся.
+
+    md_file — путь к бандлу или список путей (части после --chunk-*,
+    архивы .gz/.zst); шаблоны путей раскрываются. При only обычные .md
+    читаются по индексу через mmap, сжатые — потоково с фильтром.
+
+    Возвращает сводку {"added", "modified", "unchanged", "skipped"} со
+    списками путей; в "errors" — найденные проблемы структуры бандла.
+    Незакрытая последняя запись на диск не пишется.
+    """
+    target_root = Path(target_root)
+    summary = _new_summary()
+    matched = set()
+
+    for path in _expand_inputs(md_file):
+        if only and not _is_compressed(path):
+            _unpack_mmap(path, only, target_root, summary, matched)
+        else:
+            _unpack_stream(path, only, target_root, summary, matched)
+
+    for pattern in only or ():
+        if pattern not in matched:
+            print(f"⚠️  Нет в бандле: {pattern}")
+
+    if not any(summary.values()):
+        print("⚠️  Не найдено ни одного файла в .md")
+        return summary
+
+    _print_summary(summary)
+    print("✅ Восстановление завершено!")
+    return summary
+
+
+# ---------- 3. Части и архивы ----------
+def _part_path(md_file, number):
+    md_file = Path(md_file)
+    return md_file.with_name(f"{md_file.stem}.part{number:03d}{md_file.suffix}")
+
+
+def split_bundle(md_file=OUTPUT_FILE, max_bytes=None, max_tokens=None):
+    """Делит бандл на части не больше max_bytes (или max_tokens * BYTES_PER_TOKEN)
+    по границам файлов: all_project_files.part001.md, part002.md, ...
+
+    Файл крупнее лимита попадает в отдельную часть целиком. Старые части
+    с тем же именем удаляются. Возвращает список путей частей.
+    """
+    if max_bytes is None:
+        max_bytes = max_tokens * BYTES_PER_TOKEN
+    stem = Path(md_file).with_suffix("")
+    for stale in glob.glob(glob.escape(str(stem)) + ".part[0-9][0-9][0-9]" + glob.escape(Path(md_file).suffix)):
+        os.remove(stale)
+
+    with open(md_file, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            index = load_bundle_index(md_file, mm)
+            entries = sorted(index.items(), key=lambda item: item[1]["offset"])
+
+            # сначала раскладка по частям, чтобы в заголовке было "i/N"
+            parts = []
+            current, size = [], 0
+            for rel, entry in entries:
+                if current and size + entry["length"] > max_bytes:
+                    parts.append(current)
+                    current, size = [], 0
+                if entry["length"] > max_bytes:
+                    print(f"⚠️  {rel} больше лимита части ({entry['length']} байт) — отдельной частью")
+                current.append(entry)
+                size += entry["length"]
+            if current:
+                parts.append(current)
+
+            paths = []
+            for number, part in enumerate(parts, 1):
+                path = _part_path(md_file, number)
+                with open(path, "wb") as out:
+                    out.write(f"## 📦 All project files ({number}/{len(parts)})\n\n".encode("utf-8"))
+                    for entry in part:
+                        start, end = entry["offset"], entry["offset"] + entry["length"]
+                        for pos in range(start, end, CHUNK_SIZE):
+                            out.write(mm[pos:min(pos + CHUNK_SIZE, end)])
+                        if mm[end - 2:end] != b"\n\n":
+                            out.write(b"\n")
+                paths.append(path)
+
+    for path in paths:
+        print(f"✂️  {path} ({path.stat().st_size / 1024:.0f} КБ)")
+    return paths
+
+
+def compress_bundle(md_file=OUTPUT_FILE, method="gzip", archive_dir=None):
+    """Сжимает бандл потоково в .gz или .zst.
+
+    Без archive_dir архив кладётся рядом с бандлом; с archive_dir (например,
+    backup/) — туда, с меткой времени в имени, чтобы снимки копились.
+    Возвращает путь архива.
+    """
+    if method not in COMPRESSION_SUFFIXES:
+        raise ValueError(f"method должен быть одним из {tuple(COMPRESSION_SUFFIXES)}")
+    if method == "zstd" and zstandard is None:
+        raise RuntimeError("для zstd нужен пакет zstandard (pip install zstandard)")
+
+    md_file = Path(md_file)
+    suffix = COMPRESSION_SUFFIXES[method]
+    if archive_dir is None:
+        archive = md_file.with_name(md_file.name + suffix)
+    else:
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        archive = Path(archive_dir) / f"{md_file.stem}_{stamp}{md_file.suffix}{suffix}"
+        archive.parent.mkdir(parents=True, exist_ok=True)
+
+    with open(md_file, "rb") as src, open(archive, "wb") as raw:
+        if method == "gzip":
+            with gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as out:
+                _copy_stream(src, out)
+        else:
+            with zstandard.ZstdCompressor(level=10).stream_writer(raw, closefd=False) as out:
+                _copy_stream(src, out)
+
+    ratio = archive.stat().st_size / max(1, md_file.stat().st_size)
+    print(f"🗜️  {archive} ({ratio:.0%} от исходного)")
+    return archive
+
+
+def _copy_stream(src, out):
+    while True:
+        chunk = src.read(CHUNK_SIZE)
+        if not chunk:
+            return
+        out.write(chunk)
+
+
+# ---------- 4. Выборочная сборка по графу импортов ----------
+# import x from '...', export ... from '...', import '...', import('...')
+_IMPORT_RE = re.compile(rb"""(?:\bfrom|\bimport)\s*\(?\s*['"]([^'"\r\n]+)['"]""")
+RESOLVE_EXTENSIONS = ("", ".js", ".vue", ".ts", ".mjs", ".json", ".css")
+DEFAULT_ALIASES = {"@": "src"}
+
+
+def load_aliases(root_dir=PROJECT_ROOT):
+    """Алиасы импортов из jsconfig.json (compilerOptions.paths) и
+    vite.config.js (resolve.alias): {"@": "src"}."""
+    root_dir = Path(root_dir)
+    aliases = {}
+    try:
+        with open(root_dir / "jsconfig.json", "r", encoding="utf-8") as f:
+            paths = json.load(f).get("compilerOptions", {}).get("paths", {})
+        for key, targets in paths.items():
+            if targets and key.endswith("/*") and targets[0].endswith("/*"):
+                aliases[key[:-2]] = targets[0][:-2].removeprefix("./")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        vite = (root_dir / "vite.config.js").read_text(encoding="utf-8")
+        for key, target in re.findall(
+            r"""['"]([^'"]+)['"]\s*:\s*(?:path\.resolve\(__dirname,\s*|fileURLToPath\(new URL\()['"]\.?/?([^'"]+)['"]""",
+            vite,
+        ):
+            aliases.setdefault(key, target.strip("/"))
+    except OSError:
+        pass
+    return aliases or dict(DEFAULT_ALIASES)
+
+
+def _resolve_import(root_dir, importer, spec, aliases):
+    """Путь импортируемого файла относительно корня или None (пакет из
+    node_modules, не найден, вне разрешённых каталогов)."""
+    if spec.startswith("."):
+        base = (Path(importer).parent / spec).as_posix()
+    else:
+        for alias, target in aliases.items():
+            if spec == alias or spec.startswith(alias + "/"):
+                base = target + spec[len(alias):]
+                break
+        else:
+            return None
+    base = os.path.normpath(base).replace(os.sep, "/")
+    if base.startswith(".."):
+        return None
+    for candidate in [base + ext for ext in RESOLVE_EXTENSIONS] + [
+        f"{base}/index{ext}" for ext in RESOLVE_EXTENSIONS[1:]
+    ]:
+        if (Path(root_dir) / candidate).is_file() and _is_allowed(Path(candidate)):
+            return candidate
+    return None
+
+
+def select_by_imports(entries, root_dir=PROJECT_ROOT, token_budget=None, max_depth=None):
+    """Файлы, достижимые по import от entries, в пределах бюджета токенов.
+
+    Граф обходится в ширину; файлы ранжируются по расстоянию от входных
+    (затем по пути) и берутся, пока помещаются в token_budget (размер /
+    BYTES_PER_TOKEN). Входные файлы берутся всегда. Возвращает список
+    (путь, расстояние) выбранных файлов.
+    """
+    root_dir = Path(root_dir)
+    aliases = load_aliases(root_dir)
+    distance = {}
+    queue = deque()
+    for entry in entries:
+        rel = Path(entry).as_posix()
+        if not (root_dir / rel).is_file():
+            print(f"⚠️  Входной файл не найден: {entry}")
+            continue
+        if rel not in distance:
+            distance[rel] = 0
+            queue.append(rel)
+
+    while queue:
+        rel = queue.popleft()
+        if max_depth is not None and distance[rel] >= max_depth:
+            continue
+        try:
+            source = (root_dir / rel).read_bytes()
+        except OSError:
+            continue
+        for spec in _IMPORT_RE.findall(source):
+            target = _resolve_import(root_dir, rel, spec.decode("utf-8", "replace"), aliases)
+            if target is not None and target not in distance:
+                distance[target] = distance[rel] + 1
+                queue.append(target)
+
+    selected = []
+    used = 0
+    for rel in sorted(distance, key=lambda r: (distance[r], r)):
+        tokens = (root_dir / rel).stat().st_size // BYTES_PER_TOKEN
+        if distance[rel] and token_budget is not None and used + tokens > token_budget:
+            print(f"⏩ Не вошёл в бюджет: {rel} (~{tokens} ток., расстояние {distance[rel]})")
+            continue
+        used += tokens
+        selected.append((rel, distance[rel]))
+
+    print(f"🧭 Выбрано файлов: {len(selected)} из {len(distance)} достижимых, ~{used} токенов")
+    return selected
+
+
+# ---------- 5. Бенчмарк на синтетическом дереве ----------
+def benchmark(file_count=10_000, file_size=2048):
+    """Пакует и распаковывает синтетическое дерево из file_count файлов,
+    печатает время и пиковую память (tracemalloc) обоих этапов."""
+    import contextlib
+    import tempfile
+    import tracemalloc
+
+    line = "export const value = 'lorem ipsum dolor sit amet';\n"
+    body = (line * (file_size // len(line) + 1))[:file_size]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        src_root = tmp / "project"
+        for i in range(file_count):
+            path = src_root / "src" / f"dir{i // 100:03d}" / f"file{i:05d}.js"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(body, encoding="utf-8")
+        bundle = tmp / OUTPUT_FILE
+        restored = tmp / "restored"
+
+        def measure(title, fn):
+            tracemalloc.start()
+            started = time.perf_counter()
+            with open(os.devnull, "w", encoding="utf-8") as sink:
+                with contextlib.redirect_stdout(sink):
+                    fn()
+            elapsed = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"{title:<8} {elapsed:8.2f} с   пик памяти {peak / 1024:10.1f} КБ")
+
+        print(f"📊 Синтетическое дерево: {file_count} файлов по {file_size} байт")
+        measure("pack", lambda: pack_project_to_md(src_root, bundle))
+        print(f"         размер бандла {bundle.stat().st_size / 1024 / 1024:.1f} МБ")
+        (src_root / "src" / "dir000" / "file00000.js").write_text(body + "//\n", encoding="utf-8")
+        measure("pack -i", lambda: pack_project_to_md(src_root, bundle, incremental=True))
+        measure("unpack", lambda: unpack_md_to_project(bundle, restored))
+        only = [f"src/dir{i // 100:03d}/file{i:05d}.js" for i in (0, file_count // 2, file_count - 1)]
+        measure("only x3", lambda: unpack_md_to_project(bundle, restored, only=only))
+
+
+def fuzz_benchmark(max_mb=50, seed=1):
+    """Фаззинг и замер разбора бандла.
+
+    Для бандлов ~1, 10 и 50 МБ (не больше max_mb) генерирует файлы со
+    случайными сериями обратных кавычек, псевдо-заголовками "### ", CRLF и
+    пустыми строками; проверяет, что pack -> unpack восстанавливает всё
+    побайтно, и замеряет потоковый разбор и построение индекса по mmap.
+    Затем режет бандл в случайных местах: разбор должен либо пройти, либо
+    сообщить BundleFormatError, но не упасть иначе.
+    """
+    import contextlib
+    import filecmp
+    import random
+    import shutil
+    import tempfile
+
+    rnd = random.Random(seed)
+    fragments = [
+        "const a = 1;\n", "```\n", "```js\n", "````\n", "  ```  \n", "### src/fake.js\n",
+        "\n", "\r\n", "текст `code` ``x``\n", "`", "``````````\n", "```base64\n",
+    ]
+
+    def random_body(size):
+        parts = []
+        total = 0
+        while total < size:
+            part = rnd.choice(fragments) if rnd.random() < 0.3 else "x" * rnd.randint(1, 200) + "\n"
+            parts.append(part)
+            total += len(part)
+        if rnd.random() < 0.2:
+            parts.append("`" * rnd.randint(1, 12))
+        return "".join(parts).encode("utf-8")
+
+    def dirs_equal(cmp):
+        if cmp.left_only or cmp.right_only or cmp.funny_files:
+            return False
+        _, mismatch, errors = filecmp.cmpfiles(cmp.left, cmp.right, cmp.common_files, shallow=False)
+        if mismatch or errors:
+            return False
+        return all(dirs_equal(sub) for sub in cmp.subdirs.values())
+
+    def quiet(fn):
+        with open(os.devnull, "w", encoding="utf-8") as sink:
+            with contextlib.redirect_stdout(sink):
+                return fn()
+
+    print(f"{'бандл':>8} {'файлов':>7} {'разбор':>8} {'индекс':>8} {'unpack':>8}  побайтно")
+    for size_mb in [s for s in (1, 10, 50) if s <= max_mb] or [max_mb]:
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            src_root = tmp / "project"
+            count = 0
+            total = 0
+            while total < size_mb * 1024 * 1024:
+                body = random_body(rnd.choice((0, 10, 300, 3000, 40000, 400000)))
+                path = src_root / "src" / f"d{count // 200:03d}" / f"f{count:05d}.md"
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.write_bytes(body)
+                total += len(body)
+                count += 1
+            bundle = tmp / OUTPUT_FILE
+            quiet(lambda: pack_project_to_md(src_root, bundle))
+
+            started = time.perf_counter()
+            with open(bundle, "rb") as md:
+                for _, body_chunks in iter_bundle_entries(md):
+                    for _ in body_chunks:
+                        pass
+            parse_time = time.perf_counter() - started
+
+            started = time.perf_counter()
+            with open(bundle, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                index = _scan_bundle_index(mm)
+            index_time = time.perf_counter() - started
+
+            restored = tmp / "restored"
+            started = time.perf_counter()
+            quiet(lambda: unpack_md_to_project(bundle, restored))
+            unpack_time = time.perf_counter() - started
+
+            cmp = filecmp.dircmp(src_root / "src", restored / "src")
+            ok = len(index) == count and dirs_equal(cmp)
+            print(
+                f"{bundle.stat().st_size / 1024 / 1024:6.1f}МБ {count:7d} {parse_time:7.2f}с "
+                f"{index_time:7.2f}с {unpack_time:7.2f}с  {'да' if ok else 'НЕТ'}"
+            )
+
+            if size_mb == 1 or size_mb == max_mb:
+                data = bundle.read_bytes()
+                failures = 0
+                for _ in range(200):
+                    cut = tmp / "cut.md"
+                    cut.write_bytes(data[:rnd.randrange(len(data))])
+                    try:
+                        with open(cut, "rb") as md:
+                            for _, body_chunks in iter_bundle_entries(md):
+                                for _ in body_chunks:
+                                    pass
+                    except BundleFormatError:
+                        pass
+                    except Exception as e:
+                        failures += 1
+                        print(f"   ❌ обрезанный бандл: {type(e).__name__}: {e}")
+                print(f"   обрезанные бандлы: 200 проверено, сбоев {failures}")
+            shutil.rmtree(restored)
+
+
+# ---------- CLI ----------
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Пакует или распаковывает Vue-проект в один Markdown-файл (только src/ и разрешённые файлы в корне)."
+    )
+    parser.add_argument(
+        "--mode",
+        choices=["pack", "unpack", "bench", "fuzz"],
+        required=True,
+        help="pack — собрать файлы в all_project_files.md; unpack — восстановить файлы из него; "
+             "bench — замерить время и память на синтетическом дереве; "
+             "fuzz — проверить и замерить разбор бандлов до --fuzz-mb МБ.",
+    )
+    parser.add_argument(
+        "--bench-files", type=int, default=10_000,
+        help="bench: количество файлов в синтетическом дереве (по умолчанию 10000).",
+    )
+    parser.add_argument(
+        "--bench-size", type=int, default=2048,
+        help="bench: размер каждого файла в байтах (по умолчанию 2048).",
+    )
+    parser.add_argument(
+        "--fuzz-mb", type=int, default=50,
+        help="fuzz: максимальный размер бандла в МБ (по умолчанию 50).",
+    )
+    parser.add_argument(
+        "--incremental", action="store_true",
+        help="pack: перечитывать только изменённые файлы, остальные брать из прошлого бандла "
+             "(по манифесту all_project_files.md.manifest.json).",
+    )
+    parser.add_argument(
+        "--no-gitignore", action="store_true",
+        help="pack: не учитывать правила .gitignore при обходе.",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=DEFAULT_WORKERS,
+        help=f"pack: число потоков чтения файлов (по умолчанию {DEFAULT_WORKERS}).",
+    )
+    parser.add_argument(
+        "--binary", choices=BINARY_MODES, default="skip",
+        help="pack: бинарные файлы (картинки, шрифты) пропускать (skip) или класть как base64.",
+    )
+    parser.add_argument(
+        "--entry", action="append", metavar="FILE",
+        help="pack: собрать только файлы, достижимые по import от этого файла "
+             "(например, src/views/ScannerBusView.vue); можно несколько раз.",
+    )
+    parser.add_argument(
+        "--token-budget", type=int, default=None,
+        help=f"pack --entry: лимит приблизительных токенов ({BYTES_PER_TOKEN} байта на токен); "
+             "ближайшие к входным файлы берутся первыми.",
+    )
+    parser.add_argument(
+        "--max-depth", type=int, default=None,
+        help="pack --entry: максимальное число шагов по import от входных файлов.",
+    )
+    parser.add_argument(
+        "--chunk-bytes", type=int, default=None,
+        help="pack: дополнительно разбить бандл на части не больше N байт (по границам файлов).",
+    )
+    parser.add_argument(
+        "--chunk-tokens", type=int, default=None,
+        help=f"pack: то же, но лимит в приблизительных токенах ({BYTES_PER_TOKEN} байта на токен).",
+    )
+    parser.add_argument(
+        "--compress", choices=tuple(COMPRESSION_SUFFIXES), default=None,
+        help="pack: дополнительно сохранить сжатую копию бандла (.gz или .zst; zstd требует zstandard).",
+    )
+    parser.add_argument(
+        "--archive-dir", default=None,
+        help="pack: каталог для сжатых снимков с меткой времени (например, backup).",
+    )
+    parser.add_argument(
+        "--input", nargs="+", default=[OUTPUT_FILE], metavar="FILE",
+        help="unpack: бандл(ы) для восстановления — .md, части *.partNNN.md, .gz, .zst; "
+             "шаблоны раскрываются.",
+    )
+    parser.add_argument(
+        "--only", action="append", metavar="PATH",
+        help="unpack: восстановить только этот файл (путь или glob, например 'src/views/*.vue'); "
+             "можно указать несколько раз.",
+    )
+    args = parser.parse_args()
+    if args.compress == "zstd" and zstandard is None:
+        parser.error("--compress zstd требует пакет zstandard (pip install zstandard)")
+
+    if args.mode == "pack":
+        only_files = None
+        if args.entry:
+            selected = select_by_imports(args.entry, token_budget=args.token_budget,
+                                         max_depth=args.max_depth)
+            only_files = [rel for rel, _ in selected]
+        pack_project_to_md(
+            incremental=args.incremental,
+            use_gitignore=not args.no_gitignore,
+            workers=args.workers,
+            binary=args.binary,
+            only_files=only_files,
+        )
+        if args.chunk_bytes or args.chunk_tokens:
+            split_bundle(max_bytes=args.chunk_bytes, max_tokens=args.chunk_tokens)
+        if args.compress:
+            compress_bundle(method=args.compress, archive_dir=args.archive_dir)
+    elif args.mode == "unpack":
+        unpack_md_to_project(args.input, only=args.only)
+    elif args.mode == "bench":
+        benchmark(args.bench_files, args.bench_size)
+    elif args.mode == "fuzz":
+        fuzz_benchmark(args.fuzz_mb)
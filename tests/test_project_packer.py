@@ -0,0 +1,249 @@
+import gc
+import glob
+import os
+import sys
+import warnings
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import project_packer as pp  # noqa: E402
+
+
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 40
+
+FILES = {
+    "src/crlf.js": b"const a = 1;\r\nconst b = 2;\r\n",
+    "src/lone_cr.txt": b"last line ends in CR\r",
+    "src/nested.md": b"# Doc\n\n```js\nconst x = `tpl`;\n```\n\n````\n``` inside\n````\n``",
+    "src/empty.js": b"",
+    "src/assets/logo.png": PNG,
+    "src/views/Home.vue": b"<template><div>home</div></template>\n",
+    "package.json": b'{"name": "demo"}\n',
+}
+
+
+def make_project(root, files=FILES):
+    for rel, data in files.items():
+        path = root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+    return root
+
+
+def read_tree(root):
+    return {
+        p.relative_to(root).as_posix(): p.read_bytes()
+        for p in Path(root).rglob("*") if p.is_file()
+    }
+
+
+@pytest.fixture
+def project(tmp_path):
+    return make_project(tmp_path / "project")
+
+
+@pytest.fixture
+def bundle(tmp_path, project):
+    path = tmp_path / pp.OUTPUT_FILE
+    pp.pack_project_to_md(project, path, binary="base64")
+    return path
+
+
+@pytest.mark.parametrize("how", ["stream", "index", "scan"])
+def test_round_trip(tmp_path, bundle, how):
+    only = None
+    if how != "stream":
+        # --only читает тела по индексу: из манифеста или сканом бандла
+        only = ["src/*", "package.json"]
+        if how == "scan":
+            pp._manifest_path(bundle).unlink()
+    restored = tmp_path / "restored"
+
+    summary = pp.unpack_md_to_project(bundle, restored, only=only)
+
+    assert read_tree(restored) == FILES
+    assert sorted(summary["added"]) == sorted(FILES)
+    assert summary["errors"] == []
+
+
+def test_binary_files_are_skipped_by_default(tmp_path, project):
+    bundle = tmp_path / pp.OUTPUT_FILE
+    pp.pack_project_to_md(project, bundle)
+
+    pp.unpack_md_to_project(bundle, tmp_path / "restored")
+
+    expected = {rel: data for rel, data in FILES.items() if not rel.endswith(".png")}
+    assert read_tree(tmp_path / "restored") == expected
+
+
+def test_unpack_rewrites_only_changed_files(tmp_path, bundle):
+    restored = tmp_path / "restored"
+    pp.unpack_md_to_project(bundle, restored)
+    (restored / "src/crlf.js").write_bytes(b"edited locally\n")
+    untouched = (restored / "src/views/Home.vue").stat().st_mtime_ns
+
+    summary = pp.unpack_md_to_project(bundle, restored)
+
+    assert summary["modified"] == ["src/crlf.js"]
+    assert len(summary["unchanged"]) == len(FILES) - 1
+    assert read_tree(restored) == FILES
+    assert (restored / "src/views/Home.vue").stat().st_mtime_ns == untouched
+
+
+def test_incremental_pack_splices_unchanged_entries(tmp_path, project, bundle, capsys):
+    (project / "src/views/Home.vue").write_bytes(b"<template><div>changed</div></template>\n")
+    (project / "src/empty.js").unlink()
+    (project / "src/new.js").write_bytes(b"export default 1;\n")
+    capsys.readouterr()
+
+    pp.pack_project_to_md(project, bundle, incremental=True, binary="base64")
+
+    assert f"Без изменений: {len(FILES) - 2}, перечитано: 2" in capsys.readouterr().out
+    restored = tmp_path / "restored"
+    pp.unpack_md_to_project(bundle, restored)
+    assert read_tree(restored) == read_tree(project)
+
+
+def test_incremental_pack_rereads_everything_after_binary_mode_change(project, bundle, capsys):
+    capsys.readouterr()
+
+    pp.pack_project_to_md(project, bundle, incremental=True)
+
+    assert f"Без изменений: 0, перечитано: {len(FILES) - 1}" in capsys.readouterr().out
+
+
+def test_unpack_only(tmp_path, bundle, capsys):
+    restored = tmp_path / "restored"
+
+    summary = pp.unpack_only(bundle, ["src/views/*.vue", "src/crlf.js", "src/missing.js"], restored)
+
+    assert read_tree(restored) == {rel: FILES[rel] for rel in ("src/crlf.js", "src/views/Home.vue")}
+    assert sorted(summary["added"]) == ["src/crlf.js", "src/views/Home.vue"]
+    assert "Нет в бандле: src/missing.js" in capsys.readouterr().out
+
+
+def test_split_parts_unpack(tmp_path, bundle):
+    parts = pp.split_bundle(bundle, max_bytes=2048)
+    restored = tmp_path / "restored"
+
+    assert len(parts) > 1
+    assert all(p.stat().st_size <= 2048 or p.read_bytes().count(b"\n### ") <= 1 for p in parts)
+    summary = pp.unpack_md_to_project(str(tmp_path / "all_project_files.part*.md"), restored)
+
+    assert read_tree(restored) == FILES
+    assert summary["errors"] == []
+
+
+@pytest.mark.parametrize("method", ["gzip", "zstd"])
+@pytest.mark.parametrize("only", [None, ["src/crlf.js"]])
+def test_compressed_unpack(tmp_path, bundle, method, only):
+    if method == "zstd":
+        pytest.importorskip("zstandard")
+    archive = pp.compress_bundle(bundle, method)
+    restored = tmp_path / "restored"
+
+    pp.unpack_md_to_project(archive, restored, only=only)
+
+    expected = FILES if only is None else {rel: FILES[rel] for rel in only}
+    assert read_tree(restored) == expected
+
+
+def test_truncated_bundle(tmp_path, bundle):
+    data = bundle.read_bytes()
+    cut = tmp_path / "cut.md"
+    # обрыв посреди тела последней записи
+    cut.write_bytes(data[:data.rindex(b"\n```") - 3])
+    last = data[data.rindex(b"\n### ") + 5:].split(b"\n", 1)[0].decode("utf-8")
+
+    with open(cut, "rb") as md, pytest.raises(pp.BundleFormatError):
+        for _, body_chunks in pp.iter_bundle_entries(md):
+            for _ in body_chunks:
+                pass
+
+    restored = tmp_path / "restored"
+    summary = pp.unpack_md_to_project(cut, restored)
+    assert any(problem.startswith(f"{last}: ") for problem in summary["errors"])
+    assert not (restored / last).exists()
+    assert not glob.glob(str(restored / "**" / "*.unpack-tmp"), recursive=True)
+
+
+def test_incremental_pack_rereads_file_rewritten_within_the_mtime_tick(tmp_path, project, bundle):
+    path = project / "src/views/Home.vue"
+    st = path.stat()
+    path.write_bytes(FILES["src/views/Home.vue"].replace(b"home", b"HOME"))
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+    pp.pack_project_to_md(project, bundle, incremental=True, binary="base64")
+
+    pp.unpack_md_to_project(bundle, tmp_path / "restored")
+    assert (tmp_path / "restored/src/views/Home.vue").read_bytes() == path.read_bytes()
+
+
+def test_incremental_pack_hashes_only_recently_modified_files(project, bundle, monkeypatch):
+    old = bundle.stat().st_mtime_ns - 2 * pp.RACY_WINDOW_NS
+    for rel in FILES:
+        os.utime(project / rel, ns=(old, old))
+    pp.pack_project_to_md(project, bundle, binary="base64")
+    (project / "src/crlf.js").write_bytes(b"fresh\n")
+    hashed = []
+    real = pp._file_sha256
+    monkeypatch.setattr(pp, "_file_sha256", lambda path: hashed.append(path) or real(path))
+
+    pp.pack_project_to_md(project, bundle, incremental=True, binary="base64")
+
+    assert hashed == []
+
+
+def test_unpack_only_restores_a_file_once_for_overlapping_patterns(tmp_path, bundle):
+    summary = pp.unpack_only(bundle, ["src/*.js", "src/crlf.js", "src/c*"], tmp_path / "restored")
+
+    assert summary["added"] == ["src/crlf.js", "src/empty.js"]
+
+
+def test_unpack_only_does_not_write_a_manifest(tmp_path, bundle):
+    manifest = pp._manifest_path(bundle)
+    manifest.unlink()
+
+    pp.unpack_only(bundle, ["src/crlf.js"], tmp_path / "restored")
+
+    assert (tmp_path / "restored/src/crlf.js").read_bytes() == FILES["src/crlf.js"]
+    assert not manifest.exists()
+
+
+@pytest.mark.skipif(os.name == "nt", reason="POSIX mode bits")
+def test_unpack_keeps_mode_of_rewritten_file(tmp_path, bundle):
+    restored = tmp_path / "restored"
+    pp.unpack_md_to_project(bundle, restored)
+    script = restored / "src/crlf.js"
+    script.write_bytes(b"edited locally\n")
+    script.chmod(0o755)
+
+    assert pp.unpack_md_to_project(bundle, restored)["modified"] == ["src/crlf.js"]
+
+    assert script.stat().st_mode & 0o777 == 0o755
+    assert script.read_bytes() == FILES["src/crlf.js"]
+
+
+@pytest.mark.parametrize("method", ["gzip", "zstd"])
+def test_compressed_unpack_closes_the_archive(tmp_path, bundle, method):
+    if method == "zstd":
+        pytest.importorskip("zstandard")
+    archive = pp.compress_bundle(bundle, method)
+
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always", ResourceWarning)
+        pp.unpack_md_to_project(archive, tmp_path / "restored")
+        gc.collect()
+
+    assert [w for w in caught if issubclass(w.category, ResourceWarning)] == []
+
+
+def test_load_aliases_strips_only_the_dot_slash_prefix(tmp_path):
+    (tmp_path / "jsconfig.json").write_text(
+        '{"compilerOptions": {"paths": {"@/*": ["./src/*"], "~h/*": [".hidden/*"], '
+        '"lib/*": ["../shared/lib/*"]}}}', encoding="utf-8")
+
+    assert pp.load_aliases(tmp_path) == {"@": "src", "~h": ".hidden", "lib": "../shared/lib"}
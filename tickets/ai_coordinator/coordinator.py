@@ -1,11 +1,16 @@
+import sqlite3
+import sys
 import tkinter as tk
 from tkinter import ttk
 from pathlib import Path
 from datetime import datetime
+from collections import OrderedDict
 
 PROMPTS=Path("prompts")
 HISTORY=PROMPTS/"history"
 HISTORY.mkdir(parents=True,exist_ok=True)
+DB=PROMPTS/"history.sqlite3"
+CACHE_SIZE=32
 MAP={
 "Architect":"architect.txt",
 "Developer":"developer.txt",
@@ -16,23 +21,61 @@ MAP={
 "Designer":"designer.txt"
 }
 
-history_files=[]
+# история: записи в SQLite (только добавление), в памяти - список id по порядку
+# и LRU-кэш последних просмотренных записей (id -> (name, text))
+db=sqlite3.connect(DB)
+db.execute("create table if not exists history(id integer primary key,name text not null,text text not null)")
+history_ids=[]
+history_cache=OrderedDict()
 history_index=0
 draft_text=""
 
+def read_history_files():
+    # нечитаемый файл пропускается, не в UTF-8 - переносится с заменой битых байтов
+    for f in sorted(HISTORY.glob("*.txt")):
+        try:
+            raw=f.read_bytes()
+        except OSError as e:
+            print(f"history: skipped {f.name}: {e}",file=sys.stderr)
+            continue
+        try:
+            text=raw.decode("utf-8")
+        except UnicodeDecodeError:
+            print(f"history: {f.name} is not UTF-8, invalid bytes replaced",file=sys.stderr)
+            text=raw.decode("utf-8",errors="replace")
+        yield f.stem,text
+
+def import_history_files():
+    # однократный перенос старых prompts/history/*.txt в базу (user_version=1 - уже перенесено)
+    if db.execute("pragma user_version").fetchone()[0]>=1:
+        return
+    with db:
+        db.executemany("insert into history(name,text) values(?,?)",read_history_files())
+        db.execute("pragma user_version=1")
+
 def refresh_history():
-    global history_files,history_index
-    history_files=sorted(HISTORY.glob("*.txt"))
-    history_index=len(history_files)
+    global history_ids,history_index
+    history_ids=[i for (i,) in db.execute("select id from history order by id")]
+    history_index=len(history_ids)
     update_status()
 
+def history_entry(i):
+    hid=history_ids[i]
+    if hid in history_cache:
+        history_cache.move_to_end(hid)
+    else:
+        history_cache[hid]=db.execute("select name,text from history where id=?",(hid,)).fetchone()
+        if len(history_cache)>CACHE_SIZE:
+            history_cache.popitem(last=False)
+    return history_cache[hid]
+
 def update_status():
-    if not history_files:
+    if not history_ids:
         status.set("History is empty")
-    elif history_index>=len(history_files):
-        status.set(f"New entry ({len(history_files)} saved)")
+    elif history_index>=len(history_ids):
+        status.set(f"New entry ({len(history_ids)} saved)")
     else:
-        status.set(f"History {history_index+1}/{len(history_files)}: {history_files[history_index].stem}")
+        status.set(f"History {history_index+1}/{len(history_ids)}: {history_entry(history_index)[0]}")
 
 def load():
     t=ticket.get().strip()
@@ -41,7 +84,7 @@ def load():
     out.delete("1.0","end")
     out.insert("1.0",txt)
     global history_index
-    history_index=len(history_files)
+    history_index=len(history_ids)
     update_status()
 
 def copy():
@@ -49,36 +92,42 @@ def copy():
     r.clipboard_append(out.get("1.0","end-1c"))
 
 def save_to_history():
-    global draft_text
+    global draft_text,history_index
     text=out.get("1.0","end-1c")
     if not text.strip():
         return
-    name=datetime.now().strftime("%Y%m%d_%H%M%S_%f")+".txt"
-    (HISTORY/name).write_text(text,encoding="utf-8")
-    refresh_history()
+    name=datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    with db:
+        hid=db.execute("insert into history(name,text) values(?,?)",(name,text)).lastrowid
+    history_ids.append(hid)
+    history_cache[hid]=(name,text)
+    if len(history_cache)>CACHE_SIZE:
+        history_cache.popitem(last=False)
+    history_index=len(history_ids)
+    update_status()
     draft_text=""
 
 def history_prev():
     global history_index,draft_text
-    if not history_files or history_index==0:
+    if not history_ids or history_index==0:
         return
-    if history_index==len(history_files):
+    if history_index==len(history_ids):
         draft_text=out.get("1.0","end-1c")
     history_index-=1
     out.delete("1.0","end")
-    out.insert("1.0",history_files[history_index].read_text(encoding="utf-8"))
+    out.insert("1.0",history_entry(history_index)[1])
     update_status()
 
 def history_next():
     global history_index
-    if not history_files or history_index>=len(history_files):
+    if not history_ids or history_index>=len(history_ids):
         return
     history_index+=1
     out.delete("1.0","end")
-    if history_index==len(history_files):
+    if history_index==len(history_ids):
         out.insert("1.0",draft_text)
     else:
-        out.insert("1.0",history_files[history_index].read_text(encoding="utf-8"))
+        out.insert("1.0",history_entry(history_index)[1])
     update_status()
 
 r=tk.Tk()
@@ -106,6 +155,7 @@ ttk.Button(r,text="Save as new prompt",command=save_to_history).pack(fill="x")
 r.bind("<Control-Up>",lambda e:history_prev())
 r.bind("<Control-Down>",lambda e:history_next())
 
+import_history_files()
 refresh_history()
 load()
 r.mainloop()
@@ -40,13 +40,106 @@ CLI-обёртка `claude` должна быть запущена именно
 Версия 5: файлы шаблонов (*.txt) больше не читаются из каталога со
 скриптом. Они загружаются из отдельной подпапки "prompts", лежащей
 рядом со скриптом (создаётся автоматически, если отсутствует).
+
+Версия 6: разобранные деревья шаблонов кэшируются на диске
+(.prompt_constructor_cache.json рядом со скриптом) по ключу
+(имя файла, размер, mtime, sha256). При запуске заново разбираются
+только изменившиеся шаблоны; если у файла поменялся лишь mtime, а
+содержимое то же, дерево тоже берётся из кэша.
+
+Версия 7: для генерации каждый шаблон один раз компилируется в плоский
+план (RenderPlan): список текстовых фрагментов, где у каждой секции
+известен диапазон её фрагментов, а вхождения {{TICKET}} заранее выделены
+в отдельные элементы. Генерация — один линейный проход по секциям без
+рекурсии: выключенная секция вырезает свой диапазон целиком.
+Замер: `python prompt_constructor.py bench`.
+
+Версия 8: поле результата обновляется инкрементально. Все фрагменты
+плана вставляются в Text один раз, каждый помечен тегом своей секции;
+переключение секции лишь скрывает/показывает её фрагменты (elide тега),
+а смена номера тикета заменяет только места подстановки. Позиция
+прокрутки при этом сохраняется. Полная перестройка — при смене вкладки,
+кнопке Generate, после ручной правки текста и при пустом номере тикета.
+Копирование (кнопка Copy, Ctrl+C, Ctrl+X) берёт только видимый текст —
+см. OutputText.
+
+Версия 9: изменения состояния не обрабатываются сразу, а собираются
+планировщиком: переключения чекбоксов (включая каскад по class=) и
+Reset лишь помечают секции, а перерисовка панелей и регенерация
+результата выполняются один раз в after_idle. Ввод номера тикета
+дополнительно откладывается (TICKET_DEBOUNCE_MS), чтобы при быстром
+наборе генерация шла один раз после паузы.
+
+Версия 10: панели шаблонов (Text со встроенными чекбоксами) создаются
+лениво — при первом выборе шаблона в списке, а не все сразу при
+запуске. Открытыми держатся не более PANEL_CACHE_LIMIT последних
+панелей, давно не использовавшиеся уничтожаются. Состояние секций
+(в т.ч. синхронизация по class=) хранится в модели (Section.enabled),
+поэтому заново созданная панель показывает актуальные состояния.
+
+Версия 11: горячая перезагрузка шаблонов. Фоновый поток (TemplateWatcher)
+раз в WATCH_INTERVAL секунд сравнивает размер и mtime файлов в каталоге
+промптов и заново разбирает только изменившиеся (через тот же дисковый
+кэш), не блокируя интерфейс. Новые деревья передаются в UI-поток через
+очередь и подменяют старые: состояния секций сохраняются по имени
+(текущие, а для новых секций — из [States] INI), добавленные и
+удалённые файлы появляются в списке / исчезают из него. Шаблон с
+ошибкой не подменяется — продолжает работать последняя исправная версия.
+
+Версия 12: индекс классов (ClassIndex). Все секции одного class= во всех
+шаблонах разделяют одну ячейку состояния (ClassCell): Section.enabled
+у них читается и пишется через ячейку, поэтому переключение класса —
+одно присваивание, а Reset шаблона линеен (по классу побеждает первая
+его секция в файле). При запуске выводится отчёт о классах, у которых
+default различается в разных файлах.
+
+Версия 13: генерация без GUI (пакетный режим):
+
+    python prompt_constructor.py render --template reviewer.txt --ticket 152 \
+        --enable review --state-from prompt_constructor.ini
+    python prompt_constructor.py render --all-tickets --jobs 4
+
+Результат пишется в tickets/<номер>/<шаблон>_prompt.txt (каталог tickets
+— родительский для этого скрипта, --out-dir меняет корень). Без
+--template используются все шаблоны, состояния секций берутся из
+default, [States] указанного INI и флагов --enable/--disable (по имени
+секции или class=), классы синхронизируются как в GUI. --jobs N
+распределяет шаблоны x тикеты по N процессам.
+
+Версия 14: разбор шаблона — один проход с накоплением номера строки
+(раньше номер строки считался от начала файла для каждого тега).
+Разбор не останавливается на первой ошибке: незакрытые секции, лишние
+[/SECTION] и повторяющиеся имена собираются в TemplateParseError.errors.
+ParsedTemplate.reparse() после правки текста заново разбирает только
+изменённую область (верхнеуровневые узлы вне общего префикса/суффикса
+старого и нового текста); им пользуется TemplateWatcher при горячей
+перезагрузке: ParsedTemplate создаётся при первой правке файла, а в UI и
+кэш копируются только заново разобранные узлы. Замер: `python prompt_constructor.py bench-parse`.
+
+Версия 15: настройки и состояния секций хранятся в StateStore. Каждое
+изменение (чекбокс, тикет, вкладка, рабочий каталог) помечает один ключ,
+а запись INI выполняется фоновым таймером через STATE_FLUSH_DELAY секунд
+после первого изменения — одним разом для всех накопившихся, атомарно
+(временный файл + fsync + os.replace). В файл переносятся только
+помеченные ключи, остальное остаётся как в файле на диске. Ошибка фоновой
+записи показывается в строке состояния. Состояние переживает аварийное
+завершение, а переключения не замедляются. Ключи [States] удалённых
+шаблонов и исчезнувших секций вычищаются.
 """
 
 import os
 import re
+import collections
+import queue
+import threading
 import sys
+import json
+import hashlib
+import argparse
+import time
 import subprocess
 import configparser
+import concurrent.futures
 import tkinter as tk
 from tkinter import ttk, messagebox
 
@@ -55,11 +148,27 @@ from tkinter import ttk, messagebox
 # программа работала одинаково независимо от того, откуда её запустили.
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 PROMPTS_DIR = os.path.join(BASE_DIR, "prompts")
+# каталог с папками тикетов (tickets/<номер>/) — куда пишет пакетный режим
+TICKETS_DIR = os.path.dirname(BASE_DIR)
 CONFIG_FILE = os.path.join(BASE_DIR, "prompt_constructor.ini")
+TEMPLATE_CACHE_FILE = os.path.join(BASE_DIR, ".prompt_constructor_cache.json")
+TEMPLATE_CACHE_VERSION = 1
 
 TICKET_PLACEHOLDER = "{{TICKET}}"
 DEFAULT_WORKDIR = "c:\\_projects\\github\\sre\\"
 AGENT_COMMAND = "claude"
+# задержка регенерации после ввода символа в поле Ticket, мс
+TICKET_DEBOUNCE_MS = 150
+# сколько тикетов одного шаблона обрабатывает одна задача пакетного режима
+TICKETS_PER_JOB = 16
+# сколько панелей шаблонов держать созданными одновременно
+PANEL_CACHE_LIMIT = 8
+# период опроса каталога промптов фоновым потоком, с
+WATCH_INTERVAL = 1.0
+# как часто UI-поток забирает результаты из очереди наблюдателя, мс
+WATCH_POLL_MS = 250
+# через сколько секунд после изменения состояние сбрасывается в INI
+STATE_FLUSH_DELAY = 1.0
 
 # --------------------------------------------------------------------------
 # Разбор шаблонов
@@ -67,28 +176,113 @@ AGENT_COMMAND = "claude"
 
 
 class TemplateParseError(Exception):
-    """Ошибка разбора шаблона — файл не может быть использован для генерации."""
+    """Ошибка разбора шаблона — файл не может быть использован для генерации.
+
+    line/message — первая ошибка, errors — все найденные [(line, message)]."""
 
-    def __init__(self, filename, line, message):
+    def __init__(self, filename, line, message, errors=None):
         self.filename = filename
         self.line = line
         self.message = message
-        super().__init__(f"{filename}, строка {line}: {message}")
+        self.errors = errors or [(line, message)]
+        super().__init__("\n".join(f"{filename}, строка {ln}: {msg}" for ln, msg in self.errors))
 
 
 class Section:
     """Один узел SECTION в дереве шаблона."""
 
-    __slots__ = ("name", "cls", "default", "enabled", "children", "line")
+    __slots__ = ("name", "cls", "default", "_enabled", "cell", "children", "line")
 
     def __init__(self, name, cls, default, line):
         self.name = name
         self.cls = cls
         self.default = default   # bool — состояние после Reset
-        self.enabled = default   # bool — текущее состояние (до применения INI)
+        self._enabled = default  # bool — текущее состояние (до применения INI)
+        self.cell = None         # ClassCell, если секция подключена к индексу классов
         self.children = []       # список: str | Section
         self.line = line
 
+    @property
+    def enabled(self):
+        """Текущее состояние; у секций с class= — общее для всего класса."""
+        if self.cell is not None:
+            return self.cell.enabled
+        return self._enabled
+
+    @enabled.setter
+    def enabled(self, value):
+        if self.cell is not None:
+            self.cell.enabled = value
+        else:
+            self._enabled = value
+
+
+class ClassCell:
+    """Общее состояние всех секций одного class= (во всех шаблонах)."""
+
+    __slots__ = ("name", "enabled", "members")
+
+    def __init__(self, name, enabled):
+        self.name = name
+        self.enabled = enabled
+        self.members = []   # [(filename, Section), ...]
+
+
+class ClassIndex:
+    """class -> ClassCell. Секция при подключении получает состояние
+    класса (если класс уже есть) — так классы всегда согласованы."""
+
+    def __init__(self):
+        self.cells = {}
+
+    def attach(self, filename, sec, state=None):
+        """state — состояние, с которым создаётся ячейка, если класса ещё
+        нет (например, при перезагрузке шаблона, где он единственный);
+        по умолчанию — sec.enabled."""
+        cell = self.cells.get(sec.cls)
+        if cell is None:
+            cell = self.cells[sec.cls] = ClassCell(
+                sec.cls, sec.enabled if state is None else state
+            )
+        cell.members.append((filename, sec))
+        sec.cell = cell
+
+    def detach(self, sec):
+        cell = sec.cell
+        if cell is None:
+            return
+        sec.cell = None
+        sec._enabled = cell.enabled
+        cell.members = [(f, s) for f, s in cell.members if s is not sec]
+        if not cell.members:
+            del self.cells[cell.name]
+
+    def conflicting_defaults(self):
+        """{class: {default: [файлы]}} для классов, у которых default
+        различается между секциями."""
+        conflicts = {}
+        for name, cell in sorted(self.cells.items()):
+            by_default = {}
+            for filename, sec in cell.members:
+                files = by_default.setdefault(sec.default, [])
+                if filename not in files:
+                    files.append(filename)
+            if len(by_default) > 1:
+                conflicts[name] = by_default
+        return conflicts
+
+
+def format_class_conflicts(conflicts):
+    """Строки отчёта о несогласованных default: по одной на класс."""
+    lines = []
+    for name, by_default in conflicts.items():
+        parts = [
+            f"default={int(default)}: {', '.join(files)}"
+            for default, files in sorted(by_default.items(), reverse=True)
+        ]
+        lines.append(f"class={name} — " + "; ".join(parts))
+    return lines
+
 
 _TAG_RE = re.compile(r"\[SECTION([^\]]*)\]|\[/SECTION\]")
 _ATTR_RE = re.compile(r'(\w+)\s*=\s*"([^"]*)"|(\w+)\s*=\s*(\S+)')
@@ -117,41 +311,58 @@ def _parse_default(raw):
     return True
 
 
-def parse_template(text, filename):
-    """Разбирает содержимое файла в дерево узлов (список str | Section).
-
-    Бросает TemplateParseError при незакрытой/лишней закрывающей секции.
-    """
+def _parse_region(text, line, errors, names):
+    """Один проход по text. line — номер строки, с которой начинается text;
+    ошибки дописываются в errors, имена секций проверяются и добавляются в
+    names. Возвращает (nodes, spans): верхнеуровневые узлы и их границы
+    [start, end) в text."""
     pos = 0
+    counted = 0           # переводы строк до этой позиции уже учтены в line
     root = []
+    spans = []
     stack = [root]        # стек списков-контейнеров (текущие "children")
     open_sections = []    # стек открытых Section (для проверки закрытия)
+    top_start = 0
 
     for m in _TAG_RE.finditer(text):
-        pre = text[pos:m.start()]
-        if pre:
-            stack[-1].append(pre)
+        start = m.start()
+        if start > pos:
+            stack[-1].append(text[pos:start])
+            if len(stack) == 1:
+                spans.append((pos, start))
+        line += text.count("\n", counted, start)
+        counted = start
         pos = m.end()
 
         if m.group(0) == "[/SECTION]":
             if not open_sections:
-                line = text.count("\n", 0, m.start()) + 1
-                raise TemplateParseError(
-                    filename, line,
+                errors.append((
+                    line,
                     "Обнаружен закрывающий тег [/SECTION] без соответствующего "
-                    "открывающего тега (лишняя или пересекающаяся секция)."
-                )
+                    "открывающего тега (лишняя или пересекающаяся секция).",
+                ))
+                continue
             open_sections.pop()
             stack.pop()
+            if len(stack) == 1:
+                spans.append((top_start, pos))
         else:
             attrs = _parse_attrs(m.group(1) or "")
-            line = text.count("\n", 0, m.start()) + 1
             sec = Section(
                 name=attrs.get("name"),
                 cls=attrs.get("class"),
                 default=_parse_default(attrs.get("default")),
                 line=line,
             )
+            if sec.name:
+                if sec.name in names:
+                    errors.append((
+                        line,
+                        f"Повторяющееся имя секции name='{sec.name}' в пределах одного файла.",
+                    ))
+                names.add(sec.name)
+            if len(stack) == 1:
+                top_start = start
             stack[-1].append(sec)
             open_sections.append(sec)
             stack.append(sec.children)
@@ -159,15 +370,152 @@ def parse_template(text, filename):
     tail = text[pos:]
     if tail:
         stack[-1].append(tail)
+        if len(stack) == 1:
+            spans.append((pos, len(text)))
+
+    for sec in open_sections:
+        errors.append((
+            sec.line, "Не найден закрывающий тег [/SECTION] для секции, открытой здесь."
+        ))
+    return root, spans
 
-    if open_sections:
-        unclosed = open_sections[-1]
-        raise TemplateParseError(
-            filename, unclosed.line,
-            "Не найден закрывающий тег [/SECTION] для секции, открытой здесь."
-        )
 
-    return root
+def _raise_parse_errors(filename, errors):
+    errors.sort(key=lambda e: e[0])
+    line, message = errors[0]
+    raise TemplateParseError(filename, line, message, errors)
+
+
+def parse_template(text, filename):
+    """Разбирает содержимое файла в дерево узлов (список str | Section).
+
+    Бросает TemplateParseError со всеми найденными ошибками: незакрытые
+    секции, лишние закрывающие теги, повторяющиеся имена.
+    """
+    return ParsedTemplate.parse(text, filename).nodes
+
+
+def _common_prefix(a, b):
+    """Длина общего префикса строк (двоичный поиск по срезам — сравнение
+    идёт блоками на C, а не посимвольно в Python)."""
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[lo:mid] == b[lo:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _common_suffix(a, b, limit):
+    """Длина общего суффикса строк, не больше limit."""
+    lo, hi = 0, limit
+    la, lb = len(a), len(b)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[la - mid:la - lo] == b[lb - mid:lb - lo]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _shift_lines(nodes, delta):
+    """Сдвигает номера строк всех секций в nodes (на месте, без рекурсии)."""
+    stack = [nodes]
+    while stack:
+        for node in stack.pop():
+            if not isinstance(node, str):
+                node.line += delta
+                if node.children:
+                    stack.append(node.children)
+
+
+class ParsedTemplate:
+    """Разобранный шаблон вместе с исходным текстом и границами
+    верхнеуровневых узлов — этого достаточно, чтобы после правки текста
+    заново разобрать только затронутую область (reparse).
+
+    edit — что reparse поменял относительно прошлого дерева:
+    (lo, removed, added, line_delta) — верхнеуровневые узлы
+    nodes[lo:lo + added] новые и заменили removed старых, у последующих
+    номера строк сдвинуты на line_delta; None — дерево разобрано целиком."""
+
+    __slots__ = ("filename", "text", "nodes", "spans", "names", "edit")
+
+    def __init__(self, filename, text, nodes, spans, names, edit=None):
+        self.filename = filename
+        self.text = text
+        self.nodes = nodes
+        self.spans = spans
+        self.names = names   # имена всех секций (в корректном шаблоне уникальны)
+        self.edit = edit
+
+    @classmethod
+    def parse(cls, text, filename):
+        errors = []
+        names = set()
+        nodes, spans = _parse_region(text, 1, errors, names)
+        if errors:
+            _raise_parse_errors(filename, errors)
+        return cls(filename, text, nodes, spans, names)
+
+    def reparse(self, new_text):
+        """Разбор нового текста с повторным использованием узлов, которые
+        правка не затронула. Верхнеуровневые узлы до и после изменённой
+        области переходят в результат как есть (у последующих на месте
+        сдвигаются номера строк), поэтому после reparse старым объектом
+        пользоваться нельзя. При любой ошибке или неоднозначной границе
+        выполняется полный разбор — результат и ошибки всегда те же, что
+        у parse()."""
+        old = self.text
+        if new_text == old:
+            return self
+        prefix = _common_prefix(old, new_text)
+        suffix = _common_suffix(old, new_text, min(len(old), len(new_text)) - prefix)
+        change_end = len(old) - suffix
+        delta = len(new_text) - len(old)
+
+        nodes, spans = self.nodes, self.spans
+        i = 0
+        while i < len(spans) and spans[i][1] <= prefix:
+            i += 1
+        j = len(spans) - 1
+        while j >= 0 and spans[j][0] >= change_end:
+            j -= 1
+        # соседний текст разбирается вместе с областью, чтобы на границах
+        # оставались только целые секции (и строки не дробились)
+        while i > 0 and isinstance(nodes[i - 1], str):
+            i -= 1
+        while j + 1 < len(nodes) and isinstance(nodes[j + 1], str):
+            j += 1
+        old_lo = spans[i][0] if i <= j else prefix
+        old_hi = spans[j][1] if i <= j else prefix
+
+        region = new_text[old_lo:old_hi + delta]
+        if region.rfind("[") > region.rfind("]"):
+            # незавершённый тег мог бы продолжиться за границей области
+            return ParsedTemplate.parse(new_text, self.filename)
+
+        head, tail = nodes[:i], nodes[j + 1:]
+        names = self.names - {sec.name for sec in iter_sections(nodes[i:j + 1])}
+        errors = []
+        line = new_text.count("\n", 0, old_lo) + 1
+        middle, middle_spans = _parse_region(region, line, errors, names)
+        if errors:
+            return ParsedTemplate.parse(new_text, self.filename)
+
+        line_delta = region.count("\n") - old.count("\n", old_lo, old_hi)
+        if line_delta:
+            _shift_lines(tail, line_delta)
+        new_spans = (
+            spans[:i]
+            + [(a + old_lo, b + old_lo) for a, b in middle_spans]
+            + [(a + delta, b + delta) for a, b in spans[j + 1:]]
+        )
+        edit = (i, len(nodes) - len(head) - len(tail), len(middle), line_delta)
+        return ParsedTemplate(self.filename, new_text, head + middle + tail, new_spans, names, edit)
 
 
 def iter_sections(nodes):
@@ -178,17 +526,234 @@ def iter_sections(nodes):
             yield from iter_sections(n.children)
 
 
-def validate_unique_names(nodes, filename):
-    """В пределах одного файла имя (name) должно быть уникальным."""
-    seen = set()
-    for sec in iter_sections(nodes):
-        if sec.name:
-            if sec.name in seen:
-                raise TemplateParseError(
-                    filename, sec.line,
-                    f"Повторяющееся имя секции name='{sec.name}' в пределах одного файла."
-                )
-            seen.add(sec.name)
+def dump_nodes(nodes):
+    """Компактная сериализуемая форма дерева: строка остаётся строкой,
+    Section -> [name, class, default, line, children]."""
+    out = []
+    for n in nodes:
+        if isinstance(n, str):
+            out.append(n)
+        else:
+            out.append([n.name, n.cls, int(n.default), n.line, dump_nodes(n.children)])
+    return out
+
+
+def load_nodes(data):
+    """Обратное к dump_nodes преобразование."""
+    nodes = []
+    for item in data:
+        if isinstance(item, str):
+            nodes.append(item)
+        else:
+            name, cls, default, line, children = item
+            sec = Section(name=name, cls=cls, default=bool(default), line=line)
+            sec.children = load_nodes(children)
+            nodes.append(sec)
+    return nodes
+
+
+def read_template_cache():
+    """Кэш разобранных шаблонов: filename -> {size, mtime_ns, sha256, nodes}."""
+    try:
+        with open(TEMPLATE_CACHE_FILE, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(data, dict) or data.get("version") != TEMPLATE_CACHE_VERSION:
+        return {}
+    return data.get("files", {})
+
+
+def write_template_cache(files):
+    """Атомарно записывает кэш (временный файл + os.replace). Ошибки
+    записи не критичны — кэш просто не обновится."""
+    tmp = TEMPLATE_CACHE_FILE + ".tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": TEMPLATE_CACHE_VERSION, "files": files}, f,
+                      ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, TEMPLATE_CACHE_FILE)
+    except OSError:
+        pass
+
+
+def decode_template(raw):
+    """Байты файла шаблона -> текст, как при чтении в текстовом режиме:
+    UTF-8 и универсальные переводы строк."""
+    return raw.decode("utf-8").replace("\r\n", "\n").replace("\r", "\n")
+
+
+def _read_template(filepath, cached):
+    """Общая часть load_template_file и TemplateWatcher: stat, чтение и
+    sha256 файла. Возвращает (cache_entry, content); content = None, если
+    разбирать нечего — файл не менялся (тогда cache_entry — тот же объект
+    cached) или совпал sha256 (узлы в cache_entry взяты из cached)."""
+    st = os.stat(filepath)
+    if (
+        cached is not None
+        and cached.get("size") == st.st_size
+        and cached.get("mtime_ns") == st.st_mtime_ns
+    ):
+        return cached, None
+
+    with open(filepath, "rb") as fh:
+        raw = fh.read()
+    sha256 = hashlib.sha256(raw).hexdigest()
+    entry = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": sha256}
+    if cached is not None and cached.get("sha256") == sha256:
+        entry["nodes"] = cached["nodes"]
+        return entry, None
+    return entry, decode_template(raw)
+
+
+def load_template_file(filepath, filename, cached=None):
+    """Читает и разбирает один шаблон, по возможности — из кэша.
+
+    Возвращает (nodes, cache_entry); cache_entry — тот же объект cached,
+    если файл не менялся вовсе. Бросает UnicodeDecodeError / OSError /
+    TemplateParseError как при обычном чтении и разборе.
+    """
+    entry, content = _read_template(filepath, cached)
+    if content is None:
+        return load_nodes(entry["nodes"]), entry
+    nodes = parse_template(content, filename)
+    entry["nodes"] = dump_nodes(nodes)
+    return nodes, entry
+
+
+def apply_node_patch(nodes, patch):
+    """Применяет к дереву (на месте) patch = (lo, removed, new_nodes,
+    line_delta) из TemplateWatcher: повторяет то, что reparse сделал с
+    деревом, из которого это дерево было скопировано."""
+    lo, removed, new_nodes, line_delta = patch
+    nodes[lo:lo + removed] = new_nodes
+    if line_delta:
+        _shift_lines(nodes[lo + len(new_nodes):], line_delta)
+
+
+def ini_bool(raw):
+    """Значение из секции [States] INI -> bool."""
+    return raw.strip().lower() in ("1", "true", "yes", "on")
+
+
+def describe_load_error(filename, exc):
+    """Текст ошибки загрузки шаблона для пользователя."""
+    if isinstance(exc, UnicodeDecodeError):
+        return f"{filename}: файл не в кодировке UTF-8."
+    if isinstance(exc, OSError):
+        return f"{filename}: не удалось прочитать файл ({exc})."
+    return str(exc)
+
+
+def file_signature(filepath):
+    """(размер, mtime_ns) — признак того, что файл менялся."""
+    st = os.stat(filepath)
+    return st.st_size, st.st_mtime_ns
+
+
+class TemplateWatcher(threading.Thread):
+    """Фоновый поток: опрашивает каталог промптов и разбирает изменившиеся
+    шаблоны. В UI-поток через очередь results передаются кортежи
+    ("updated", filename, nodes), ("patched", filename, patch),
+    ("removed", filename, None) и ("error", filename, message); сам поток
+    виджетов не касается.
+
+    ParsedTemplate шаблона создаётся при первой его правке (полный разбор,
+    в UI уходит "updated") и дальше хранится в parsed: следующие правки
+    разбираются через reparse — заново только изменённая область, — а в UI
+    уходит "patched" с копиями одних только новых узлов, patch =
+    (lo, removed, nodes, line_delta), см. ParsedTemplate.edit. Шаблоны,
+    которые не правят, поток не разбирает вовсе."""
+
+    def __init__(self, directory, known, cache, interval=WATCH_INTERVAL):
+        super().__init__(name="template-watcher", daemon=True)
+        self.directory = directory
+        self.known = dict(known)   # filename -> (size, mtime_ns)
+        self.cache = dict(cache)   # filename -> запись дискового кэша
+        self.interval = interval
+        self.parsed = {}           # filename -> ParsedTemplate (только для потока)
+        self.results = queue.Queue()
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.poll()
+
+    def scan(self):
+        current = {}
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.name.lower().endswith(".txt") and entry.is_file():
+                        st = entry.stat()
+                        current[entry.name] = (st.st_size, st.st_mtime_ns)
+        except OSError:
+            return None   # каталог временно недоступен — попробуем позже
+        return current
+
+    def poll(self):
+        current = self.scan()
+        if current is None:
+            return
+        changed = False
+
+        for filename in sorted(self.known.keys() - current.keys()):
+            del self.known[filename]
+            self.cache.pop(filename, None)
+            self.parsed.pop(filename, None)
+            self.results.put(("removed", filename, None))
+            changed = True
+
+        for filename, signature in sorted(current.items()):
+            if self.known.get(filename) == signature:
+                continue
+            self.known[filename] = signature
+            try:
+                update, entry = self.load(filename, self.cache.get(filename))
+            except (UnicodeDecodeError, OSError, TemplateParseError) as e:
+                self.results.put(("error", filename, describe_load_error(filename, e)))
+                continue
+            self.cache[filename] = entry
+            changed = True
+            if update is not None:
+                self.results.put((update[0], filename, update[1]))
+
+        if changed:
+            write_template_cache(self.cache)
+
+    def load(self, filename, cached):
+        """Перечитывает изменившийся шаблон. Возвращает (update, cache_entry):
+        update — ("updated", nodes), ("patched", patch) или None, если
+        содержимое не изменилось (поменялся только mtime). И в UI, и в кэш
+        копируются только узлы, которые reparse разобрал заново."""
+        entry, content = _read_template(os.path.join(self.directory, filename), cached)
+        if content is None:
+            return None, entry
+        previous = self.parsed.get(filename)
+        if previous is None or cached is None:
+            doc = ParsedTemplate.parse(content, filename)
+        else:
+            doc = previous.reparse(content)
+        self.parsed[filename] = doc
+        if doc is previous:
+            # другие байты, тот же текст (например, CRLF -> LF)
+            entry["nodes"] = cached["nodes"]
+            return None, entry
+        if doc.edit is None:
+            entry["nodes"] = dump_nodes(doc.nodes)
+            return ("updated", load_nodes(entry["nodes"])), entry
+
+        lo, removed, added, line_delta = doc.edit
+        middle = dump_nodes(doc.nodes[lo:lo + added])
+        if line_delta:
+            tail = dump_nodes(doc.nodes[lo + added:])
+        else:
+            tail = cached["nodes"][lo + removed:]
+        entry["nodes"] = cached["nodes"][:lo] + middle + tail
+        return ("patched", (lo, removed, load_nodes(middle), line_delta)), entry
 
 
 def render(nodes):
@@ -203,11 +768,305 @@ def render(nodes):
     return "".join(out)
 
 
+class RenderPlan:
+    """Шаблон, скомпилированный в плоский план генерации.
+
+    texts — фрагменты текста в порядке вывода (None — место подстановки
+    номера тикета); sections — все Section в порядке обхода в глубину;
+    фрагменты секции i (вместе с вложенными) занимают texts[starts[i]:stops[i]],
+    а skips[i] — индекс первой секции после её поддерева. Выключенная
+    секция пропускается вместе с поддеревом за один шаг.
+    """
+
+    __slots__ = ("sections", "texts", "starts", "stops", "skips", "_ticket", "_filled")
+
+    def __init__(self, sections, texts, starts, stops, skips):
+        self.sections = sections
+        self.texts = texts
+        self.starts = starts
+        self.stops = stops
+        self.skips = skips
+        self._ticket = None
+        self._filled = None
+
+    def _texts_for(self, ticket):
+        # Номер тикета меняется редко — подставленный список переиспользуется.
+        if ticket != self._ticket or self._filled is None:
+            self._filled = [ticket if t is None else t for t in self.texts]
+            self._ticket = ticket
+        return self._filled
+
+    def visibility(self):
+        """visible[i] — попадает ли содержимое секции i в результат
+        (секция включена и включены все её предки)."""
+        sections, skips = self.sections, self.skips
+        visible = [False] * len(sections)
+        i = 0
+        while i < len(sections):
+            if sections[i].enabled:
+                visible[i] = True
+                i += 1
+            else:
+                i = skips[i]
+        return visible
+
+    def owners(self):
+        """owners[j] — индекс самой вложенной секции, которой принадлежит
+        фрагмент texts[j] (-1 — текст вне секций)."""
+        owners = [-1] * len(self.texts)
+        # обход в глубину: потомки перезаписывают диапазон предка
+        for i, (start, stop) in enumerate(zip(self.starts, self.stops)):
+            owners[start:stop] = [i] * (stop - start)
+        return owners
+
+    def render(self, ticket):
+        texts = self._texts_for(ticket)
+        sections, skips = self.sections, self.skips
+        out = []
+        pos = 0
+        i = 0
+        count = len(sections)
+        while i < count:
+            if sections[i].enabled:
+                i += 1
+                continue
+            out += texts[pos:self.starts[i]]
+            pos = self.stops[i]
+            i = skips[i]
+        out += texts[pos:]
+        return "".join(out)
+
+
+def compile_template(nodes):
+    """Компилирует дерево узлов в RenderPlan (без рекурсии — вложенность
+    секций не ограничена глубиной стека)."""
+    sections = []
+    texts = []
+    starts = []
+    stops = []
+    skips = []
+    boundary = 0  # фрагменты до границы секции не склеиваются с новыми
+
+    def add_text(text):
+        parts = text.split(TICKET_PLACEHOLDER)
+        for i, part in enumerate(parts):
+            if i:
+                texts.append(None)
+            if part:
+                if len(texts) > boundary and texts[-1] is not None:
+                    texts[-1] += part
+                else:
+                    texts.append(part)
+
+    stack = [(iter(nodes), -1)]
+    while stack:
+        it, index = stack[-1]
+        node = next(it, None)
+        if node is None:
+            stack.pop()
+            if index >= 0:
+                stops[index] = len(texts)
+                skips[index] = len(sections)
+                boundary = len(texts)
+        elif isinstance(node, str):
+            add_text(node)
+        else:
+            boundary = len(texts)
+            sections.append(node)
+            starts.append(boundary)
+            stops.append(boundary)
+            skips.append(0)
+            stack.append((iter(node.children), len(sections) - 1))
+
+    return RenderPlan(sections, texts, starts, stops, skips)
+
+
+# --------------------------------------------------------------------------
+# Хранение состояния
+# --------------------------------------------------------------------------
+
+
+class StateStore:
+    """Содержимое prompt_constructor.ini в памяти: секции General и States.
+
+    set() меняет значение и помечает ключ изменённым; запись на диск —
+    отложенно, в фоновом таймере (flush), один раз для всех изменений,
+    накопившихся за delay секунд. В файл переносятся только изменённые
+    ключи: остальное содержимое берётся из файла на диске как есть. Файл
+    пишется атомарно: временный файл (fsync) + os.replace. Ошибка последней
+    записи — в last_error. Ключи, как и в ConfigParser, без учёта регистра.
+    """
+
+    def __init__(self, path, delay=STATE_FLUSH_DELAY):
+        self.path = path
+        self.delay = delay
+        self.last_error = None
+        self._sections = {"General": {}, "States": {}}
+        self._dirty = set()                  # {(section, key)} — ещё не записаны
+        self._lock = threading.Lock()        # данные, _dirty и _timer
+        self._write_lock = threading.Lock()  # одна запись файла за раз
+        self._timer = None
+
+    def load(self):
+        cfg = configparser.ConfigParser()
+        if os.path.exists(self.path):
+            try:
+                cfg.read(self.path, encoding="utf-8")
+            except (configparser.Error, OSError):
+                pass
+        with self._lock:
+            for name in cfg.sections():
+                self._sections.setdefault(name, {}).update(cfg[name])
+
+    def get(self, section, key, fallback=None):
+        return self._sections.get(section, {}).get(key.lower(), fallback)
+
+    def set(self, section, key, value):
+        key = key.lower()
+        with self._lock:
+            values = self._sections.setdefault(section, {})
+            if values.get(key) == value:
+                return
+            values[key] = value
+            self._dirty.add((section, key))
+            self._schedule()
+
+    def prune(self, section, filename, keep=(), others=()):
+        """Удаляет ключи section вида "<filename>.<секция>", кроме keep.
+
+        Имя секции может содержать точки, поэтому ключ относится к самому
+        длинному подходящему имени файла из filename и others (остальные
+        известные шаблоны): при шаблоне a.txt.b.txt ключ "a.txt.b.txt.x" —
+        его, а не секции "b.txt.x" шаблона a.txt."""
+        prefix = f"{filename.lower()}."
+        foreign = tuple(
+            f"{other.lower()}." for other in others
+            if len(other) > len(filename) and other.lower().startswith(prefix)
+        )
+        keep = {k.lower() for k in keep}
+        with self._lock:
+            values = self._sections.get(section, {})
+            stale = [
+                k for k in values
+                if k.startswith(prefix) and not k.startswith(foreign) and k not in keep
+            ]
+            for key in stale:
+                del values[key]
+                self._dirty.add((section, key))
+            if stale:
+                self._schedule()
+
+    def prune_unknown_files(self, filenames):
+        """Удаляет из [States] ключи шаблонов, которых больше нет на диске."""
+        prefixes = tuple(f"{f.lower()}." for f in filenames)
+        with self._lock:
+            values = self._sections.get("States", {})
+            stale = [k for k in values if not k.startswith(prefixes)]
+            for key in stale:
+                del values[key]
+                self._dirty.add(("States", key))
+            if stale:
+                self._schedule()
+
+    def _schedule(self):
+        # вызывается под self._lock
+        if self._timer is None:
+            self._timer = threading.Timer(self.delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        """Записывает изменённые ключи, если они есть. Возвращает исключение
+        OSError при неудаче (изменения остаются помеченными) или None."""
+        with self._write_lock:
+            with self._lock:
+                self._timer = None
+                if not self._dirty:
+                    return None
+                dirty, self._dirty = self._dirty, set()
+                changes = [(section, key, self.get(section, key)) for section, key in dirty]
+
+            tmp = self.path + ".tmp"
+            try:
+                cfg = self._merge_into_file(changes)
+                with open(tmp, "w", encoding="utf-8") as f:
+                    cfg.write(f)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp, self.path)
+            except OSError as e:
+                with self._lock:
+                    self._dirty |= dirty
+                self.last_error = e
+                return e
+            self.last_error = None
+            return None
+
+    def _merge_into_file(self, changes):
+        """Содержимое файла на диске с применёнными changes
+        [(section, key, value | None — ключ удалён)]. Если файла нет или он
+        не читается как INI — всё текущее состояние из памяти."""
+        cfg = configparser.ConfigParser()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                cfg.read_file(f)
+        except (FileNotFoundError, UnicodeDecodeError, configparser.Error):
+            cfg = configparser.ConfigParser()
+            with self._lock:
+                cfg.read_dict({name: dict(values) for name, values in self._sections.items()})
+            return cfg
+        for section, key, value in changes:
+            if value is None:
+                if cfg.has_section(section):
+                    cfg.remove_option(section, key)
+                continue
+            if not cfg.has_section(section):
+                cfg.add_section(section)
+            cfg.set(section, key, value)
+        return cfg
+
+    def close(self):
+        """Отменяет отложенную запись и записывает всё немедленно."""
+        with self._lock:
+            timer, self._timer = self._timer, None
+        if timer is not None:
+            timer.cancel()
+        return self.flush()
+
+
 # --------------------------------------------------------------------------
 # Приложение
 # --------------------------------------------------------------------------
 
 
+class OutputText(tk.Text):
+    """Поле результата. Фрагменты выключенных секций лежат в нём скрытыми
+    (elide), поэтому копирование и вырезание — и кнопкой Copy, и штатными
+    Ctrl+C / Ctrl+X (<<Copy>>, <<Cut>>) — берут только видимый текст."""
+
+    def __init__(self, master=None, **kw):
+        super().__init__(master, **kw)
+        self.bind("<<Copy>>", lambda _e: self._copy_selection(cut=False))
+        self.bind("<<Cut>>", lambda _e: self._copy_selection(cut=True))
+
+    def get_displayed(self, index1, index2=None):
+        """Как get(), но без скрытого (elide) текста."""
+        args = (index1,) if index2 is None else (index1, index2)
+        return self.tk.call(str(self), "get", "-displaychars", *args)
+
+    def copy_displayed(self, index1, index2):
+        self.clipboard_clear()
+        self.clipboard_append(self.get_displayed(index1, index2))
+
+    def _copy_selection(self, cut):
+        if self.tag_ranges("sel"):
+            self.copy_displayed("sel.first", "sel.last")
+            if cut:
+                self.delete("sel.first", "sel.last")
+        # штатная привязка класса Text скопировала бы и скрытый текст
+        return "break"
+
+
 class PromptConstructorApp(tk.Tk):
     def __init__(self):
         super().__init__()
@@ -220,10 +1079,17 @@ class PromptConstructorApp(tk.Tk):
             pass
 
         self.files = {}          # filename -> {"nodes": [...]}
-        self.class_registry = {} # cls -> [Section, ...] (across all files)
+        self.class_index = ClassIndex()  # class -> общее состояние (все файлы)
         self.section_vars = {}   # Section -> tk.BooleanVar
         # Section -> {"text_widget":.., "tag":.., "range":(start,end)}
         self.section_display = {}
+        # что сейчас вставлено в поле результата: {"plan", "ticket", "visible"}
+        self._output = None
+        # планировщик обновлений: секции, ждущие перерисовки в панелях,
+        # и отложенная регенерация (after/after_idle)
+        self._pending_visual = set()
+        self._update_job = None
+        self._update_delayed = False
 
         self.ticket_var = tk.StringVar()
         self.workdir_var = tk.StringVar()
@@ -234,10 +1100,13 @@ class PromptConstructorApp(tk.Tk):
         self.text_dirty = False
         self._ui_ready = False   # чтобы не генерировать во время построения UI
 
-        self.config_parser = configparser.ConfigParser()
-        self._saved_states = {}
-        self._saved_ticket = ""
+        self.state_store = StateStore(CONFIG_FILE)
+        self._section_files = {}    # Section -> filename (для ключей [States])
         self._saved_last_tab = ""
+        self._template_stats = {}   # filename -> (size, mtime_ns) при загрузке
+        self._listed = set()        # шаблоны в каталоге, в т.ч. с ошибками
+        self._state_error = None    # last_error StateStore, уже показанная
+        self._template_cache = {}
 
         self._load_config()
         errors = self._load_templates()
@@ -248,51 +1117,55 @@ class PromptConstructorApp(tk.Tk):
         self.on_generate()
         self._ui_ready = True
 
+        self.watcher = TemplateWatcher(
+            PROMPTS_DIR, self._template_stats, self._template_cache
+        )
+        self.watcher.start()
+        self.after(WATCH_POLL_MS, self._poll_watcher)
+
         if errors:
             messagebox.showerror(
                 "Ошибки в шаблонах",
                 "Следующие файлы содержат ошибки и не будут использоваться "
                 "для генерации:\n\n" + "\n\n".join(errors),
             )
+        conflicts = format_class_conflicts(self.class_index.conflicting_defaults())
+        if conflicts:
+            messagebox.showwarning(
+                "Несогласованные классы",
+                "У одних и тех же классов в разных шаблонах разный default "
+                "(Reset будет давать разный результат в зависимости от "
+                "вкладки):\n\n" + "\n".join(conflicts),
+            )
 
         self.protocol("WM_DELETE_WINDOW", self.on_close)
 
     # ---------------------------------------------------------- config ----
 
     def _load_config(self):
-        if os.path.exists(CONFIG_FILE):
-            try:
-                self.config_parser.read(CONFIG_FILE, encoding="utf-8")
-            except (configparser.Error, OSError):
-                pass
-        self._saved_ticket = self.config_parser.get("General", "ticket", fallback="")
-        self._saved_last_tab = self.config_parser.get("General", "last_tab", fallback="")
-        self._saved_workdir = self.config_parser.get(
-            "General", "workdir", fallback=DEFAULT_WORKDIR
-        )
-        if self.config_parser.has_section("States"):
-            self._saved_states = dict(self.config_parser["States"])
-        self.ticket_var.set(self._saved_ticket)
-        self.workdir_var.set(self._saved_workdir)
+        store = self.state_store
+        store.load()
+        self._saved_last_tab = store.get("General", "last_tab", "")
+        self.ticket_var.set(store.get("General", "ticket", ""))
+        self.workdir_var.set(store.get("General", "workdir", DEFAULT_WORKDIR))
 
     def _save_config(self):
-        cfg = configparser.ConfigParser()
-        cfg["General"] = {
-            "ticket": self.ticket_var.get(),
-            "last_tab": self._current_tab_filename() or "",
-            "workdir": self.workdir_var.get(),
-        }
-        states = {}
-        for filename, data in self.files.items():
-            for sec in iter_sections(data["nodes"]):
-                if sec.name:
-                    states[f"{filename}.{sec.name}"] = "true" if sec.enabled else "false"
-        cfg["States"] = states
-        try:
-            with open(CONFIG_FILE, "w", encoding="utf-8") as f:
-                cfg.write(f)
-        except OSError as e:
-            messagebox.showwarning("Сохранение настроек", f"Не удалось сохранить настройки: {e}")
+        """Дописывает текущие значения General и немедленно сбрасывает все
+        накопившиеся изменения на диск (при закрытии)."""
+        store = self.state_store
+        store.set("General", "ticket", self.ticket_var.get())
+        store.set("General", "last_tab", self._current_tab_filename() or "")
+        store.set("General", "workdir", self.workdir_var.get())
+        error = store.close()
+        if error is not None:
+            messagebox.showwarning("Сохранение настроек", f"Не удалось сохранить настройки: {error}")
+
+    def _store_section_state(self, sec):
+        filename = self._section_files.get(sec)
+        if filename is not None and sec.name:
+            self.state_store.set(
+                "States", f"{filename}.{sec.name}", "true" if sec.enabled else "false"
+            )
 
     # -------------------------------------------------------- templates ---
 
@@ -313,40 +1186,151 @@ class PromptConstructorApp(tk.Tk):
             )
         except OSError as e:
             errors.append(f"Не удалось прочитать каталог промптов «{PROMPTS_DIR}»: {e}")
-            filenames = []
+            filenames = None
+
+        self._listed = set(filenames or ())
+        cache = read_template_cache()
+        new_cache = {}
+        cache_dirty = False
 
-        for filename in filenames:
+        for filename in filenames or ():
             filepath = os.path.join(PROMPTS_DIR, filename)
+            cached = cache.get(filename)
             try:
-                with open(filepath, "r", encoding="utf-8") as fh:
-                    content = fh.read()
-            except UnicodeDecodeError:
-                errors.append(f"{filename}: файл не в кодировке UTF-8.")
-                continue
-            except OSError as e:
-                errors.append(f"{filename}: не удалось прочитать файл ({e}).")
+                # признак снимается до чтения: если файл поменяют сразу
+                # после загрузки, наблюдатель это заметит
+                self._template_stats[filename] = file_signature(filepath)
+                nodes, entry = load_template_file(filepath, filename, cached)
+            except (UnicodeDecodeError, OSError, TemplateParseError) as e:
+                errors.append(describe_load_error(filename, e))
                 continue
+            new_cache[filename] = entry
+            if entry is not cached:
+                cache_dirty = True
+            self._install_template(filename, nodes)
+
+        if cache_dirty or set(new_cache) != set(cache):
+            write_template_cache(new_cache)
+        self._template_cache = new_cache
+        # состояния шаблонов, которых больше нет, не нужны (шаблоны с
+        # ошибками остаются в filenames — их состояния сохраняются)
+        if filenames is not None:
+            self.state_store.prune_unknown_files(filenames)
+        return errors
 
-            try:
-                nodes = parse_template(content, filename)
-                validate_unique_names(nodes, filename)
-            except TemplateParseError as e:
-                errors.append(str(e))
-                continue
+    def _install_template(self, filename, nodes, states=None, class_states=None):
+        """Регистрирует дерево шаблона. Состояние секции берётся из states
+        (name -> bool, текущие состояния при перезагрузке), иначе из INI;
+        class_states (class -> bool) восстанавливает классы, которые при
+        перезагрузке исчезли из индекса вместе со старым деревом."""
+        keys = []
+        for sec in iter_sections(nodes):
+            self._section_files[sec] = filename
+            if sec.name:
+                key = f"{filename}.{sec.name}"
+                keys.append(key)
+                saved = self.state_store.get("States", key)
+                if states is not None and sec.name in states:
+                    sec.enabled = states[sec.name]
+                elif saved is not None:
+                    sec.enabled = ini_bool(saved)
+            if sec.cls:
+                self.class_index.attach(filename, sec, (class_states or {}).get(sec.cls))
+
+        self.files[filename] = {"nodes": nodes, "plan": compile_template(nodes)}
+        # в INI — состояния всех секций шаблона и ничего лишнего
+        for sec in iter_sections(nodes):
+            self._store_section_state(sec)
+        self.state_store.prune("States", filename, keys, self._listed)
+
+    def _uninstall_template(self, filename):
+        """Убирает шаблон из модели (панель, реестр классов, files) и
+        возвращает текущие состояния (name -> bool, class -> bool) его
+        секций — по ним _install_template восстанавливает новое дерево."""
+        self._drop_panel(filename)
+        data = self.files.pop(filename)
+        states = {}
+        class_states = {}
+        for sec in iter_sections(data["nodes"]):
+            if sec.name:
+                states[sec.name] = sec.enabled
+            if sec.cls:
+                class_states[sec.cls] = sec.enabled
+            self.class_index.detach(sec)
+            self._section_files.pop(sec, None)
+        return states, class_states
 
-            for sec in iter_sections(nodes):
-                if sec.name:
-                    key = f"{filename}.{sec.name}"
-                    if key in self._saved_states:
-                        sec.enabled = self._saved_states[key].strip().lower() in (
-                            "1", "true", "yes", "on"
-                        )
-                if sec.cls:
-                    self.class_registry.setdefault(sec.cls, []).append(sec)
+    # ---------------------------------------------------- hot reload ------
 
-            self.files[filename] = {"nodes": nodes}
+    def _poll_watcher(self):
+        """Забирает из очереди наблюдателя все накопившиеся результаты."""
+        listing_changed = False
+        try:
+            while True:
+                kind, filename, payload = self.watcher.results.get_nowait()
+                if kind == "removed":
+                    self._listed.discard(filename)
+                else:
+                    self._listed.add(filename)
+                if kind == "updated":
+                    states = class_states = None
+                    if filename in self.files:
+                        states, class_states = self._uninstall_template(filename)
+                    else:
+                        listing_changed = True
+                    self._install_template(filename, payload, states, class_states)
+                    self.status_var.set(f"Шаблон «{filename}» перезагружен.")
+                elif kind == "patched" and filename in self.files:
+                    # узлы вне правки остаются прежними объектами (с их состоянием)
+                    nodes = self.files[filename]["nodes"]
+                    states, class_states = self._uninstall_template(filename)
+                    apply_node_patch(nodes, payload)
+                    self._install_template(filename, nodes, states, class_states)
+                    self.status_var.set(f"Шаблон «{filename}» перезагружен.")
+                elif kind == "removed" and filename in self.files:
+                    self._uninstall_template(filename)
+                    self.state_store.prune("States", filename, others=self._listed)
+                    listing_changed = True
+                    self.status_var.set(f"Шаблон «{filename}» удалён.")
+                elif kind == "error":
+                    self.status_var.set(f"Шаблон не перезагружен: {payload}")
+                if filename == self._current_filename:
+                    self._schedule_update()
+        except queue.Empty:
+            pass
 
-        return errors
+        if listing_changed:
+            self._refresh_tab_list()
+        current = self._current_tab_filename()
+        if current is not None and current not in self.tab_frames:
+            self._show_panel(current)
+        self._report_state_error()
+        self.after(WATCH_POLL_MS, self._poll_watcher)
+
+    def _report_state_error(self):
+        """Показывает в строке состояния ошибку фоновой записи INI — один
+        раз на каждую новую ошибку."""
+        error = self.state_store.last_error
+        if error is not self._state_error:
+            self._state_error = error
+            if error is not None:
+                self.status_var.set(f"Не удалось сохранить настройки: {error}")
+
+    def _refresh_tab_list(self):
+        """Перестраивает список шаблонов после добавления/удаления файлов."""
+        self._tab_order = sorted(self.files)
+        self.tab_listbox.configure(state="normal")
+        self.tab_listbox.delete(0, "end")
+        for filename in self._tab_order:
+            self.tab_listbox.insert("end", filename)
+        if self._current_filename in self.files:
+            self._select_tab(self._current_filename)
+        elif self._tab_order:
+            self._select_tab(self._tab_order[0])
+            self._schedule_update()
+        else:
+            self._current_filename = None
+            self._schedule_update()
 
     # --------------------------------------------------------------- UI ---
 
@@ -369,7 +1353,7 @@ class PromptConstructorApp(tk.Tk):
         # автогенерация при каждом изменении номера тикета
         self.ticket_var.trace_add("write", self._on_ticket_changed)
 
-        ttk.Button(top_bar, text="Generate", command=lambda: self.on_generate()).pack(
+        ttk.Button(top_bar, text="Generate", command=lambda: self.on_generate(full=True)).pack(
             side="left", padx=2
         )
         ttk.Button(top_bar, text="Reset", command=self.on_reset).pack(side="left", padx=2)
@@ -385,6 +1369,10 @@ class PromptConstructorApp(tk.Tk):
         ttk.Label(agent_bar, text="Рабочий каталог:").pack(side="left")
         workdir_entry = ttk.Entry(agent_bar, textvariable=self.workdir_var)
         workdir_entry.pack(side="left", padx=(4, 10), fill="x", expand=True)
+        self.workdir_var.trace_add(
+            "write",
+            lambda *_: self.state_store.set("General", "workdir", self.workdir_var.get()),
+        )
 
         ttk.Button(agent_bar, text="Запустить агента", command=self.on_launch_agent).pack(
             side="left"
@@ -432,8 +1420,11 @@ class PromptConstructorApp(tk.Tk):
         content_stack.pack(side="left", fill="both", expand=True, padx=(6, 0))
         content_stack.grid_rowconfigure(0, weight=1)
         content_stack.grid_columnconfigure(0, weight=1)
+        self.content_stack = content_stack
 
-        self.tab_frames = {}   # filename -> контейнер (для tkraise)
+        # filename -> контейнер (для tkraise); создаются лениво, порядок —
+        # от давно использованных к недавним
+        self.tab_frames = collections.OrderedDict()
         self._current_filename = None
         self._tab_order = []   # порядок имён файлов, соответствующий строкам Listbox
 
@@ -452,11 +1443,6 @@ class PromptConstructorApp(tk.Tk):
             self.tab_listbox.configure(state="disabled")
         else:
             for filename in sorted(self.files):
-                tab_container, text_widget = self._make_template_tab(content_stack)
-                self.build_section_text(text_widget, self.files[filename]["nodes"], 0)
-                text_widget.configure(state="disabled")
-                tab_container.grid(row=0, column=0, sticky="nsew")
-                self.tab_frames[filename] = tab_container
                 self.tab_listbox.insert("end", filename)
                 self._tab_order.append(filename)
 
@@ -474,7 +1460,7 @@ class PromptConstructorApp(tk.Tk):
         text_frame = ttk.Frame(right_frame)
         text_frame.pack(fill="both", expand=True, pady=(4, 4))
 
-        self.output_text = tk.Text(text_frame, wrap="word", undo=True)
+        self.output_text = OutputText(text_frame, wrap="word", undo=True)
         out_scroll = ttk.Scrollbar(text_frame, orient="vertical", command=self.output_text.yview)
         self.output_text.configure(yscrollcommand=out_scroll.set)
         self.output_text.pack(side="left", fill="both", expand=True)
@@ -488,6 +1474,34 @@ class PromptConstructorApp(tk.Tk):
             side="left", padx=10
         )
 
+    def _show_panel(self, filename):
+        """Показывает панель шаблона, создавая её при первом обращении.
+        Лишние (давно не использованные) панели уничтожаются."""
+        container = self.tab_frames.get(filename)
+        if container is None:
+            container, text_widget = self._make_template_tab(self.content_stack)
+            self.build_section_text(text_widget, self.files[filename]["nodes"], 0)
+            text_widget.configure(state="disabled")
+            container.grid(row=0, column=0, sticky="nsew")
+            self.tab_frames[filename] = container
+            while len(self.tab_frames) > PANEL_CACHE_LIMIT:
+                self._drop_panel(next(iter(self.tab_frames)))
+        else:
+            self.tab_frames.move_to_end(filename)
+        container.tkraise()
+        self._current_filename = filename
+        self.state_store.set("General", "last_tab", filename)
+
+    def _drop_panel(self, filename):
+        """Уничтожает панель шаблона вместе с привязанными к ней чекбоксами."""
+        container = self.tab_frames.pop(filename, None)
+        if container is None:
+            return
+        for sec in iter_sections(self.files[filename]["nodes"]):
+            self.section_vars.pop(sec, None)
+            self.section_display.pop(sec, None)
+        container.destroy()
+
     def _make_template_tab(self, parent):
         """Одна вкладка = прокручиваемый Text с текстом шаблона и встроенными
         чекбоксами прямо внутри текста (чтобы был виден контекст)."""
@@ -589,15 +1603,14 @@ class PromptConstructorApp(tk.Tk):
 
     def _select_tab(self, filename):
         """Показывает панель с указанным именем файла и выделяет его в списке."""
-        if filename not in self.tab_frames:
+        if filename not in self.files:
             return
         idx = self._tab_order.index(filename)
         self.tab_listbox.selection_clear(0, "end")
         self.tab_listbox.selection_set(idx)
         self.tab_listbox.activate(idx)
         self.tab_listbox.see(idx)
-        self.tab_frames[filename].tkraise()
-        self._current_filename = filename
+        self._show_panel(filename)
 
     # ------------------------------------------------------------ логика -
 
@@ -606,81 +1619,164 @@ class PromptConstructorApp(tk.Tk):
             return self._current_filename
         return None
 
-    def on_toggle(self, section, var):
-        value = var.get()
-        section.enabled = value
-        self._refresh_visual(section)
-        if section.cls:
-            for sibling in self.class_registry.get(section.cls, []):
-                if sibling is not section:
-                    sibling.enabled = value
-                    sib_var = self.section_vars.get(sibling)
-                    if sib_var is not None:
-                        sib_var.set(value)
-                    self._refresh_visual(sibling)
-        # любое изменение чекбокса сразу перегенерирует результат
+    def _schedule_update(self, delay=0):
+        """Планирует одну общую перерисовку и регенерацию. Все изменения,
+        сделанные до её выполнения, обрабатываются вместе. delay > 0 —
+        отложить (повторный вызов переносит срок); уже запланированный
+        after_idle не переносится: он и так выполнится на ближайшем
+        простое и подхватит текущее состояние."""
+        if self._update_job is not None:
+            if not self._update_delayed:
+                return
+            self.after_cancel(self._update_job)
+        if delay:
+            self._update_job = self.after(delay, self._flush_updates)
+        else:
+            self._update_job = self.after_idle(self._flush_updates)
+        self._update_delayed = bool(delay)
+
+    def _flush_updates(self):
+        self._update_job = None
+        pending, self._pending_visual = self._pending_visual, set()
+        for sec in pending:
+            self._refresh_visual(sec)
         self.on_generate()
 
+    def _set_section_state(self, sec, value):
+        """Меняет состояние секции (для class= — сразу всего класса) и
+        синхронизирует чекбоксы; перерисовка — в планировщике."""
+        sec.enabled = value
+        affected = [sec] if sec.cell is None else [s for _, s in sec.cell.members]
+        for member in affected:
+            var = self.section_vars.get(member)
+            if var is not None and var.get() != value:
+                var.set(value)
+            self._pending_visual.add(member)
+            self._store_section_state(member)
+
+    def on_toggle(self, section, var):
+        self._set_section_state(section, var.get())
+        # любое изменение чекбокса перегенерирует результат
+        self._schedule_update()
+
     def _on_ticket_changed(self, *_args):
+        self.state_store.set("General", "ticket", self.ticket_var.get())
         if not self._ui_ready:
             return
-        self.on_generate()
+        self._schedule_update(TICKET_DEBOUNCE_MS)
 
     def _on_tab_changed(self, _event=None):
         selection = self.tab_listbox.curselection()
         if selection:
             idx = selection[0]
             if 0 <= idx < len(self._tab_order):
-                filename = self._tab_order[idx]
-                self.tab_frames[filename].tkraise()
-                self._current_filename = filename
+                self._show_panel(self._tab_order[idx])
         if not self._ui_ready:
             return
-        self.on_generate()
+        self._schedule_update()
 
-    def on_generate(self):
-        """Полная регенерация результата для текущей вкладки.
+    def on_generate(self, full=False):
+        """Регенерация результата для текущей вкладки.
         Вызывается автоматически при любом изменении (чекбокс, тикет,
-        вкладка, Reset), а также вручную кнопкой Generate."""
+        вкладка, Reset), а также вручную кнопкой Generate (full=True —
+        полная перестройка). Если в поле уже лежит результат того же
+        шаблона и его не правили вручную, обновляются только изменившиеся
+        секции и места подстановки тикета."""
         filename = self._current_tab_filename()
         if filename is None:
+            self._output = None
             self._set_output_text("")
             return
 
-        nodes = self.files[filename]["nodes"]
-        result = render(nodes)
-        result = result.replace(TICKET_PLACEHOLDER, self.ticket_var.get())
-        self._set_output_text(result)
+        plan = self.files[filename]["plan"]
+        ticket = self.ticket_var.get()
+        out = self._output
+        if full or out is None or out["plan"] is not plan or self.text_dirty:
+            self._rebuild_output(plan, ticket)
+        elif ticket != out["ticket"] and not self._patch_ticket(plan, out, ticket):
+            self._rebuild_output(plan, ticket)
+        else:
+            self._update_visibility(plan, out)
         self.status_var.set(f"Обновлено автоматически из «{filename}».")
 
+    def _rebuild_output(self, plan, ticket):
+        """Вставляет в поле результата все фрагменты плана (одним вызовом
+        insert), помечая каждый тегом его секции; выключенные секции
+        скрываются через elide."""
+        tw = self.output_text
+        visible = plan.visibility()
+        args = []
+        for text, owner in zip(plan.texts, plan.owners()):
+            tags = () if owner < 0 else (f"out_{owner}",)
+            if text is None:
+                text = ticket
+                tags += ("out_ticket",)
+            args += (text, tags)
+
+        self._suppress_modified = True
+        tw.delete("1.0", "end")
+        stale = [t for t in tw.tag_names() if t.startswith("out_")]
+        if stale:
+            tw.tag_delete(*stale)
+        for i, shown in enumerate(visible):
+            tw.tag_configure(f"out_{i}", elide=not shown)
+        if args:
+            tw.insert("1.0", *args)
+        tw.edit_modified(False)
+        self._suppress_modified = False
+        self.text_dirty = False
+        self.dirty_var.set("")
+        self._output = {"plan": plan, "ticket": ticket, "visible": visible}
+
+    def _update_visibility(self, plan, out):
+        """Показывает/скрывает только секции, видимость которых изменилась."""
+        visible = plan.visibility()
+        for i, (was, shown) in enumerate(zip(out["visible"], visible)):
+            if was != shown:
+                self.output_text.tag_configure(f"out_{i}", elide=not shown)
+        out["visible"] = visible
+
+    def _patch_ticket(self, plan, out, ticket):
+        """Заменяет номер тикета только в местах подстановки (с конца, чтобы
+        не сдвигать ещё не обработанные индексы). Возвращает False, если
+        точечная замена невозможна и нужна полная перестройка: пустой
+        номер не оставляет в тексте диапазона тега, а соседние подстановки
+        сливаются в один диапазон."""
+        if not ticket or not out["ticket"]:
+            return False
+        tw = self.output_text
+        ranges = tw.tag_ranges("out_ticket")
+        if len(ranges) != 2 * plan.texts.count(None):
+            return False
+
+        self._suppress_modified = True
+        for k in range(len(ranges) - 2, -1, -2):
+            start, end = ranges[k], ranges[k + 1]
+            tags = tuple(t for t in tw.tag_names(start) if t != "sel")
+            tw.delete(start, end)
+            tw.insert(start, ticket, tags)
+        tw.edit_modified(False)
+        self._suppress_modified = False
+        out["ticket"] = ticket
+        self._update_visibility(plan, out)
+        return True
+
     def on_reset(self):
         filename = self._current_tab_filename()
         if filename is None:
             return
-        nodes = self.files[filename]["nodes"]
-        sections = list(iter_sections(nodes))
-
-        for sec in sections:
-            sec.enabled = sec.default
-            var = self.section_vars.get(sec)
-            if var is not None:
-                var.set(sec.default)
-            self._refresh_visual(sec)
-
-        # синхронизация классов после Reset
-        for sec in sections:
-            if sec.cls:
-                for sibling in self.class_registry.get(sec.cls, []):
-                    if sibling is not sec:
-                        sibling.enabled = sec.enabled
-                        sib_var = self.section_vars.get(sibling)
-                        if sib_var is not None:
-                            sib_var.set(sibling.enabled)
-                        self._refresh_visual(sibling)
+        # каждый класс сбрасывается один раз — по первой его секции в файле
+        seen_cells = set()
+        for sec in iter_sections(self.files[filename]["nodes"]):
+            if sec.cell is not None:
+                if sec.cell in seen_cells:
+                    continue
+                seen_cells.add(sec.cell)
+            self._set_section_state(sec, sec.default)
 
         self.status_var.set(f"Состояния вкладки «{filename}» сброшены.")
         # Reset тоже меняет итоговое содержимое -> автогенерация
-        self.on_generate()
+        self._schedule_update()
 
     def on_launch_agent(self):
         """Открывает командную строку в указанном рабочем каталоге и
@@ -743,9 +1839,8 @@ class PromptConstructorApp(tk.Tk):
                 self.status_var.set(f"Агент запущен в «{workdir}».")
 
     def on_copy(self):
-        text = self.output_text.get("1.0", "end-1c")
-        self.clipboard_clear()
-        self.clipboard_append(text)
+        # только видимый текст: фрагменты выключенных секций скрыты (elide)
+        self.output_text.copy_displayed("1.0", "end-1c")
         self.status_var.set("Текст скопирован в буфер обмена.")
 
     def _set_output_text(self, text):
@@ -767,11 +1862,289 @@ class PromptConstructorApp(tk.Tk):
             self.output_text.edit_modified(False)
 
     def on_close(self):
+        self.watcher.stop()
+        if self._update_job is not None:
+            self.after_cancel(self._update_job)
+            self._update_job = None
         self._save_config()
         self.destroy()
 
 
+def make_synthetic_template(sections, depth):
+    """Синтетический шаблон для замеров: sections секций, вложенных цепочками
+    глубиной до depth, с текстом и {{TICKET}} на каждом уровне."""
+    parts = []
+    opened = 0
+    for i in range(sections):
+        parts.append(f"Текст перед секцией {i}, тикет {TICKET_PLACEHOLDER}.\n")
+        parts.append(f"[SECTION name=s{i} default={i % 3 and 1 or 0}]\n")
+        parts.append(f"Содержимое секции {i}: подробная инструкция для агента.\n")
+        opened += 1
+        if opened >= depth or i % 7 == 6:
+            while opened:
+                parts.append("[/SECTION]\n")
+                opened -= 1
+    parts.append("[/SECTION]\n" * opened)
+    return "".join(parts)
+
+
+def benchmark(sections=5000, depth=200, repeat=20):
+    """Сравнивает render()+replace и RenderPlan.render на большом шаблоне."""
+    text = make_synthetic_template(sections, depth)
+    nodes = parse_template(text, "bench.txt")
+    plan = compile_template(nodes)
+    assert plan.render("152") == render(nodes).replace(TICKET_PLACEHOLDER, "152")
+
+    def measure(fn):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        return (time.perf_counter() - started) / repeat * 1000
+
+    started = time.perf_counter()
+    compile_template(nodes)
+    compile_ms = (time.perf_counter() - started) * 1000
+    tree_ms = measure(lambda: render(nodes).replace(TICKET_PLACEHOLDER, "152"))
+    plan_ms = measure(lambda: plan.render("152"))
+    print(f"Шаблон: {len(text) / 1024:.0f} КБ, секций {sections}, вложенность до {depth}")
+    print(f"  компиляция плана       {compile_ms:8.2f} мс (один раз)")
+    print(f"  render() + replace     {tree_ms:8.2f} мс на генерацию")
+    print(f"  RenderPlan.render      {plan_ms:8.2f} мс на генерацию")
+
+
+# --------------------------------------------------------------------------
+# Пакетная генерация без GUI
+# --------------------------------------------------------------------------
+
+
+def list_ticket_dirs(root):
+    """Папки тикетов (имя начинается с цифры: 152, 130_2) в числовом порядке."""
+    names = [
+        name for name in os.listdir(root)
+        if name[:1].isdigit() and os.path.isdir(os.path.join(root, name))
+    ]
+
+    def key(name):
+        digits = re.match(r"\d+", name).group(0)
+        return int(digits), name
+
+    return sorted(names, key=key)
+
+
+def prompt_output_path(out_root, ticket, filename):
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(out_root, ticket, f"{stem}_prompt.txt")
+
+
+def render_job(filename, dumped, flags, tickets, out_root):
+    """Задача пакетного режима (выполняется и в дочернем процессе): дерево
+    шаблона и состояния секций приходят готовыми, результат по каждому
+    тикету пишется в файл, только если он изменился. Возвращает список
+    (путь, "written" | "unchanged")."""
+    nodes = load_nodes(dumped)
+    for sec, enabled in zip(iter_sections(nodes), flags):
+        sec.enabled = enabled
+    plan = compile_template(nodes)
+
+    results = []
+    for ticket in tickets:
+        text = plan.render(ticket)
+        path = prompt_output_path(out_root, ticket, filename)
+        try:
+            with open(path, "r", encoding="utf-8", newline="") as f:
+                if f.read() == text:
+                    results.append((path, "unchanged"))
+                    continue
+        except (OSError, UnicodeDecodeError):
+            pass
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            f.write(text)
+        results.append((path, "written"))
+    return results
+
+
+def _resolve_template(name):
+    """Имя шаблона из каталога промптов или путь к файлу -> (путь, имя)."""
+    if os.path.dirname(name) or not os.path.exists(os.path.join(PROMPTS_DIR, name)):
+        if os.path.isfile(name):
+            return name, os.path.basename(name)
+    return os.path.join(PROMPTS_DIR, name), name
+
+
+def cli_render(argv):
+    parser = argparse.ArgumentParser(
+        prog="prompt_constructor.py render",
+        description="Генерация промптов из шаблонов без GUI.",
+    )
+    parser.add_argument("--template", action="append", default=[],
+                        help="шаблон (имя в prompts/ или путь); можно несколько, "
+                             "по умолчанию — все шаблоны")
+    parser.add_argument("--ticket", action="append", default=[],
+                        help="номер тикета; можно несколько")
+    parser.add_argument("--all-tickets", action="store_true",
+                        help="все папки тикетов в каталоге --out-dir")
+    parser.add_argument("--enable", action="append", default=[],
+                        help="включить секцию (имя или class); можно несколько")
+    parser.add_argument("--disable", action="append", default=[],
+                        help="выключить секцию (имя или class); можно несколько")
+    parser.add_argument("--state-from", metavar="INI",
+                        help="взять состояния секций (и тикет по умолчанию) из INI")
+    parser.add_argument("--out-dir", default=TICKETS_DIR,
+                        help=f"корень папок тикетов (по умолчанию {TICKETS_DIR})")
+    parser.add_argument("--stdout", action="store_true",
+                        help="вывести результат в stdout вместо записи в файлы")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="число процессов (по умолчанию 1)")
+    args = parser.parse_args(argv)
+
+    saved_states = {}
+    default_ticket = ""
+    if args.state_from:
+        cfg = configparser.ConfigParser()
+        try:
+            if not cfg.read(args.state_from, encoding="utf-8"):
+                parser.error(f"INI-файл не найден: {args.state_from}")
+        except configparser.Error as e:
+            parser.error(f"INI-файл не читается: {e}")
+        if cfg.has_section("States"):
+            saved_states = dict(cfg["States"])
+        default_ticket = cfg.get("General", "ticket", fallback="")
+
+    if args.all_tickets:
+        try:
+            tickets = list_ticket_dirs(args.out_dir)
+        except OSError as e:
+            parser.error(f"не удалось прочитать каталог тикетов: {e}")
+    else:
+        tickets = args.ticket or ([default_ticket] if default_ticket else [])
+    if not tickets:
+        parser.error("не указан тикет: --ticket, --all-tickets или --state-from")
+
+    names = args.template
+    if not names:
+        try:
+            names = sorted(f for f in os.listdir(PROMPTS_DIR) if f.lower().endswith(".txt"))
+        except OSError as e:
+            parser.error(f"не удалось прочитать каталог промптов: {e}")
+    if args.stdout and len(names) * len(tickets) != 1:
+        parser.error("--stdout допустим только для одного шаблона и одного тикета")
+
+    # загрузка, состояния из INI, синхронизация классов — как в GUI
+    cache = read_template_cache()
+    class_index = ClassIndex()
+    templates = []
+    failed = False
+    for name in names:
+        path, filename = _resolve_template(name)
+        try:
+            nodes, _entry = load_template_file(path, filename, cache.get(filename))
+        except (UnicodeDecodeError, OSError, TemplateParseError) as e:
+            print(describe_load_error(filename, e), file=sys.stderr)
+            failed = True
+            continue
+        for sec in iter_sections(nodes):
+            # ключи INI configparser приводит к нижнему регистру (как StateStore.get)
+            key = f"{filename}.{sec.name}".lower()
+            if sec.name and key in saved_states:
+                sec.enabled = ini_bool(saved_states[key])
+            if sec.cls:
+                class_index.attach(filename, sec)
+        templates.append((filename, nodes))
+
+    unknown = set(args.enable) | set(args.disable)
+    for value, wanted in ((True, set(args.enable)), (False, set(args.disable))):
+        for _filename, nodes in templates:
+            for sec in iter_sections(nodes):
+                if sec.name in wanted or sec.cls in wanted:
+                    sec.enabled = value
+                    unknown.discard(sec.name)
+                    unknown.discard(sec.cls)
+    for name in sorted(unknown):
+        print(f"Предупреждение: секция или класс «{name}» не найдены.", file=sys.stderr)
+
+    if args.stdout:
+        filename, nodes = templates[0] if templates else (None, None)
+        if nodes is not None:
+            sys.stdout.write(compile_template(nodes).render(tickets[0]))
+        return 1 if failed else 0
+
+    tasks = []
+    for filename, nodes in templates:
+        dumped = dump_nodes(nodes)
+        flags = [sec.enabled for sec in iter_sections(nodes)]
+        for i in range(0, len(tickets), TICKETS_PER_JOB):
+            tasks.append((filename, dumped, flags, tickets[i:i + TICKETS_PER_JOB], args.out_dir))
+
+    written = unchanged = 0
+    started = time.perf_counter()
+    if args.jobs > 1 and len(tasks) > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            batches = pool.map(render_job, *zip(*tasks))
+            results = [item for batch in batches for item in batch]
+    else:
+        results = [item for task in tasks for item in render_job(*task)]
+    for path, status in results:
+        if status == "written":
+            written += 1
+            print(f"записан  {path}")
+        else:
+            unchanged += 1
+    print(
+        f"Шаблонов: {len(templates)}, тикетов: {len(tickets)}; записано {written}, "
+        f"без изменений {unchanged} за {time.perf_counter() - started:.2f} с."
+    )
+    return 1 if failed else 0
+
+
+def _legacy_line_numbers(text):
+    """Номера строк тегов так, как их считал прежний парсер: от начала
+    файла для каждого тега (квадратично от размера)."""
+    return [text.count("\n", 0, m.start()) + 1 for m in _TAG_RE.finditer(text)]
+
+
+def benchmark_parse(sections=40000, depth=20, edits=20, legacy_sections=4000):
+    """Разбор многомегабайтного шаблона: полный разбор и точечный
+    повторный разбор после правки одной секции. Прежний подсчёт строк
+    квадратичен, поэтому сравнивается с ним на шаблоне поменьше."""
+
+    def timed(fn):
+        started = time.perf_counter()
+        result = fn()
+        return result, time.perf_counter() - started
+
+    small = make_synthetic_template(legacy_sections, depth)
+    _, legacy_time = timed(lambda: _legacy_line_numbers(small))
+    _, small_time = timed(lambda: ParsedTemplate.parse(small, "bench.txt"))
+    print(f"Шаблон: {len(small) / 1024 / 1024:.1f} МБ, секций {legacy_sections}")
+    print(f"  только номера строк прежним способом  {legacy_time:8.3f} с")
+    print(f"  полный разбор за один проход          {small_time:8.3f} с")
+
+    text = make_synthetic_template(sections, depth)
+    doc, full_time = timed(lambda: ParsedTemplate.parse(text, "bench.txt"))
+    print(f"Шаблон: {len(text) / 1024 / 1024:.1f} МБ, секций {sections}")
+    print(f"  полный разбор за один проход          {full_time:8.3f} с")
+
+    reparse_time = 0.0
+    for k in range(edits):
+        marker = f"Содержимое секции {(k * 7919) % sections}:"
+        at = doc.text.index(marker)
+        new_text = doc.text[:at] + "Правка\n" + doc.text[at:]
+        doc, spent = timed(lambda: doc.reparse(new_text))
+        reparse_time += spent
+    print(f"  повторный разбор после правки (ср.)   {reparse_time / edits:8.3f} с")
+    assert dump_nodes(doc.nodes) == dump_nodes(ParsedTemplate.parse(doc.text, "bench.txt").nodes)
+
+
 def main():
+    if sys.argv[1:2] == ["bench"]:
+        benchmark()
+        return
+    if sys.argv[1:2] == ["bench-parse"]:
+        benchmark_parse()
+        return
+    if sys.argv[1:2] == ["render"]:
+        sys.exit(cli_render(sys.argv[2:]))
     app = PromptConstructorApp()
     app.mainloop()
 
@@ -0,0 +1,196 @@
+import collections
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import prompt_constructor as pc  # noqa: E402
+
+
+TEMPLATE = """Intro
+[SECTION class=security default=1]
+Check secrets.
+[/SECTION]
+[SECTION class=review default=1]
+Review the diff.
+[/SECTION]
+[SECTION name=notes default=1]
+Notes.
+[/SECTION]
+"""
+
+
+def make_app(tmp_path):
+    """PromptConstructorApp без окна: только модель шаблонов и состояний."""
+    app = pc.PromptConstructorApp.__new__(pc.PromptConstructorApp)
+    app.state_store = pc.StateStore(str(tmp_path / "prompt_constructor.ini"), delay=3600)
+    app.class_index = pc.ClassIndex()
+    app.files = {}
+    app._section_files = {}
+    app._listed = set()
+    app.tab_frames = collections.OrderedDict()
+    return app
+
+
+def states_of(app, filename):
+    return [
+        (sec.cls or sec.name, sec.enabled)
+        for sec in pc.iter_sections(app.files[filename]["nodes"])
+    ]
+
+
+def reload(app, filename, text):
+    states, class_states = app._uninstall_template(filename)
+    app._install_template(filename, pc.parse_template(text, filename), states, class_states)
+
+
+def test_reload_keeps_state_of_class_only_sections(tmp_path):
+    app = make_app(tmp_path)
+    app._install_template("role.txt", pc.parse_template(TEMPLATE, "role.txt"))
+    for sec in pc.iter_sections(app.files["role.txt"]["nodes"]):
+        if sec.cls == "review" or sec.name == "notes":
+            sec.enabled = False
+
+    reload(app, "role.txt", TEMPLATE.replace("Intro", "Intro, edited"))
+
+    assert states_of(app, "role.txt") == [
+        ("security", True), ("review", False), ("notes", False),
+    ]
+    assert not app.class_index.cells["review"].enabled
+
+
+def test_reload_follows_class_shared_with_other_template(tmp_path):
+    app = make_app(tmp_path)
+    app._install_template("a.txt", pc.parse_template(TEMPLATE, "a.txt"))
+    app._install_template("b.txt", pc.parse_template(TEMPLATE, "b.txt"))
+    app.class_index.cells["security"].enabled = False
+
+    reload(app, "a.txt", TEMPLATE + "\nMore.\n")
+
+    assert states_of(app, "a.txt")[0] == ("security", False)
+    assert app.class_index.cells["security"] is next(
+        sec.cell for sec in pc.iter_sections(app.files["b.txt"]["nodes"]) if sec.cls == "security"
+    )
+
+
+def test_section_moved_to_new_class_starts_from_default(tmp_path):
+    app = make_app(tmp_path)
+    app._install_template("role.txt", pc.parse_template(TEMPLATE, "role.txt"))
+    app.class_index.cells["review"].enabled = False
+
+    reload(app, "role.txt", TEMPLATE.replace("class=review", "class=audit"))
+
+    assert ("audit", True) in states_of(app, "role.txt")
+    assert "review" not in app.class_index.cells
+
+
+def test_render_applies_saved_state_with_mixed_case_names(tmp_path, monkeypatch, capsys):
+    prompts = tmp_path / "prompts"
+    prompts.mkdir()
+    (prompts / "Role.txt").write_text(
+        "[SECTION name=Tickets default=1]\nSHOWN-BY-DEFAULT\n[/SECTION]\n", encoding="utf-8"
+    )
+    ini = tmp_path / "state.ini"
+    ini.write_text("[States]\nRole.txt.Tickets = false\n", encoding="utf-8")
+    monkeypatch.setattr(pc, "PROMPTS_DIR", str(prompts))
+    monkeypatch.setattr(pc, "TEMPLATE_CACHE_FILE", str(tmp_path / "cache.json"))
+
+    pc.cli_render(["--template", "Role.txt", "--ticket", "101",
+                   "--state-from", str(ini), "--stdout"])
+
+    assert "SHOWN-BY-DEFAULT" not in capsys.readouterr().out
+
+
+def test_state_store_writes_only_changed_keys(tmp_path):
+    path = tmp_path / "prompt_constructor.ini"
+    store = pc.StateStore(str(path), delay=3600)
+    store.set("General", "ticket", "101")
+    store.set("States", "role.txt.notes", "true")
+    assert store.flush() is None
+    # ключ, дописанный в файл со стороны, переживает следующую запись
+    path.write_text(path.read_text(encoding="utf-8") + "external = kept\n", encoding="utf-8")
+
+    store.set("General", "ticket", "102")
+    store.prune("States", "role.txt")
+    assert store.close() is None
+
+    written = pc.configparser.ConfigParser()
+    written.read(path, encoding="utf-8")
+    assert dict(written["General"]) == {"ticket": "102"}
+    assert dict(written["States"]) == {"external": "kept"}
+
+
+def test_state_store_prune_matches_the_whole_file_name(tmp_path):
+    store = pc.StateStore(str(tmp_path / "prompt_constructor.ini"), delay=3600)
+    for key in ("a.txt.notes", "a.txt.b.txt.notes", "a.txt.b.txt"):
+        store.set("States", key, "true")
+
+    store.prune("States", "a.txt", others={"a.txt", "a.txt.b.txt"})
+
+    assert store.get("States", "a.txt.notes") is None
+    assert store.get("States", "a.txt.b.txt.notes") == "true"
+    # а это секция "b.txt" шаблона a.txt
+    assert store.get("States", "a.txt.b.txt") is None
+    store.close()
+
+
+def edit_template(watcher, path, text, stamp):
+    path.write_text(text, encoding="utf-8")
+    os.utime(path, ns=(stamp, stamp))
+    watcher.poll()
+    return watcher.results.get_nowait()
+
+
+def test_watcher_reparses_only_the_edited_region(tmp_path, monkeypatch):
+    monkeypatch.setattr(pc, "TEMPLATE_CACHE_FILE", str(tmp_path / "cache.json"))
+    path = tmp_path / "role.txt"
+    path.write_text(TEMPLATE, encoding="utf-8")
+    watcher = pc.TemplateWatcher(str(tmp_path), {"role.txt": pc.file_signature(str(path))}, {})
+    # до первой правки поток ничего не разбирает
+    watcher.poll()
+    assert watcher.parsed == {} and watcher.results.empty()
+
+    edited = TEMPLATE.replace("Review the diff.", "Review the diff, please.")
+    kind, filename, ui_nodes = edit_template(watcher, path, edited, 1)
+    assert (kind, filename) == ("updated", "role.txt")
+    assert pc.dump_nodes(ui_nodes) == pc.dump_nodes(pc.parse_template(edited, "role.txt"))
+    first, last = watcher.parsed["role.txt"].nodes[1], watcher.parsed["role.txt"].nodes[-2]
+    ui_first = ui_nodes[1]
+
+    edited = edited.replace("Review the diff, please.", "Review the diff\nline by line.")
+    kind, filename, patch = edit_template(watcher, path, edited, 2)
+
+    assert (kind, filename) == ("patched", "role.txt")
+    doc = watcher.parsed["role.txt"]
+    # узлы вне правки переиспользованы, в UI ушли копии только новых узлов
+    assert doc.nodes[1] is first and doc.nodes[-2] is last
+    assert last.line == 9
+    assert not set(pc.iter_sections(patch[2])) & set(pc.iter_sections(doc.nodes))
+    pc.apply_node_patch(ui_nodes, patch)
+    expected = pc.dump_nodes(pc.parse_template(edited, "role.txt"))
+    assert pc.dump_nodes(ui_nodes) == expected
+    assert ui_nodes[1] is ui_first
+    assert watcher.cache["role.txt"]["nodes"] == expected
+
+
+def test_copy_and_cut_skip_elided_text():
+    try:
+        root = pc.tk.Tk()
+    except pc.tk.TclError:
+        pytest.skip("нет дисплея для Tk")
+    try:
+        text = pc.OutputText(root)
+        text.insert("1.0", "shown ", (), "hidden ", ("out_0",), "tail", ())
+        text.tag_configure("out_0", elide=True)
+        text.tag_add("sel", "1.0", "end-1c")
+
+        text.event_generate("<<Copy>>")
+        assert root.clipboard_get() == "shown tail"
+
+        text.event_generate("<<Cut>>")
+        assert root.clipboard_get() == "shown tail"
+        assert text.get("1.0", "end-1c") == ""
+    finally:
+        root.destroy()